@@ -0,0 +1,131 @@
+'''
+Walk-forward backtest of the prediction models: the history is split into matchdays (or weeks), and every period is
+predicted by models trained on all matches before it, the way the models are retrained and used every matchday.
+The folds are processed in blocks of consecutive periods that run in parallel processes. Within a block the forests
+are only fitted from scratch for its first period and are then updated by adding trees fitted on the longer history
+(warm_start), which is much cheaper than refitting all trees for every period.
+Run it from the src directory, e.g. "python backtesting.py --period week --workers 4".
+'''
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, f1_score, mean_squared_error
+import dataset_store
+import feature_encoder
+import prediction
+
+RESULTS_FILE_PATH = "../data/backtest_results.csv"
+PREDICTIONS_FILE_PATH = "../data/backtest_predictions.csv"
+PERIODS = ["matchday", "week"]
+
+# labels every match with the first day of its period. A matchday is a run of match dates without a free day in
+# between, e.g. Friday to Sunday or Tuesday and Wednesday.
+def assign_periods(dates, period="matchday"):
+    days = pd.to_datetime(dates).dt.normalize()
+    if period == "week":
+        return days.dt.to_period("W").dt.start_time
+    match_days = np.sort(days.unique())
+    starts = np.r_[True, np.diff(match_days) > np.timedelta64(1, "D")]
+    period_starts = pd.Series(match_days[np.maximum.accumulate(np.where(starts, np.arange(len(match_days)), 0))],
+                              index=match_days)
+    return days.map(period_starts)
+
+# the out-of-sample predictions of a fold, with the winner probabilities that the betting simulation works on
+def _predict_fold(clf, reg, X_test, test):
+    predictions = pd.DataFrame(clf.predict_proba(X_test), index=test.index, columns=[f"Prob_{c}" for c in clf.classes_])
+    predictions["Winner_Prediction"] = clf.predict(X_test)
+    predictions["Difference_Prediction"] = reg.predict(X_test)[:, 0]
+    return predictions
+
+def _score_fold(predictions, test):
+    winner, difference = test[prediction.TARGETS["classifier"][0]], test[prediction.TARGETS["regressor"][0]]
+    return {"accuracy": accuracy_score(winner, predictions["Winner_Prediction"]),
+            "f1": f1_score(winner, predictions["Winner_Prediction"], average="weighted"),
+            "mse": mean_squared_error(difference, predictions["Difference_Prediction"])}
+
+def _run_block(job):
+    """Walk through a block of consecutive periods, fitting the forests for the first one and adding trees for the others"""
+    df, periods, params, trees_per_update = job
+    features = [col for col in df.columns if not "Targ_Var" in col and col not in ["Date", "Period"]]
+    results, predictions = [], []
+    for i, period in enumerate(periods):
+        train, test = df[df["Period"] < period], df[df["Period"] == period]
+        start = time.perf_counter()
+        if i == 0:
+            # the encoder has to stay the same for the added trees, its team vocabulary covers promoted teams as well
+            encoder = feature_encoder.FeatureEncoder(features).fit(train)
+            clf = RandomForestClassifier(**params["classifier"], warm_start=True)
+            reg = RandomForestRegressor(**params["regressor"], warm_start=True)
+        else:
+            clf.set_params(n_estimators=clf.n_estimators + trees_per_update)
+            reg.set_params(n_estimators=reg.n_estimators + trees_per_update)
+        X_train = encoder.transform(train)
+        clf.fit(X_train, train[prediction.TARGETS["classifier"][0]])
+        reg.fit(X_train, train[prediction.TARGETS["regressor"]])
+        fit_seconds = time.perf_counter() - start
+        predictions.append(_predict_fold(clf, reg, encoder.transform(test), test))
+        results.append({"period": period, "train_rows": len(train), "test_rows": len(test),
+                        "update": "refit" if i == 0 else "added trees", "n_estimators": clf.n_estimators,
+                        "fit_seconds": fit_seconds, **_score_fold(predictions[-1], test)})
+    return results, predictions
+
+def walk_forward_backtest(df, period="matchday", min_train_periods=10, refit_every=10, trees_per_update=50,
+                          n_workers=1, params=prediction.PARAMS):
+    """Predict every period after the first min_train_periods with models trained on all periods before it.
+    The forests are refitted every refit_every periods and get trees_per_update trees added in between.
+    Returns the metrics per period and the predictions per match."""
+    df = df.dropna(subset=["Targ_Var_Winner"]).sort_values("Date")
+    df = df.assign(Period=assign_periods(df["Date"], period).to_numpy())
+    periods = np.sort(df["Period"].unique())[min_train_periods:]
+    jobs = [(df[df["Period"] <= block[-1]], block, params, trees_per_update)
+            for block in [periods[i:i + refit_every] for i in range(0, len(periods), refit_every)]]
+    # the last blocks train on the longest histories, start them first
+    jobs = jobs[::-1]
+
+    if n_workers == 1:
+        block_results = [_run_block(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            block_results = list(executor.map(_run_block, jobs))
+    # back in chronological order
+    block_results = block_results[::-1]
+    results = pd.DataFrame([fold for block, _ in block_results for fold in block])
+    predictions = pd.concat([fold for _, block in block_results for fold in block])
+    return results, predictions
+
+def summarize(results):
+    weights = results["test_rows"]
+    return {"folds": len(results), "matches": int(weights.sum()),
+            **{metric: float(np.average(results[metric], weights=weights)) for metric in ["accuracy", "f1", "mse"]},
+            "fit_seconds": float(results["fit_seconds"].sum())}
+
+def main(period="matchday", min_train_periods=10, refit_every=10, trees_per_update=50, n_workers=1):
+    df = dataset_store.widen(dataset_store.read_source("../data/complete_merged_and_prepared_data.csv"))
+    start = time.perf_counter()
+    results, predictions = walk_forward_backtest(df, period, min_train_periods, refit_every, trees_per_update, n_workers)
+    runtime = time.perf_counter() - start
+    results.to_csv(RESULTS_FILE_PATH)
+    predictions.to_csv(PREDICTIONS_FILE_PATH)
+    print(results.to_string())
+    print(summarize(results))
+    print(f"The backtest took {runtime:.1f}s with {n_workers} worker(s).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the prediction models walking forward through the history.")
+    parser.add_argument("--period", choices=PERIODS, default="matchday",
+                        help="retrain and predict per matchday or per week (default: matchday)")
+    parser.add_argument("--min-train-periods", type=int, default=10,
+                        help="number of periods that are only used for training (default: 10)")
+    parser.add_argument("--refit-every", type=int, default=10,
+                        help="number of periods after which the forests are refitted from scratch (default: 10)")
+    parser.add_argument("--trees-per-update", type=int, default=50,
+                        help="number of trees added to the forests for every other period (default: 50)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of processes the blocks of periods are spread over (default: all cores)")
+    args = parser.parse_args()
+    main(args.period, args.min_train_periods, args.refit_every, args.trees_per_update, args.workers)
@@ -0,0 +1,947 @@
+'''
+This script benchmarks the performance critical steps of the pipeline on synthetic histories that are built by
+replicating the scraped Bundesliga data, so that the scaling to more leagues and seasons can be measured offline.
+Run it from the src directory, e.g. "python benchmarking.py rolling_stats".
+'''
+
+import argparse
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from multiprocessing import Process
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import browser
+import catalog
+import data_preparation
+import dataset_store
+import forest_export
+import model_training_evaluation
+import page_archive
+import page_parsing
+import prediction
+import prediction_server
+import scrape_fixtures
+import scrape_journal
+import scrape_timing
+import team_aliases
+import webscraping
+
+
+# the original per-team loop of add_rolling_stats, kept as reference for timings and equality checks
+def legacy_add_rolling_stats(df):
+    all_teams = pd.unique(df["Team_Home"])
+    for col in [c for c in df.columns if c not in ["Date", "League", "Matchday", "Team_Home",
+                                                   "Team_Away", "Upcoming", "Targ_Var_Goals_Home", "Targ_Var_Goals_Away"]]:
+        if "Home" in col:
+            for team in all_teams:
+                sub_df = df[df["Team_Home"]==team]
+                df.loc[df["Team_Home"] == team, "Rolling_" + col] = sub_df[col].rolling(window=3, closed="left").mean()
+        elif "Away" in col:
+            for team in all_teams:
+                sub_df = df[df["Team_Away"]==team]
+                df.loc[df["Team_Away"] == team, "Rolling_" + col] = sub_df[col].rolling(window=3, closed="left").mean()
+    return df
+
+# the original regex based translate_team_names with its Bundesliga-only dictionary
+def legacy_translate_team_names(dfs):
+    def replace_in_text(text, translation_dict):
+        for original, translated in translation_dict.items():
+            text = re.sub(original, translated, text)
+        return text
+
+    def replace_in_df(df):
+        for col in df.columns:
+            df[col] = df[col].apply(lambda x: replace_in_text(x, translation_dict) if isinstance(x, str) else x)
+        df.index = df.index.map(lambda x: replace_in_text(str(x), translation_dict))
+        return df
+
+    translation_dict = {
+        "Bayern": "Bayern Munich", "VfB Stuttgart": "Stuttgart", "Eintracht Frankfurt": "Eintracht Frankfurt",
+        "Union Berlin": "Union Berlin", "Werder Bremen": "Werder Bremen", "Köln": "FC Koln", "Dortmund": "Dortmund",
+        "RB Leipzig": "RB Leipzig", "Wolfsburg": "Wolfsburg", "Hertha": "Hertha Berlin", "Leverkusen": "Bayer Leverkusen",
+        "Augsburg": "Augsburg", "Mönchengladbach": "B. Monchengladbach", "Arminia": "Arminia Bielefeld", "Mainz": "Mainz",
+        "Schalke": "Schalke", "Hoffenheim": "Hoffenheim", "Freiburg": "Freiburg", "Bochum": "Bochum",
+        "Greuther Fürth": "Greuther Furth", "Heidenheim": "Heidenheim", "Darmstadt 98": "Darmstadt",
+        "St. Pauli": "St. Pauli", "Holstein": "Holstein Kiel"
+    }
+    return [replace_in_df(df) for df in dfs]
+
+# the original row-wise odds imputation and target derivation
+def legacy_impute_missing_odds(df):
+    for event in ["Odds_Home", "Odds_Draw", "Odds_Away"]:
+        impute_list = [col for col in df.columns if event in col]
+        df[impute_list] = df.apply(lambda row: row[impute_list].astype(float).fillna(row[event+"_Average"]), axis=1)
+    return df
+
+def legacy_add_target_variables_and_wins(df):
+    def _winner(row):
+        diff = row["Targ_Var_Difference"]
+        return "Home" if diff > 0 else ("Draw" if diff == 0 else "Away")
+
+    df["Targ_Var_Difference"] = df["Goals_Home"] - df["Goals_Away"]
+    df["Targ_Var_Winner"] = df.apply(_winner, axis = 1)
+    df["Targ_Var_Goals_Home"] = df["Goals_Home"].copy()
+    df["Targ_Var_Goals_Away"] = df["Goals_Away"].copy()
+    df["Points_Home"] = df.apply(lambda x: 3 if x["Goals_Home"]>x["Goals_Away"] else (0 if x["Goals_Home"]<x["Goals_Away"] else 1), axis=1)
+    df["Points_Away"] = df.apply(lambda x: 3 if x["Goals_Home"]<x["Goals_Away"] else (0 if x["Goals_Home"]>x["Goals_Away"] else 1), axis=1)
+    return df
+
+# random goals and odds of five bookmakers, of which the non-average ones are missing with probability missing_share
+def synthesize_odds(n_matches, missing_share=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Goals_Home": rng.poisson(1.6, n_matches), "Goals_Away": rng.poisson(1.3, n_matches)},
+                      index=[f"match_{i}" for i in range(n_matches)])
+    for col in dataset_store.ODDS_COLS:
+        odds = np.round(rng.uniform(1.05, 15.0, n_matches), 2)
+        if not col.endswith("_Average"):
+            odds[rng.random(n_matches) < missing_share] = np.nan
+        df[col] = odds
+    return df
+
+# loads the merged Bundesliga history from ../data, i.e. the input of add_rolling_stats in data_preparation.main
+def load_merged_history():
+    matches_df, odds_df, stats_df = data_preparation.concat_all_data()
+    matches_df, stats_df = data_preparation.translate_team_names([matches_df, stats_df])
+    return data_preparation.merge_past_and_upcoming(matches_df, odds_df, stats_df)
+
+# replicates the history n_leagues times with renamed teams and n_season_blocks times shifted into the future
+def synthesize_history(df, n_leagues, n_season_blocks):
+    df = df.copy()
+    # the upcoming matches still carry their scraped date strings
+    df["Date"] = pd.to_datetime(df["Date"], format="mixed", dayfirst=True)
+    span = df["Date"].max() - df["Date"].min() + pd.Timedelta(days=1)
+    copies = []
+    for block in range(n_season_blocks):
+        for league in range(n_leagues):
+            copy = df.copy()
+            copy["Team_Home"] = copy["Team_Home"] + f" L{league}"
+            copy["Team_Away"] = copy["Team_Away"] + f" L{league}"
+            copy["Date"] = copy["Date"] + block * span
+            copy.index = [f"{idx}_L{league}_B{block}" for idx in copy.index]
+            copies.append(copy)
+    return pd.concat(copies).sort_values(by="Date", kind="stable")
+
+def time_call(func, *args, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def benchmark_rolling_stats(leagues=(1, 2, 4, 8, 13), season_blocks=(1, 2), legacy_max_rows=10000):
+    history = load_merged_history()
+    rows = []
+    for n_season_blocks in season_blocks:
+        for n_leagues in leagues:
+            df = synthesize_history(history, n_leagues, n_season_blocks)
+            vectorized_time, vectorized_df = time_call(data_preparation.add_rolling_stats, df.copy(), repeat=3)
+            row = {"leagues": n_leagues, "season_blocks": n_season_blocks, "rows": len(df),
+                   "vectorized_s": vectorized_time, "legacy_s": None, "speedup": None, "identical": None}
+            if len(df) <= legacy_max_rows:
+                legacy_time, legacy_df = time_call(legacy_add_rolling_stats, df.copy())
+                row["legacy_s"] = legacy_time
+                row["speedup"] = legacy_time / vectorized_time
+                row["identical"] = legacy_df.equals(vectorized_df)
+            rows.append(row)
+            print(row)
+    return pd.DataFrame(rows)
+
+# compares loading the prepared data from CSV, as every stage did before, with loading it from the typed store
+def benchmark_store_loading(leagues=(1, 4, 13), season_blocks=(1, 3)):
+    prepared_df = dataset_store.widen(dataset_store.read_source(data_preparation.PREPARED_FILE_PATH))
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_season_blocks in season_blocks:
+            for n_leagues in leagues:
+                csv_path = os.path.join(tmp_dir, f"prepared_{n_leagues}_{n_season_blocks}.csv")
+                path = os.path.join(tmp_dir, f"prepared_{n_leagues}_{n_season_blocks}.feather")
+                df = synthesize_history(prepared_df, n_leagues, n_season_blocks)
+                df.to_csv(csv_path)
+                dataset_store.write_store(df, "prepared", path)
+
+                def _read_csv():
+                    csv_df = pd.read_csv(csv_path, index_col=0)
+                    csv_df["Date"] = pd.to_datetime(csv_df["Date"])
+                    return csv_df
+                csv_time, csv_df = time_call(_read_csv, repeat=3)
+                store_time, store_df = time_call(dataset_store.read_store, path, repeat=3)
+                row = {"leagues": n_leagues, "season_blocks": n_season_blocks, "rows": len(df),
+                       "csv_s": csv_time, "store_s": store_time, "speedup": csv_time / store_time,
+                       "csv_mb": csv_df.memory_usage(deep=True).sum() / 1e6,
+                       "store_mb": store_df.memory_usage(deep=True).sum() / 1e6,
+                       "csv_file_mb": os.path.getsize(csv_path) / 1e6, "store_file_mb": os.path.getsize(path) / 1e6}
+                rows.append(row)
+                print(row)
+    return pd.DataFrame(rows)
+
+# compares the alias index with the regex loop on replicated Google match lists of the Bundesliga
+def benchmark_team_aliases(copies=(1, 10, 50)):
+    matches_df = pd.concat([dataset_store.widen(dataset_store.read_source(path))
+                            for path, _ in catalog.select_partitions(["matches"], include_upcoming=False)])
+    team_aliases.load_alias_index()
+    rows = []
+    for n_copies in copies:
+        df = pd.concat([matches_df.set_axis([f"{idx}_{copy}" for idx in matches_df.index]) for copy in range(n_copies)])
+        legacy_time, (legacy_df,) = time_call(legacy_translate_team_names, [df.copy()])
+        index_time, (index_df,) = time_call(data_preparation.translate_team_names, [df.copy()], repeat=3)
+        row = {"rows": len(df), "regex_s": legacy_time, "alias_index_s": index_time,
+               "speedup": legacy_time / index_time, "identical": legacy_df.equals(index_df)}
+        rows.append(row)
+        print(row)
+    return pd.DataFrame(rows)
+
+def benchmark_odds_and_targets(sizes=(10_000, 100_000, 1_000_000), legacy_max_rows=100_000):
+    rows = []
+    for n_matches in sizes:
+        df = synthesize_odds(n_matches)
+        prepare = lambda d: data_preparation.add_target_variables_and_wins(data_preparation.impute_missing_odds(d))
+        vectorized_time, vectorized_df = time_call(prepare, df.copy(), repeat=3)
+        row = {"matches": n_matches, "vectorized_s": vectorized_time, "legacy_s": None, "speedup": None, "identical": None}
+        if n_matches <= legacy_max_rows:
+            legacy_prepare = lambda d: legacy_add_target_variables_and_wins(legacy_impute_missing_odds(d))
+            legacy_time, legacy_df = time_call(legacy_prepare, df.copy())
+            row["legacy_s"] = legacy_time
+            row["speedup"] = legacy_time / vectorized_time
+            row["identical"] = legacy_df.equals(vectorized_df)
+        rows.append(row)
+        print(row)
+    return pd.DataFrame(rows)
+
+def load_prepared_history():
+    df = dataset_store.widen(dataset_store.read_source(data_preparation.PREPARED_FILE_PATH))
+    return df.dropna(subset=["Targ_Var_Winner"])
+
+# a twelfth of the model_training_evaluation grid, with the same mix of forest sizes
+SEARCH_GRID = [params for params in model_training_evaluation.param_grid
+               if params["min_samples_split"] == 5 and params["min_samples_leaf"] == 2]
+
+def benchmark_parallel_search(worker_counts=None):
+    df = load_prepared_history()
+    worker_counts = worker_counts or sorted({2, 4, os.cpu_count()} - {1})
+    print(f"{os.cpu_count()} cores available.")
+    serial_time, serial_results = time_call(model_training_evaluation.train_and_evaluate_models, df, SEARCH_GRID, 1)
+    rows = [{"workers": 1, "seconds": serial_time, "speedup": 1.0, "identical": True}]
+    for n_workers in worker_counts:
+        parallel_time, parallel_results = time_call(model_training_evaluation.train_and_evaluate_models,
+                                                    df, SEARCH_GRID, n_workers)
+        rows.append({"workers": n_workers, "seconds": parallel_time, "speedup": serial_time / parallel_time,
+                     "identical": parallel_results.equals(serial_results)})
+        print(rows[-1])
+    return pd.DataFrame(rows)
+
+# a third of the model_training_evaluation grid, all depths and leaf sizes at every forest size
+HALVING_GRID = [params for params in model_training_evaluation.param_grid if params["min_samples_split"] == 5]
+
+# compares the successive halving search with the full grid: the gap between their best validation scores and the
+# time saved
+def benchmark_halving_search(n_workers=1):
+    df = load_prepared_history()
+    grid_time, grid_results = time_call(model_training_evaluation.train_and_evaluate_models,
+                                        df, HALVING_GRID, n_workers, "grid")
+    halving_time, halving_results = time_call(model_training_evaluation.train_and_evaluate_models,
+                                              df, HALVING_GRID, n_workers, "halving")
+    rows = []
+    for name, results, seconds in [("grid", grid_results, grid_time), ("halving", halving_results, halving_time)]:
+        rows.append({"search": name, "seconds": seconds, "speedup": grid_time / seconds,
+                     "best_val_acc": results["val_acc"].max(), "best_val_mse": results["val_mse"].min(),
+                     "val_acc_gap": grid_results["val_acc"].max() - results["val_acc"].max(),
+                     "val_mse_gap": results["val_mse"].min() - grid_results["val_mse"].min()})
+        print(rows[-1])
+    return pd.DataFrame(rows)
+
+# load-tests the prediction server on this machine: clients post the upcoming fixtures one by one (with their odds)
+# and the server reports its p50/p99 latencies and micro-batch sizes
+def benchmark_prediction_server(n_requests=500, concurrencies=(1, 8, 32)):
+    prepared_df = dataset_store.widen(dataset_store.read_source(data_preparation.PREPARED_FILE_PATH))
+    upcoming_df = prepared_df[prepared_df["Targ_Var_Winner"].isna()]
+    fixtures = upcoming_df[["Team_Home", "Team_Away"] + [c for c in upcoming_df if c.startswith("Odds_")]]
+    bodies = [json.dumps({"fixtures": [fixture]}).encode() for fixture in fixtures.to_dict("records")]
+
+    rows = []
+    for concurrency in concurrencies:
+        server = prediction_server.make_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+
+        def post(i):
+            request = urllib.request.Request(url, data=bodies[i % len(bodies)], headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(post, range(n_requests)))
+        seconds = time.perf_counter() - start
+        rows.append({"concurrency": concurrency, "requests_per_second": n_requests / seconds,
+                     **server.RequestHandlerClass.metrics.summary()})
+        server.shutdown()
+        server.server_close()
+        print(rows[-1])
+    return pd.DataFrame(rows)
+
+# compares the flat node array export of the prediction forests with the fitted forests: load time, memory, prediction
+# latency per batch size and whether the predictions are identical
+def benchmark_forest_export(batch_sizes=(1, 18, 100, 1000), repeat=5):
+    prepared_df = dataset_store.widen(dataset_store.read_source(data_preparation.PREPARED_FILE_PATH))
+    models = prediction.load_models(prepared_df.dropna())
+    X = models.encoder.transform(prepared_df)
+    rows = []
+    for name in ["classifier", "regressor"]:
+        forest_path = os.path.join(models.path, name+".joblib")
+        flat_path = os.path.join(models.path, name+".flat")
+        models.flat_model(name)
+        forest_seconds, forest = time_call(joblib.load, forest_path, repeat=repeat)
+        flat_seconds, flat_forest = time_call(forest_export.load_flat_forest, flat_path, repeat=repeat)
+        row = {"model": name, "forest_load_ms": 1000 * forest_seconds, "flat_load_ms": 1000 * flat_seconds,
+               "forest_mb": len(pickle.dumps(forest)) / 1e6, "flat_mb": flat_forest.nbytes / 1e6,
+               "identical": bool(np.all(forest.predict(X) == flat_forest.predict(X)))}
+        for batch_size in batch_sizes:
+            batch = X[np.arange(batch_size) % len(X)]
+            row[f"forest_ms_{batch_size}"] = 1000 * time_call(forest.predict, batch, repeat=repeat)[0]
+            row[f"flat_ms_{batch_size}"] = 1000 * time_call(flat_forest.predict, batch, repeat=repeat)[0]
+        rows.append(row)
+        print(row)
+    return pd.DataFrame(rows)
+
+# scrapes stand-in google pages of the 2023/24 Bundesliga matches from a local server with pools of headless browsers,
+# whose responses are delayed by latency seconds, and checks the scraped statistics against the stored ones
+def benchmark_google_stats_pool(worker_counts=(1, 2, 4, 8), n_matches=64, latency=0.5):
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    matches_df = matches_df.head(n_matches)
+    rows = []
+    with scrape_fixtures.FixtureServer(matches_df, stats_df, latency=latency) as server:
+        for n_workers in worker_counts:
+            with tempfile.TemporaryDirectory() as directory:
+                with scrape_journal.ScrapeJournal("pool_google_statistics.csv", dataset_store.STAT_COLS,
+                                                  directory=directory) as journal:
+                    run = webscraping.scrape_all_google_stats_parallel(
+                        matches_df, pd.DataFrame(columns=dataset_store.STAT_COLS), journal, n_workers, min_interval=0,
+                        jitter=0, search_url=server.url+"/search?q=")
+                    scraped = journal.to_frame().astype(float).sort_index()
+            rows.append({"workers": n_workers, "matches": run["matches"], "failed": len(run["failed"]),
+                         "seconds": run["seconds"], "matches_per_minute": run["matches_per_minute"],
+                         "identical": np.array_equal(scraped.to_numpy(), stats_df.loc[scraped.index].to_numpy(float),
+                                                     equal_nan=True)})
+    return pd.DataFrame(rows)
+
+# the live DOM extraction of the scraping code before it parsed page_source snapshots, kept as reference for timings
+def legacy_find_all_scrapable_matches(driver, matches_df, league):
+    matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
+    matchday_text = "No matchday text found"
+    for matchday in matchdays:
+        try:
+            matchday_text = matchday.find_element(By.CLASS_NAME, "GVj7ae").text
+        except NoSuchElementException:
+            pass
+        matches = [match for match in matchday.find_elements(By.CLASS_NAME, "KAIX8d") if match.text != ""]
+        for match in matches:
+            try:
+                result_line = match.find_element(By.CLASS_NAME, "imspo_mt__tt-w")
+                result_line.find_element(By.CLASS_NAME, "imspo_mt__t-sc")
+            except NoSuchElementException:
+                continue
+            date = page_parsing.extract_date_from_google_text(match.find_element(By.CLASS_NAME, "GOsQPe").text)
+            team_home, team_away = [t.text.split("\n")[1] for t in match.find_elements(By.CLASS_NAME, "L5Kkcd")]
+            goals_home, goals_away = [t.text.split("\n")[0] for t in match.find_elements(By.CLASS_NAME, "L5Kkcd")]
+            idx = "_".join([date, team_home, team_away, goals_home, goals_away])
+            if not idx in matches_df.index:
+                matches_df.loc[idx] = [date, league, matchday_text, team_home, team_away, goals_home, goals_away]
+    return matches_df
+
+def legacy_statistics(driver):
+    statistics = driver.find_elements(By.CLASS_NAME, "MzWkAb")
+    return [w for i in range(10) for w in statistics[i].text.split() if w.isdigit()]
+
+def legacy_odds_events(driver, season):
+    date = page_parsing.extract_oddsportal_date(driver.find_element(By.CLASS_NAME, "eventRow").text, None)
+    events = []
+    for event_row in driver.find_elements(By.CLASS_NAME, "eventRow"):
+        event_text = event_row.text
+        date = page_parsing.extract_oddsportal_date(event_text, date)
+        events.append([date] + page_parsing.extract_teams_and_goals(event_text, season))
+    return events
+
+def legacy_match_odds(driver):
+    bookies = dataset_store.BOOKIES
+    odds_dict = {key: None for key in [event+bookie for bookie in bookies for event in ["Home_", "Draw_", "Away_"]]}
+    for info in [b.text for b in driver.find_elements(By.CSS_SELECTOR, ".flex.text-xs.h-9.border-black-borders")]:
+        for bookie in bookies:
+            if bookie in info:
+                odds_dict["Home_"+bookie] = info.split("\n")[-4]
+                odds_dict["Draw_"+bookie] = info.split("\n")[-3]
+                odds_dict["Away_"+bookie] = info.split("\n")[-2]
+    return odds_dict
+
+# stand-in pages of the 2023/24 Bundesliga for the parsing benchmarks, with the statistics and odds page of the first match
+def stand_in_pages():
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    odds_df = scrape_fixtures.load_scraped(source="odds")
+    return matches_df, stats_df, odds_df, {
+        "google_matches": scrape_fixtures.google_matches_page(matches_df),
+        "google_statistics": scrape_fixtures.google_match_page(stats_df.iloc[0], expanded=True),
+        "odds_events": scrape_fixtures.odds_results_page(odds_df),
+        "match_odds": scrape_fixtures.odds_match_page(odds_df.iloc[0])}
+
+# parses the stand-in pages from their HTML and checks that the scraped data comes out as stored
+def benchmark_page_parsing(repeat=5):
+    matches_df, stats_df, odds_df, pages = stand_in_pages()
+    league, season = matches_df["League"].iloc[0], "2023/24"
+    parsers = {"google_matches": lambda source: page_parsing.parse_google_matches(source, league),
+               "google_statistics": page_parsing.parse_google_statistics,
+               "odds_events": lambda source: page_parsing.parse_odds_events(source, season),
+               "match_odds": page_parsing.parse_match_odds}
+    expected = {"google_matches": matches_df.astype(str),
+                "google_statistics": stats_df.iloc[0].to_numpy(float),
+                "odds_events": odds_df[["Date", "Team_Home", "Team_Away", "Goals_Home", "Goals_Away"]].astype(str).to_numpy(),
+                "match_odds": odds_df.iloc[0][["Odds_"+key for key in page_parsing.parse_match_odds("<html/>")]].to_numpy(float)}
+    rows = []
+    for name, parser in parsers.items():
+        seconds, parsed = time_call(parser, pages[name], repeat=repeat)
+        if name == "google_matches":
+            # the page groups the matches by matchday, so postponed matches are in a different order
+            parsed = pd.DataFrame.from_dict(parsed, orient="index", columns=matches_df.columns)
+            identical = parsed.loc[expected[name].index].equals(expected[name])
+        elif name == "odds_events":
+            parsed = np.array([[e["date"], e["team_home"], e["team_away"], e["goals_home"], e["goals_away"]] for e in parsed])
+            identical = np.array_equal(parsed, expected[name])
+        else:
+            parsed = pd.Series(parsed if name == "google_statistics" else list(parsed.values()), dtype=float).to_numpy()
+            identical = np.array_equal(parsed, expected[name], equal_nan=True)
+        rows.append({"page": name, "kb": len(pages[name]) / 1e3, "parse_ms": 1000 * seconds,
+                     "items": len(parsed), "identical": identical})
+    return pd.DataFrame(rows)
+
+# extracts the stand-in pages served from a local server with a headless browser, from the live DOM like the
+# scraping code used to and from one page_source snapshot
+def benchmark_live_page_parsing(repeat=3):
+    matches_df, stats_df, odds_df, pages = stand_in_pages()
+    league, season = matches_df["League"].iloc[0], "2023/24"
+    extractions = {"google_matches": (lambda d: legacy_find_all_scrapable_matches(d, pd.DataFrame(columns=matches_df.columns), league),
+                                      lambda d: page_parsing.parse_google_matches(d.page_source, league)),
+                   "google_statistics": (legacy_statistics, lambda d: page_parsing.parse_google_statistics(d.page_source)),
+                   "odds_events": (lambda d: legacy_odds_events(d, season),
+                                   lambda d: page_parsing.parse_odds_events(d.page_source, season)),
+                   "match_odds": (legacy_match_odds, lambda d: page_parsing.parse_match_odds(d.page_source))}
+    rows = []
+    with scrape_fixtures.FixtureServer() as server:
+        driver = browser.new_driver(profile_dir=None)
+        try:
+            for name, (live, snapshot) in extractions.items():
+                server.add_page("/"+name, pages[name])
+                driver.get(server.url+"/"+name)
+                live_seconds, live_result = time_call(live, driver, repeat=repeat)
+                snapshot_seconds, snapshot_result = time_call(snapshot, driver, repeat=repeat)
+                if name == "google_matches":
+                    live_result, snapshot_result = live_result.to_numpy().tolist(), list(snapshot_result.values())
+                elif name == "odds_events":
+                    snapshot_result = [[e["date"], e["team_home"], e["team_away"], e["goals_home"], e["goals_away"]]
+                                       for e in snapshot_result]
+                rows.append({"page": name, "live_ms": 1000 * live_seconds, "snapshot_ms": 1000 * snapshot_seconds,
+                             "speedup": live_seconds / snapshot_seconds, "identical": live_result == snapshot_result})
+                print(rows[-1])
+        finally:
+            driver.quit()
+    return pd.DataFrame(rows)
+
+# saves the stand-in pages of a league season into the archive with the URLs of the real websites, like a scraping
+# run would
+def archive_stand_in_pages(archive, matches_df, stats_df, odds_df,
+                           results_path="/football/germany/bundesliga-2023-2024/results/"):
+    league_input = {name: number for number, name in catalog.LEAGUES.items()}[archive.league]
+    google_url = webscraping.partition_inputs(league_input, archive.season)[2]
+    archive.save("google_matches", google_url, scrape_fixtures.google_matches_page(matches_df))
+    for idx, match in matches_df.iterrows():
+        archive.save("google_statistics", webscraping.google_match_url(match),
+                     scrape_fixtures.google_match_page(stats_df.loc[idx], expanded=True), idx)
+    archive.save("odds_events", "https://www.oddsportal.com"+results_path+"#/page/1/",
+                 scrape_fixtures.odds_results_page(odds_df, results_path))
+    for idx, match in odds_df.iterrows():
+        archive.save("match_odds", "https://www.oddsportal.com"+scrape_fixtures.odds_match_path(idx, match, results_path),
+                     scrape_fixtures.odds_match_page(match), idx)
+
+# archives the stand-in pages of the 2023/24 Bundesliga like a scraping run would, re-parses the scraped files from
+# the archive and checks them against the stored ones
+def benchmark_page_archive():
+    league, season = "1. Bundesliga", "2023/24"
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats(league, season)
+    odds_df = scrape_fixtures.load_scraped(league, season, "odds")
+    with tempfile.TemporaryDirectory() as directory:
+        archive = page_archive.PageArchive(league, season, directory)
+        start = time.perf_counter()
+        archive_stand_in_pages(archive, matches_df, stats_df, odds_df)
+        # a second run that fetches the same pages only adds index entries
+        archive.save("google_matches", webscraping.GOOGLE_SEARCH_URL+"1.+Bundesliga+Spiele+2023+24",
+                     scrape_fixtures.google_matches_page(matches_df))
+        archive_seconds = time.perf_counter() - start
+
+        index = page_archive.read_index(directory)
+        stored_mb = sum(os.path.getsize(page_archive.page_path(sha256, directory)) for sha256 in index["sha256"].unique()) / 1e6
+        start = time.perf_counter()
+        written = page_archive.reparse(directory, os.path.join(directory, "reparsed"))
+        reparse_seconds = time.perf_counter() - start
+
+        rows = []
+        for source, expected in [("matches", matches_df), ("statistics", stats_df), ("odds", odds_df)]:
+            file = written.loc[written["source"] == source, "file"].iloc[0]
+            reparsed = dataset_store.widen(dataset_store.to_schema(pd.read_csv(file, index_col=0), source),
+                                           scraped_dates=source != "statistics")
+            rows.append({"source": source, "rows": len(reparsed), "pages": int((index["kind"] != "google_matches").sum()),
+                         "raw_mb": index["bytes"].sum() / 1e6, "stored_mb": stored_mb, "archive_s": archive_seconds,
+                         "reparse_s": reparse_seconds,
+                         "identical": reparsed.loc[expected.index].equals(expected)})
+    return pd.DataFrame(rows)
+
+class UrllibDriver:
+    """Stands in for the headless drivers of the scrapers in checks that do not need a browser: it only fetches the
+    pages of the local stand-in server, whose statistics are already expanded, with urllib"""
+
+    def __init__(self, page_load_timeout=browser.PAGE_LOAD_TIMEOUT, **kwargs):
+        self.page_load_timeout, self.current_url, self.page_source = page_load_timeout, None, None
+
+    def get(self, url):
+        self.current_url = url
+        try:
+            with urllib.request.urlopen(urllib.parse.quote(url, safe=":/?=+"), timeout=self.page_load_timeout) as response:
+                self.page_source = response.read().decode()
+        except TimeoutError:
+            # raised like the page load timeout of chrome, which the retries of the scrapers handle
+            raise TimeoutException(f"Timed out loading {url}.")
+
+    def quit(self):
+        pass
+
+# scrapes the statistics of the stand-in pages into a journal with scrape_pages_parallel and stand-in drivers, the
+# requests of every worker spaced delay seconds apart. Run in a process of its own, as it replaces the drivers.
+def journaled_statistics_scrape(server_url, matches_df, csv_path, journal_dir, delay=0.0, n_workers=2):
+    browser.new_driver = UrllibDriver
+    with scrape_journal.ScrapeJournal(csv_path, dataset_store.STAT_COLS, directory=journal_dir) as journal:
+        jobs = [(idx, webscraping.google_match_url(match, server_url+"/search?q="))
+                for idx, match in matches_df.iterrows() if idx not in journal]
+        webscraping.scrape_pages_parallel(jobs, lambda driver, idx: page_parsing.parse_google_statistics(driver.page_source),
+                                          journal, n_workers=n_workers, min_interval=delay, jitter=0)
+
+def run_process(target, *args):
+    process = Process(target=target, args=args)
+    process.start()
+    process.join()
+
+# starts a journaled scrape of the statistics in a process of its own, kills it after kill_after seconds and writes
+# half a line at the end of its journal, like a crash while writing. Returns the path of the journal.
+def killed_statistics_scrape(server_url, matches_df, csv_path, journal_dir, kill_after, delay):
+    scrape = Process(target=journaled_statistics_scrape, args=(server_url, matches_df, csv_path, journal_dir, delay))
+    scrape.start()
+    time.sleep(kill_after)
+    scrape.kill()
+    scrape.join()
+    journal_file = scrape_journal.journal_path(csv_path, journal_dir)
+    with open(journal_file, "a", encoding="utf-8") as file:
+        file.write('{"id": "cut off by the crash", "val')
+    return journal_file
+
+# times resuming a scrape of the 2023/24 Bundesliga statistics with scrape_pages_parallel that was killed midway, and
+# appending rows with .loc like the scrapers used to against adding them to the journal. That the resumed rows are
+# complete and identical is checked by scrape_checks.py.
+def benchmark_scrape_journal(kill_after=1.0, delay=0.02, n_rows=(500, 2000, 5000)):
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    rows = []
+    with tempfile.TemporaryDirectory() as directory, \
+            scrape_fixtures.FixtureServer(matches_df, stats_df, expanded=True) as server:
+        csv_path = os.path.join(directory, "journal_check_google_statistics.csv")
+        journal_file = killed_statistics_scrape(server.url, matches_df, csv_path, directory, kill_after, delay)
+        killed_requests = server.requests
+        journaled = len(scrape_journal.read_journal(journal_file)[1])
+
+        start = time.perf_counter()
+        run_process(journaled_statistics_scrape, server.url, matches_df, csv_path, directory)
+        resume_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        compacted = scrape_journal.compact(csv_path, lambda df, path: None, directory)
+        rows.append({"check": "kill and resume", "requests_before_kill": killed_requests, "journaled": journaled,
+                     "requests_after_resume": server.requests - killed_requests, "compacted": compacted,
+                     "seconds": resume_seconds, "compact_seconds": time.perf_counter() - start})
+
+        values = stats_df.astype(str).to_numpy().tolist()
+        for n in n_rows:
+            ids = [f"match_{i}" for i in range(n)]
+            df = pd.DataFrame(columns=dataset_store.STAT_COLS)
+            start = time.perf_counter()
+            for i, idx in enumerate(ids):
+                df.loc[idx] = values[i % len(values)]
+            loc_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            with scrape_journal.ScrapeJournal(f"rows_{n}.csv", dataset_store.STAT_COLS, directory=directory) as journal:
+                for i, idx in enumerate(ids):
+                    journal.add(idx, values[i % len(values)])
+            rows.append({"check": f"{n} rows", "loc_us_per_row": 1e6 * loc_seconds / n,
+                         "journal_us_per_row": 1e6 * (time.perf_counter() - start) / n})
+    return pd.DataFrame(rows)
+
+# the page loading of the scraping code before it watched the rows, which always ended with a full timeout
+def legacy_expand_all_matchdays(driver):
+
+    # checks if a new element has been loaded while scrolling up or down through the page
+    def _check(driver, prior_element, scroll_up):
+        matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
+        idx = 0 if scroll_up else len(matchdays)-1
+        return matchdays[idx].text != prior_element.text
+
+    expand_button = WebDriverWait(driver, 3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "Z4Cazf")))
+    expand_button.click()
+
+    # load all matches by scrolling up and then down through the page
+    WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "OcbAbf")))
+    actions = ActionChains(driver)
+    for idx, scrup in [(0, True), (-1, False)]:        
+        while True:
+            try:
+                matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
+                prior_match = matchdays[idx]
+                actions.move_to_element(prior_match).perform()
+                WebDriverWait(driver, 3.5).until(lambda d: _check(d, prior_match, scroll_up=scrup))
+            except TimeoutException:
+                break
+
+def legacy_let_odds_page_load(driver):
+    # function to check whether last element has changed
+    def _check(driver, prior_last):
+        new_last = driver.find_elements(By.CLASS_NAME, "eventRow")[-1]
+        return new_last.text != prior_last.text
+
+    driver.refresh()
+    while True:
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "eventRow")))
+        last_row = driver.find_elements(By.CLASS_NAME, "eventRow")[-1]
+        actions = ActionChains(driver)
+        actions.move_to_element(last_row).perform()
+        try:
+            WebDriverWait(driver, 10).until(lambda d: _check(driver, last_row))
+        except TimeoutException:
+            break
+
+# loads lazy-loading stand-in pages of the google matchdays (loading above and below the current matchday) and of an
+# oddsportal results page with a headless browser, with the timeout-terminated scrolling the scrapers used to do
+# and with the row watching, and checks that both load all rows
+def benchmark_page_loading(n_rows=100, batch_size=20, load_delays=(0.2, 1.0)):
+    pages = {"google_matchdays": lambda delay: scrape_fixtures.lazy_rows_page("OcbAbf", n_rows, batch_size, delay,
+                                                                             start_row=n_rows // 2, expand_button=True),
+             "odds_results": lambda delay: scrape_fixtures.lazy_rows_page("eventRow", n_rows, batch_size, delay)}
+    loaders = {"google_matchdays": (legacy_expand_all_matchdays, webscraping.expand_all_matchdays),
+               "odds_results": (legacy_let_odds_page_load, webscraping.let_odds_page_load)}
+    class_names = {"google_matchdays": "OcbAbf", "odds_results": "eventRow"}
+    rows = []
+    with scrape_fixtures.FixtureServer() as server:
+        driver = browser.new_driver(profile_dir=None)
+        try:
+            for delay in load_delays:
+                for name, make_page in pages.items():
+                    path = f"/{name}/{delay}"
+                    server.add_page(path, make_page(delay))
+                    row = {"page": name, "load_delay": delay}
+                    for version, load in zip(["legacy", "watched"], loaders[name]):
+                        driver.get(server.url+path)
+                        start = time.perf_counter()
+                        load(driver)
+                        row[version+"_s"] = time.perf_counter() - start
+                        row[version+"_rows"] = len(driver.find_elements(By.CLASS_NAME, class_names[name]))
+                    row["saved_s"] = row["legacy_s"] - row["watched_s"]
+                    rows.append(row)
+                    print(row)
+        finally:
+            driver.quit()
+    return pd.DataFrame(rows)
+
+# scrapes stand-in google pages of the 2023/24 Bundesliga matches from a server that breaks or hangs a share of the
+# pages with chrome, without retries and with the retry policy of the unattended mode, and measures how many matches
+# are skipped and how long the retries take. That the retries recover the pages is checked by scrape_checks.py.
+def benchmark_unattended_scrape(n_matches=40, fault_rate=0.3, n_workers=2, hang_seconds=3.0):
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    matches_df = matches_df.head(n_matches)
+    policies = {"no retries": webscraping.RetryPolicy(max_attempts=1, page_load_timeout=2.0),
+                "retries": webscraping.RetryPolicy(max_attempts=4, base_delay=0.2, max_delay=2.0, fresh_driver_after=3,
+                                                   page_load_timeout=2.0)}
+    rows = []
+    for fault in scrape_fixtures.FAULTS:
+        for name, policy in policies.items():
+            with tempfile.TemporaryDirectory() as directory, \
+                    scrape_fixtures.FixtureServer(matches_df, stats_df, fault_rate=fault_rate, fault=fault,
+                                                  hang_seconds=hang_seconds) as server:
+                csv_path = "unattended_google_statistics.csv"
+                skip_list = scrape_journal.SkipList(csv_path, directory)
+                with scrape_journal.ScrapeJournal(csv_path, dataset_store.STAT_COLS, directory=directory) as journal:
+                    run = webscraping.scrape_all_google_stats_parallel(
+                        matches_df, pd.DataFrame(columns=dataset_store.STAT_COLS), journal, n_workers, min_interval=0,
+                        jitter=0, search_url=server.url+"/search?q=", policy=policy, skip_list=skip_list)
+                rows.append({"fault": fault, "policy": name, "matches": run["matches"], "skipped": len(skip_list),
+                             "faults": server.faults, "attempts": run["attempts"], "drivers": run["drivers"],
+                             "seconds": run["seconds"], "matches_per_minute": run["matches_per_minute"]})
+                print(rows[-1])
+    return pd.DataFrame(rows)
+
+# the odds scraping before it collected the match URLs first: a ctrl-click into a new tab for every event row
+def legacy_scrape_all_odds(driver, odds_url, season):
+    driver.get(odds_url+"/#/page/1/")
+    webscraping.let_odds_page_load(driver)
+    odds, timings = {}, []
+    for i, event in enumerate(page_parsing.parse_odds_events(driver.page_source, season)):
+        start = time.perf_counter()
+        match_link = driver.find_elements(By.CLASS_NAME, "eventRow")[i].find_element(By.CLASS_NAME, "group")
+        original_window = driver.current_window_handle
+        ActionChains(driver).key_down(Keys.CONTROL).click(match_link).key_up(Keys.CONTROL).perform()
+        WebDriverWait(driver, 10).until(lambda d: len(d.window_handles) > 1)
+        driver.switch_to.window([window for window in driver.window_handles if window != original_window][0])
+        try:
+            odds_dict = webscraping.scrape_match_odds(driver)
+        except TimeoutException:
+            odds_dict = {}
+        driver.close()
+        driver.switch_to.window(original_window)
+        odds["_".join([event["date"], event["team_home"], event["team_away"], str(event["goals_home"]),
+                       str(event["goals_away"])])] = odds_dict
+        timings.append(time.perf_counter() - start)
+    return odds, timings
+
+# scrapes the odds of stand-in oddsportal pages of the first n_matches 2023/24 Bundesliga matches, served with latency
+# seconds per response, with a ctrl-click tab per match like the scraper used to, and by loading the collected match
+# URLs directly in one driver and in pools of headless drivers. Checks the scraped odds against the stored ones.
+def benchmark_odds_navigation(n_matches=60, worker_counts=(1, 2, 4), latency=0.2):
+    odds_df = scrape_fixtures.load_scraped(source="odds").head(n_matches)
+    odds_cols = [col for col in odds_df.columns if col.startswith("Odds_")]
+    season, results_path = "2023/24", "/football/germany/bundesliga-2023-2024/results/"
+    rows = []
+    with scrape_fixtures.FixtureServer(latency=latency) as server:
+        server.add_odds_pages(odds_df, results_path)
+        odds_url = server.url+results_path
+        driver = browser.new_driver(profile_dir=None)
+        try:
+            start = time.perf_counter()
+            odds, timings = legacy_scrape_all_odds(driver, odds_url, season)
+            scraped = pd.DataFrame.from_dict(odds, orient="index").rename(columns=lambda key: "Odds_"+key)
+            rows.append({"navigation": "ctrl-click tab", "workers": 1, "matches": len(odds),
+                         "seconds": time.perf_counter() - start, "median_match_s": np.median(timings),
+                         "identical": np.array_equal(scraped[odds_cols].to_numpy(float),
+                                                     odds_df.loc[scraped.index, odds_cols].to_numpy(float), equal_nan=True)})
+            for n_workers in worker_counts:
+                with tempfile.TemporaryDirectory() as directory:
+                    with scrape_journal.ScrapeJournal("navigation_oddsportal_odds.csv", odds_df.columns,
+                                                      directory=directory) as journal:
+                        start = time.perf_counter()
+                        run = webscraping.scrape_all_odds(driver, odds_url, odds_df.head(0), season, journal,
+                                                          n_workers=n_workers, min_interval=0, jitter=0)
+                        seconds = time.perf_counter() - start
+                        scraped = journal.to_frame()
+                rows.append({"navigation": "direct", "workers": n_workers, "matches": run["matches"], "seconds": seconds,
+                             "median_match_s": run["timings"]["seconds"].median(),
+                             "identical": np.array_equal(scraped[odds_cols].to_numpy(float),
+                                                         odds_df.loc[scraped.index, odds_cols].to_numpy(float),
+                                                         equal_nan=True)})
+                print(rows[-1])
+        finally:
+            driver.quit()
+    return pd.DataFrame(rows).assign(matches_per_minute=lambda df: df["matches"] / df["seconds"] * 60)
+
+# loads stand-in google and oddsportal pages with the images, fonts and ad scripts of the real websites with a
+# fully featured driver and with the lightweight one of the driver factory, and times the cookie consent of a fresh
+# profile and of a profile that accepted the cookies before, and starting a driver against reusing one
+def benchmark_browser_profile(repeat=3, n_images=20, kilobytes=50):
+    matches_df, stats_df, odds_df, pages = stand_in_pages()
+    results_path = "/football/germany/bundesliga-2023-2024/results/"
+    rows = []
+    with scrape_fixtures.FixtureServer(latency=0.05) as server, tempfile.TemporaryDirectory() as profile_dir:
+        server.add_resources(n_images, kilobytes)
+        server.add_page("/google_statistics", scrape_fixtures.with_resources(pages["google_statistics"], n_images))
+        server.add_page(results_path, scrape_fixtures.with_resources(pages["odds_events"], n_images))
+        drivers = {"full": lambda: browser.new_driver(block_resources=False, profile_dir=None, measure=True),
+                   "lightweight": lambda: browser.new_driver(profile_dir=profile_dir, measure=True)}
+        for name, make_driver in drivers.items():
+            start = time.perf_counter()
+            driver = make_driver()
+            start_seconds = time.perf_counter() - start
+            try:
+                for path in ["/google_statistics", results_path] * repeat:
+                    driver.get(server.url+path)
+                loads = browser.page_load_summary([driver]).assign(url=lambda df: df["url"].str.replace(server.url, ""))
+                for path, page_loads in loads.groupby("url", sort=False):
+                    rows.append({"driver": name, "measure": path, "seconds": page_loads["seconds"].median(),
+                                 "kb": page_loads["bytes"].median() / 1e3})
+                start = time.perf_counter()
+                driver.get("about:blank")
+                rows.append({"driver": name, "measure": "reuse instead of starting", "seconds": time.perf_counter() - start,
+                             "kb": 0.0})
+                rows.append({"driver": name, "measure": "start", "seconds": start_seconds, "kb": 0.0})
+            finally:
+                driver.quit()
+
+        # the first driver accepts the cookies, the next one finds the consent cookie in the profile
+        for consent in ["fresh profile", "profile with consent"]:
+            driver = browser.new_driver(profile_dir=profile_dir)
+            try:
+                start = time.perf_counter()
+                webscraping.accept_oddsportal_cookies(driver, server.url+results_path)
+                rows.append({"driver": "lightweight", "measure": "cookie consent, " + consent,
+                             "seconds": time.perf_counter() - start, "kb": 0.0})
+            finally:
+                driver.quit()
+    return pd.DataFrame(rows)
+
+# the archive directory and index of the pages of a league season to replay: the given archive, or a temporary one
+# with the stand-in pages of the league season archived like a scraping run would
+@contextmanager
+def replay_archive(directory, league, season):
+    if directory is not None:
+        yield directory, page_archive.read_index(directory, leagues=[league], seasons=[season])
+        return
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats(league, season)
+    with tempfile.TemporaryDirectory() as directory:
+        archive_stand_in_pages(page_archive.PageArchive(league, season, directory), matches_df, stats_df,
+                               scrape_fixtures.load_scraped(league, season, "odds"))
+        yield directory, page_archive.read_index(directory)
+
+# whether a replayed page parses into the rows that page_archive.reparse_partition rebuilt from the archive
+def replayed_rows_identical(kind, parsed, match, expected):
+    if kind == "google_matches":
+        return set(parsed) <= set(expected["matches"].index)
+    if kind == "google_statistics":
+        return np.array_equal(np.array(parsed, float), expected["statistics"].loc[match].to_numpy(float), equal_nan=True)
+    if kind == "odds_events":
+        indices = {"_".join([e["date"], e["team_home"], e["team_away"], str(e["goals_home"]), str(e["goals_away"])])
+                   for e in parsed}
+        return set(expected.get("odds", pd.DataFrame()).index) <= indices
+    if match not in expected.get("odds", pd.DataFrame()).index:
+        return True
+    return np.array_equal(np.array(list(parsed.values()), float),
+                          expected["odds"].loc[match, ["Odds_"+key for key in parsed]].to_numpy(float), equal_nan=True)
+
+# replays the archived pages of a league season (by default the stand-in pages of the 2023/24 Bundesliga) from a
+# local server, fetches and parses every page under timing spans like the scrapers, and checks that the server
+# replays the pages unchanged and that they parse into the same rows as page_archive.reparse_partition. The load and
+# parse times per page kind are read from the log of the spans.
+def benchmark_replay_parsing(directory=None, league="1. Bundesliga", season="2023/24", repeat=3):
+    parsers = {"google_matches": lambda source: page_parsing.parse_google_matches(source, league),
+               "google_statistics": page_parsing.parse_google_statistics,
+               "odds_events": lambda source: page_parsing.parse_odds_events(source, season),
+               "match_odds": page_parsing.parse_match_odds}
+    scrape_timing.RECORDER.reset()
+    with replay_archive(directory, league, season) as (directory, index), scrape_fixtures.FixtureServer() as server, \
+            tempfile.TemporaryDirectory() as log_dir:
+        log_path = scrape_timing.start_log(os.path.join(log_dir, "replay_parsing.jsonl"))
+        server.add_archived_pages(index, directory)
+        pages = page_archive.latest_pages(index)
+        expected = page_archive.reparse_partition(index, league, season, directory)
+        rows = []
+        for kind, url, sha256, match in pages[["kind", "url", "sha256", "match"]].itertuples(index=False):
+            parts = urllib.parse.urlsplit(url)
+            replay_url = server.url + urllib.parse.quote(parts.path + ("?"+parts.query if parts.query else ""),
+                                                         safe="/?=&+%")
+            for _ in range(repeat):
+                with scrape_timing.span("page_load", kind=kind):
+                    page_source = urllib.request.urlopen(replay_url).read().decode()
+                with scrape_timing.span("parse_"+kind):
+                    parsed = parsers[kind](page_source)
+            rows.append({"kind": kind, "kb": len(page_source) / 1e3,
+                         "replayed": page_source == page_archive.load_page(sha256, directory),
+                         "identical": replayed_rows_identical(kind, parsed, match, expected)})
+        scrape_timing.stop_log()
+        spans = scrape_timing.read_log(log_path)
+    print(scrape_timing.summary().to_string(index=False))
+    mean_ms = lambda spans: 1000 * spans["seconds"].mean()
+    return pd.DataFrame(rows).groupby("kind").agg(pages=("kb", "size"), kb=("kb", "sum"), replayed=("replayed", "all"),
+                                                  identical=("identical", "all")).reset_index().assign(
+        load_ms=lambda df: [mean_ms(spans[(spans["span"] == "page_load") & (spans["kind"] == kind)]) for kind in df["kind"]],
+        parse_ms=lambda df: [mean_ms(spans[spans["span"] == "parse_"+kind]) for kind in df["kind"]])
+
+# scrapes the statistics and the odds of a league season from its archived pages (by default the stand-in pages of
+# the 2023/24 Bundesliga) replayed from a local server with the scrapers and headless browsers, checks the scraped
+# rows against page_archive.reparse_partition and returns the timing spans per scraper phase, to profile the scrapers
+# and catch regressions offline and repeatably
+def benchmark_scrape_replay(directory=None, league="1. Bundesliga", season="2023/24", n_workers=2, latency=0.0):
+    scrape_timing.RECORDER.reset()
+    with replay_archive(directory, league, season) as (directory, index), \
+            scrape_fixtures.FixtureServer(latency=latency) as server, tempfile.TemporaryDirectory() as journal_dir:
+        server.add_archived_pages(index, directory)
+        expected = page_archive.reparse_partition(index, league, season, directory)
+        matches_df, stats_df, odds_df = expected["matches"], expected["statistics"], expected["odds"]
+        checks = []
+
+        with scrape_journal.ScrapeJournal("replay_google_statistics.csv", dataset_store.STAT_COLS,
+                                          directory=journal_dir) as journal:
+            run = webscraping.scrape_all_google_stats_parallel(
+                matches_df, pd.DataFrame(columns=dataset_store.STAT_COLS), journal, n_workers, min_interval=0,
+                jitter=0, search_url=server.url+"/search?q=")
+            scraped = journal.to_frame().astype(float)
+        checks.append({"source": "statistics", "matches": run["matches"], "failed": len(run["failed"]),
+                       "identical": len(scraped) == len(stats_df) and np.array_equal(
+                           scraped.loc[stats_df.index].to_numpy(), stats_df.to_numpy(float), equal_nan=True)})
+
+        results_url = page_archive.latest_pages(index).query("kind == 'odds_events'")["url"].iloc[0]
+        odds_cols = [col for col in odds_df.columns if col.startswith("Odds_")]
+        driver = browser.new_driver(profile_dir=None)
+        try:
+            with scrape_journal.ScrapeJournal("replay_oddsportal_odds.csv", odds_df.columns,
+                                              directory=journal_dir) as journal:
+                run = webscraping.scrape_all_odds(driver, server.url+urllib.parse.urlsplit(results_url).path,
+                                                  odds_df.head(0), season, journal, n_workers=n_workers,
+                                                  min_interval=0, jitter=0)
+                scraped = journal.to_frame()
+        finally:
+            driver.quit()
+        checks.append({"source": "odds", "matches": run["matches"], "failed": len(run["failed"]),
+                       "identical": len(scraped) == len(odds_df) and np.array_equal(
+                           scraped.loc[odds_df.index, odds_cols].to_numpy(float), odds_df[odds_cols].to_numpy(float),
+                           equal_nan=True)})
+    print(pd.DataFrame(checks).to_string(index=False))
+    return scrape_timing.summary()
+
+BENCHMARKS = {
+    "rolling_stats": benchmark_rolling_stats,
+    "store_loading": benchmark_store_loading,
+    "team_aliases": benchmark_team_aliases,
+    "odds_and_targets": benchmark_odds_and_targets,
+    "parallel_search": benchmark_parallel_search,
+    "halving_search": benchmark_halving_search,
+    "prediction_server": benchmark_prediction_server,
+    "forest_export": benchmark_forest_export,
+    "google_stats_pool": benchmark_google_stats_pool,
+    "page_parsing": benchmark_page_parsing,
+    "live_page_parsing": benchmark_live_page_parsing,
+    "page_archive": benchmark_page_archive,
+    "scrape_journal": benchmark_scrape_journal,
+    "page_loading": benchmark_page_loading,
+    "unattended_scrape": benchmark_unattended_scrape,
+    "odds_navigation": benchmark_odds_navigation,
+    "browser_profile": benchmark_browser_profile,
+    "replay_parsing": benchmark_replay_parsing,
+    "scrape_replay": benchmark_scrape_replay,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Football_AI pipeline on synthetic histories.")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help="any of: " + ", ".join(BENCHMARKS) + " (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"Running benchmark: {name}")
+        print(BENCHMARKS[name]().to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''
+Vectorized simulation of betting strategies on predicted winner probabilities and the scraped bookmaker odds.
+A strategy bets on the outcome with the largest edge (probability times odds minus one) of every match if that edge
+exceeds its threshold, staking a fraction of the Kelly stake of its current bankroll, at the odds of one bookmaker or
+at the best price over all of them. All strategy variants are simulated together on a (variant, match) array layout,
+with the bankrolls compounded by a cumulative product over the matches in date order, and get their ROI, final
+bankroll and maximum drawdown reported.
+Run it from the src directory after backtesting.py, e.g. "python betting_simulation.py".
+'''
+
+import time
+import numpy as np
+import pandas as pd
+import backtesting
+import catalog
+import dataset_store
+import team_aliases
+
+RESULTS_FILE_PATH = "../data/betting_simulation_results.csv"
+OUTCOMES = ["Home", "Draw", "Away"]
+# the average odds are no price any bookmaker offers, they are only used for imputing
+BOOKMAKERS = [bookie for bookie in dataset_store.BOOKIES if bookie != "Average"]
+BEST_PRICE = "best"
+
+EDGE_THRESHOLDS = np.round(np.arange(0, 0.305, 0.01), 2)
+KELLY_FRACTIONS = np.round(np.arange(0.05, 1.001, 0.05), 2)
+
+# stacks the odds columns into a (match, outcome, bookmaker) array
+def odds_array(df, bookmakers=BOOKMAKERS):
+    cols = ["Odds_"+outcome+"_"+bookie for outcome in OUTCOMES for bookie in bookmakers]
+    return df[cols].to_numpy(dtype=float).reshape(len(df), len(OUTCOMES), len(bookmakers))
+
+# the odds as scraped, by match ID of the prepared data. The prepared data cannot be used, as impute_missing_odds filled
+# the odds a bookmaker never offered with the average odds there, which would be bet as if the bookmaker offered them.
+def scraped_odds(leagues=None):
+    odds_df = dataset_store.widen(catalog.load_partitions("odds", leagues=leagues, include_upcoming=False))
+    odds_df.index = team_aliases.resolve_match_ids(odds_df.index)
+    return odds_df[~odds_df.index.duplicated(keep="last")]
+
+def strategy_grid(edge_thresholds=EDGE_THRESHOLDS, kelly_fractions=KELLY_FRACTIONS,
+                  bookmakers=[BEST_PRICE] + BOOKMAKERS):
+    grid = pd.MultiIndex.from_product([edge_thresholds, kelly_fractions, bookmakers],
+                                      names=["edge_threshold", "kelly_fraction", "bookmaker"])
+    return grid.to_frame(index=False)
+
+# the bet every bookmaker choice would take on every match: its outcome, edge, odds and whether it won,
+# as (choice, match) arrays. Matches without any odds get no bet (an edge of -inf).
+def _best_bets(probabilities, odds, outcomes, choices, bookmakers):
+    all_prices = np.concatenate([np.fmax.reduce(odds, axis=2, keepdims=True), odds], axis=2)
+    columns = [BEST_PRICE] + list(bookmakers)
+    prices = np.moveaxis(all_prices[:, :, [columns.index(choice) for choice in choices]], 2, 0)
+    edges = np.where(np.isnan(prices), -np.inf, probabilities[None] * prices - 1)
+    outcome = np.argmax(edges, axis=2)
+    edge = np.take_along_axis(edges, outcome[..., None], axis=2)[..., 0]
+    price = np.take_along_axis(prices, outcome[..., None], axis=2)[..., 0]
+    return edge, price, outcome == outcomes[None]
+
+def simulate(probabilities, odds, outcomes, strategies, bookmakers=BOOKMAKERS):
+    """Simulate all strategies over the matches in date order.
+    probabilities: (match, outcome) winner probabilities in the order of OUTCOMES,
+    odds: (match, outcome, bookmaker) odds, outcomes: (match,) index of the outcome that happened,
+    strategies: frame with edge_threshold, kelly_fraction and bookmaker (a bookmaker or BEST_PRICE) per variant"""
+    choices = list(pd.unique(strategies["bookmaker"]))
+    edge, price, won = _best_bets(probabilities, odds, outcomes, choices, bookmakers)
+    choice = pd.Categorical(strategies["bookmaker"], categories=choices).codes
+    edge, price, won = edge[choice], price[choice], won[choice]
+
+    bet = edge > strategies["edge_threshold"].to_numpy()[:, None]
+    # the Kelly stake of a bet with odds o and edge e is e / (o - 1) of the bankroll
+    stake = np.where(bet, strategies["kelly_fraction"].to_numpy()[:, None] * edge / np.where(bet, price - 1, 1), 0)
+    # matches without odds of the bookmaker have a NaN price, so only the bets are compounded
+    growth = np.where(bet, 1 + stake * np.where(won, price - 1, -1), 1)
+    bankroll = np.cumprod(np.hstack([np.ones((len(strategies), 1)), growth]), axis=1)
+    staked = (stake * bankroll[:, :-1]).sum(axis=1)
+    profit = bankroll[:, -1] - 1
+    drawdown = 1 - bankroll / np.maximum.accumulate(bankroll, axis=1)
+
+    n_bets = bet.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return strategies.assign(bets=n_bets, hit_rate=(bet & won).sum(axis=1) / n_bets,
+                                 staked=staked, profit=profit, roi=profit / staked,
+                                 final_bankroll=bankroll[:, -1], max_drawdown=drawdown.max(axis=1))
+
+# lines up the predicted probabilities with the scraped odds (see scraped_odds) and the results of the prepared data,
+# in date order
+def simulation_inputs(prepared_df, predictions_df, odds_df):
+    df = prepared_df.join(predictions_df[["Prob_"+outcome for outcome in OUTCOMES]], how="inner")
+    df = df.sort_values("Date", kind="stable")
+    probabilities = df[["Prob_"+outcome for outcome in OUTCOMES]].to_numpy(dtype=float)
+    outcomes = pd.Categorical(df["Targ_Var_Winner"], categories=OUTCOMES).codes
+    return probabilities, odds_array(odds_df.reindex(df.index)), outcomes
+
+def main():
+    prepared_df = dataset_store.widen(dataset_store.read_source("../data/complete_merged_and_prepared_data.csv"))
+    try:
+        predictions_df = pd.read_csv(backtesting.PREDICTIONS_FILE_PATH, index_col=0)
+    except FileNotFoundError:
+        raise FileNotFoundError("No backtest predictions found, run backtesting.py first.") from None
+    probabilities, odds, outcomes = simulation_inputs(prepared_df.dropna(subset=["Targ_Var_Winner"]), predictions_df,
+                                                      scraped_odds())
+    strategies = strategy_grid()
+
+    start = time.perf_counter()
+    results = simulate(probabilities, odds, outcomes, strategies)
+    print(f"Simulated {len(strategies)} strategies over {len(outcomes)} matches in {time.perf_counter() - start:.3f}s.")
+    results.to_csv(RESULTS_FILE_PATH)
+    print(results[results["bets"] > 0].sort_values("roi", ascending=False).head(10).to_string())
+    print(results[results["bets"] > 0].sort_values("max_drawdown").head(10).to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+'''
+The factory of the Chrome drivers that the scrapers use. The drivers are headless unless they are needed for fixing
+a page by hand, and they do not load images, fonts, media and the ads and trackers of the scraped websites, which
+the scrapers never look at. Every driver keeps its cookies in a persistent profile in ../data/browser_profiles, so
+that the cookie consent given once is remembered and the consent buttons are not waited for again. Chrome locks a
+profile while it runs, so every running driver gets a profile directory of its own, which it locks with a lock file
+in the directory also against the drivers of other scraping processes.
+'''
+
+import json
+import os
+import threading
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+import time
+import pandas as pd
+from selenium import webdriver
+import scrape_timing
+
+PROFILE_DIR = "../data/browser_profiles"
+# a page that does not load within this time raises a TimeoutException instead of blocking for minutes
+PAGE_LOAD_TIMEOUT = 30
+# requests chrome does not send (see the Network.setBlockedURLs command of the Chrome DevTools Protocol)
+BLOCKED_URL_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+                        "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm", "*.mp3",
+                        "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*",
+                        "*google-analytics.com*", "*googletagmanager.com*", "*googletagservices.com*",
+                        "*adservice.google.*", "*scorecardresearch.com*", "*criteo.*", "*taboola.com*",
+                        "*outbrain.com*", "*adnxs.com*", "*amazon-adsystem.com*", "*hotjar.com*"]
+# content settings that keep chrome from loading images at all, also those that are not matched by a pattern
+BLOCKING_PREFS = {"profile.managed_default_content_settings.images": 2}
+# the cookies google and the OneTrust banner of oddsportal set once the cookies are accepted
+GOOGLE_CONSENT_COOKIES = ["SOCS", "CONSENT"]
+ONETRUST_CONSENT_COOKIES = ["OptanonAlertBoxClosed"]
+
+PROFILE_LOCK_FILE = "scraper.lock"
+
+# the open lock files of the profiles the drivers of this process use
+_profiles_in_use = {}
+_profiles_lock = threading.Lock()
+
+# the opened lock file of the profile, or None if a driver of another process holds its lock. The operating system
+# releases the lock when the file is closed or the process ends, so the profiles of crashed scrapers are free again.
+def _lock_profile(profile):
+    os.makedirs(profile, exist_ok=True)
+    lock_file = open(os.path.join(profile, PROFILE_LOCK_FILE), "a")
+    try:
+        if os.name == "nt":
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+# the first profile directory that no running driver, of this or of another process, uses
+def _claim_profile(directory):
+    with _profiles_lock:
+        number = 0
+        while True:
+            profile = os.path.join(directory, f"profile-{number}")
+            if profile not in _profiles_in_use:
+                lock_file = _lock_profile(profile)
+                if lock_file is not None:
+                    _profiles_in_use[profile] = lock_file
+                    return profile
+            number += 1
+
+class ScraperDriver(webdriver.Chrome):
+    """A Chrome driver that releases its profile directory when it quits. If measure is set, the load time and the
+    bytes transferred of every page it gets are recorded in page_loads."""
+
+    def __init__(self, options, profile=None, measure=False):
+        self.profile, self.measure, self.page_loads = profile, measure, []
+        try:
+            super().__init__(options=options)
+        except Exception:
+            self._release_profile()
+            raise
+
+    def get(self, url):
+        start = time.perf_counter()
+        with scrape_timing.span("page_load", url=url):
+            super().get(url)
+        if self.measure:
+            self.page_loads.append({"url": url, "seconds": time.perf_counter() - start,
+                                    "bytes": transferred_bytes(self)})
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self._release_profile()
+
+    def _release_profile(self):
+        with _profiles_lock:
+            lock_file = _profiles_in_use.pop(self.profile, None)
+        if lock_file is not None:
+            lock_file.close()
+
+def new_driver(headless=True, block_resources=True, profile_dir=PROFILE_DIR, measure=False,
+               page_load_timeout=PAGE_LOAD_TIMEOUT):
+    """Start a Chrome driver, headless so that several of them can run side by side, without loading the resources
+    the scrapers do not need if block_resources, and with a persistent profile in profile_dir unless it is None"""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    if block_resources:
+        options.add_experimental_option("prefs", BLOCKING_PREFS)
+    if measure:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    profile = None
+    if profile_dir is not None:
+        profile = _claim_profile(profile_dir)
+        options.add_argument("--user-data-dir=" + os.path.abspath(profile))
+    driver = ScraperDriver(options, profile, measure)
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+# whether the driver has one of the consent cookies of the page it is on
+def has_consent(driver, cookie_names):
+    return any(cookie["name"] in cookie_names for cookie in driver.get_cookies())
+
+# the bytes received since the last call, from the network events of the performance log (which the call empties)
+def transferred_bytes(driver):
+    received = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            received += message["params"]["encodedDataLength"]
+    return received
+
+# the load time and transferred bytes of the pages the measured drivers got
+def page_load_summary(drivers):
+    return pd.DataFrame([load for driver in drivers for load in driver.page_loads], columns=["url", "seconds", "bytes"])
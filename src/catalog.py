@@ -0,0 +1,147 @@
+'''
+Catalog of the scraped data partitions in ../data, keyed on (league, season, source).
+The catalog keeps the row count, date range, checksum and file stats of every partition in ../data/catalog.json,
+so that jobs can load only the leagues and seasons they need and stale partitions can be detected from the file
+stats alone, without opening the files.
+'''
+
+import hashlib
+import json
+import os
+import re
+import pandas as pd
+import dataset_store
+
+DATA_DIR = "../data"
+CATALOG_PATH = "../data/catalog.json"
+
+LEAGUES = {1: "1. Bundesliga", 2: "2. Bundesliga", 3: "Premier League", 4: "EFL Championship", 5: "La Liga",
+           6: "Segunda División", 7: "Serie A", 8: "Serie B", 9: "Ligue 1", 10: "Ligue 2",
+           11: "Champions League", 12: "Europa League", 13: "Conference League"}
+SEASONS = {1: "2021/22", 2: "2022/23", 3: "2023/24", 4: "2024/25", 5: "Upcoming Matches"}
+UPCOMING_SEASON = "Upcoming Matches"
+SOURCES = {"matches": "matches", "statistics": "google_statistics", "odds": "oddsportal_odds"}
+
+PARTITION_PATTERN = re.compile(r"^(?P<league>.+)_(?P<season>\d{4}_\d{2}|Upcoming Matches)_"
+                               r"(?P<suffix>matches|google_statistics|oddsportal_odds)\.csv$")
+
+def league_slug(league):
+    return league.replace(" ", "_").replace(".", "")
+
+def partition_path(league, season, source):
+    return DATA_DIR+"/"+league_slug(league)+"_"+season.replace("/", "_")+"_"+SOURCES[source]+".csv"
+
+# returns the (league, season, source) key of a partition file or None for other files
+def parse_partition_file_name(file_name):
+    match = PARTITION_PATTERN.match(file_name)
+    if not match:
+        return None
+    leagues_by_slug = {league_slug(league): league for league in LEAGUES.values()}
+    league = leagues_by_slug.get(match["league"], match["league"].replace("_", " "))
+    season = match["season"].replace("_", "/")
+    source = next(source for source, suffix in SOURCES.items() if suffix == match["suffix"])
+    return league, season, source
+
+def _file_stats(path):
+    stats = os.stat(path)
+    return {"size": stats.st_size, "mtime": stats.st_mtime}
+
+def _checksum(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _describe_partition(path, source):
+    df = dataset_store.read_source(path, columns=[] if source == "statistics" else ["Date"])
+    # the statistics have no date column, but every match ID starts with the date of the match
+    dates = df["Date"] if "Date" in df else pd.to_datetime(df.index.str.split("_").str[0], format="%d.%m.%Y")
+    dates = dates.dropna()
+    return {"rows": len(df),
+            "date_min": None if dates.empty else str(dates.min().date()),
+            "date_max": None if dates.empty else str(dates.max().date())}
+
+def load_catalog():
+    try:
+        with open(CATALOG_PATH) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def save_catalog(catalog):
+    with open(CATALOG_PATH, "w") as file:
+        json.dump(catalog, file, indent=2, ensure_ascii=False)
+
+def partition_files():
+    return sorted(f for f in os.listdir(DATA_DIR) if parse_partition_file_name(f))
+
+# lists the partitions that are new, changed or deleted since they were cataloged, judging by file stats only
+def stale_partitions(catalog=None):
+    catalog = load_catalog() if catalog is None else catalog
+    files = partition_files()
+    stale = [f for f in files if f not in catalog
+             or {k: catalog[f][k] for k in ["size", "mtime"]} != _file_stats(DATA_DIR+"/"+f)]
+    return stale + sorted(set(catalog) - set(files))
+
+# updates the metadata of the stale partitions; with verify_checksums all partitions are checksummed again
+def refresh_catalog(verify_checksums=False):
+    catalog = load_catalog()
+    files = partition_files() if verify_checksums else stale_partitions(catalog)
+    for file in files:
+        path = DATA_DIR+"/"+file
+        if not os.path.exists(path):
+            del catalog[file]
+            continue
+        checksum = _checksum(path)
+        if file in catalog and catalog[file]["checksum"] == checksum:
+            catalog[file].update(_file_stats(path))
+            continue
+        league, season, source = parse_partition_file_name(file)
+        catalog[file] = {"league": league, "season": season, "source": source, "checksum": checksum,
+                         **_describe_partition(path, source), **_file_stats(path)}
+    if files or not os.path.exists(CATALOG_PATH):
+        save_catalog(catalog)
+    return catalog
+
+# selects the partition files of the given sources, leagues and seasons. last_n_seasons keeps only the most recent
+# seasons per league, the upcoming matches are added on top unless include_upcoming is False.
+def select_partitions(sources=None, leagues=None, seasons=None, last_n_seasons=None, include_upcoming=True):
+    catalog = refresh_catalog()
+    entries = [(file, entry) for file, entry in sorted(catalog.items())
+               if (sources is None or entry["source"] in sources) and (leagues is None or entry["league"] in leagues)]
+    if last_n_seasons is not None:
+        recent_seasons = {}
+        for league in {entry["league"] for _, entry in entries}:
+            league_seasons = sorted({entry["season"] for _, entry in entries
+                                     if entry["league"] == league and entry["season"] != UPCOMING_SEASON})
+            recent_seasons[league] = league_seasons[-last_n_seasons:] if last_n_seasons > 0 else []
+        entries = [(file, entry) for file, entry in entries
+                   if entry["season"] in recent_seasons[entry["league"]] or entry["season"] == UPCOMING_SEASON]
+    if seasons is not None:
+        entries = [(file, entry) for file, entry in entries
+                   if entry["season"] in seasons or entry["season"] == UPCOMING_SEASON]
+    if not include_upcoming:
+        entries = [(file, entry) for file, entry in entries if entry["season"] != UPCOMING_SEASON]
+    return [(DATA_DIR+"/"+file, entry) for file, entry in entries]
+
+# loads the selected partitions of one source into one typed frame, optionally restricted to some columns
+def load_partitions(source, leagues=None, seasons=None, last_n_seasons=None, columns=None, include_upcoming=True):
+    partitions = select_partitions([source], leagues, seasons, last_n_seasons, include_upcoming)
+    frames = [dataset_store.read_source(path, columns) for path, _ in partitions]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames)
+    # concatenating categoricals with different categories falls back to object columns
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+def main():
+    catalog = refresh_catalog(verify_checksums=True)
+    summary = pd.DataFrame(catalog.values(), index=list(catalog))
+    print(summary[["league", "season", "source", "rows", "date_min", "date_max"]].to_string())
+
+if __name__ == "__main__":
+    main()
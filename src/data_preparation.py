@@ -1,14 +1,26 @@
 import pandas as pd
+import numpy as np
+import argparse
 import os
-import re
+import catalog
+import dataset_store
+import team_aliases
 
-def concat_all_data():
+PREPARED_FILE_PATH = "../data/complete_merged_and_prepared_data.csv"
+ROLLING_STATE_FILE_PATH = "../data/rolling_state.csv"
+# the prepared data and rolling state of a selection of leagues or seasons, which must not replace the complete ones
+SUBSET_DIR = "../data/prepared_subsets"
+ROLLING_WINDOW = 3
+
+def concat_all_data(leagues=None, last_n_seasons=None):
     df_list_dict = {"matches": [], "odds": [], "statistics": []}
-    for file in os.listdir("../data"):
-        file = "../data/"+file
-        for df_kind in df_list_dict.keys():
-            if df_kind in file:
-                df_list_dict[df_kind].append(pd.read_csv(file, index_col=0))
+    for file, partition in catalog.select_partitions(leagues=leagues, last_n_seasons=last_n_seasons):
+        df_list_dict[partition["source"]].append(dataset_store.widen(dataset_store.read_source(file)))
+    missing = [source for source, df_list in df_list_dict.items() if not df_list]
+    if missing:
+        selection = ("the leagues " + ", ".join(leagues) if leagues else "all leagues") + (
+            f" in their last {last_n_seasons} seasons" if last_n_seasons is not None else "")
+        raise ValueError(f"No scraped {' or '.join(missing)} files found for {selection}.")
 
     matches_df = pd.concat(df_list_dict["matches"])
     odds_df = pd.concat(df_list_dict["odds"])
@@ -17,113 +29,196 @@ def concat_all_data():
     return matches_df, odds_df, stats_df
 
 def translate_team_names(dfs):
-    def replace_in_text(text, translation_dict):
-        for original, translated in translation_dict.items():
-            text = re.sub(original, translated, text)
-        return text
-    
     def replace_in_df(df):
-        for col in df.columns:
-            df[col] = df[col].apply(lambda x: replace_in_text(x, translation_dict) if isinstance(x, str) else x)
-        df.index = df.index.map(lambda x: replace_in_text(str(x), translation_dict))
+        for col in [c for c in ["Team_Home", "Team_Away"] if c in df.columns]:
+            df[col] = team_aliases.resolve_teams(df[col]).astype(object)
+        df.index = team_aliases.resolve_match_ids(df.index)
         return df
-    
-    translation_dict = {
-        "Bayern": "Bayern Munich",
-        "VfB Stuttgart": "Stuttgart",
-        "Eintracht Frankfurt": "Eintracht Frankfurt",  
-        "Union Berlin": "Union Berlin",  
-        "Werder Bremen": "Werder Bremen",  
-        "Köln": "FC Koln",
-        "Dortmund": "Dortmund",  
-        "RB Leipzig": "RB Leipzig",  
-        "Wolfsburg": "Wolfsburg",  
-        "Hertha": "Hertha Berlin",
-        "Leverkusen": "Bayer Leverkusen",
-        "Augsburg": "Augsburg",  
-        "Mönchengladbach": "B. Monchengladbach",
-        "Arminia": "Arminia Bielefeld",
-        "Mainz": "Mainz",  
-        "Schalke": "Schalke",  
-        "Hoffenheim": "Hoffenheim",  
-        "Freiburg": "Freiburg",  
-        "Bochum": "Bochum",  
-        "Greuther Fürth": "Greuther Furth",
-        "Heidenheim": "Heidenheim",  
-        "Darmstadt 98": "Darmstadt",
-        "St. Pauli": "St. Pauli",  
-        "Holstein": "Holstein Kiel"
-    }
-
-    return [replace_in_df(df) for df in dfs]    
+
+    return [replace_in_df(df) for df in dfs]
 
 def join_and_sort(matches_df, odds_df, stats_df):
     odds_df = odds_df.copy()
     odds_df = odds_df.drop(["Date", "Team_Home", "Team_Away", "Goals_Home", "Goals_Away", "Upcoming"], axis=1)
     complete_df = matches_df.join(odds_df).join(stats_df)
     complete_df["Date"] = pd.to_datetime(complete_df["Date"], format="%d.%m.%Y")
-    complete_df = complete_df.sort_values(by="Date")
+    complete_df = complete_df.sort_values(by="Date", kind="stable")
     return complete_df
     
 
-def impute_missing_odds(df):
-    for event in ["Odds_Home", "Odds_Draw", "Odds_Away"]:
-        impute_list = [col for col in df.columns if event in col]
-        df[impute_list] = df.apply(lambda row: row[impute_list].astype(float).fillna(row[event+"_Average"]), axis=1)
+# fills the missing odds of every bookmaker with the odds of the reference bookmaker for the same event. Odds columns
+# are named Odds_<event>_<bookmaker>, so further markets (e.g. Odds_Over_2.5_Bet365) are imputed the same way.
+def impute_missing_odds(df, reference_bookie="Average"):
+    events = {}
+    for col in [c for c in df.columns if c.startswith("Odds_")]:
+        events.setdefault(col[len("Odds_"):].rsplit("_", 1)[0], []).append(col)
+    for event, impute_list in events.items():
+        reference_col = "Odds_"+event+"_"+reference_bookie
+        if reference_col not in df.columns:
+            continue
+        odds = df[impute_list].to_numpy(dtype=float)
+        reference = df[reference_col].to_numpy(dtype=float)[:, None]
+        df[impute_list] = np.where(np.isnan(odds), reference, odds)
     return df
 
-def add_rolling_stats(df):
-
-    all_teams = pd.unique(df["Team_Home"])
-    for col in [c for c in df.columns if c not in ["Date", "League", "Matchday", "Team_Home",
-                                                   "Team_Away", "Upcoming", "Targ_Var_Goals_Home", "Targ_Var_Goals_Away"]]:
-        if "Home" in col:
-            for team in all_teams:
-                sub_df = df[df["Team_Home"]==team]
-                df.loc[df["Team_Home"] == team, "Rolling_" + col] = sub_df[col].rolling(window=3, closed="left").mean()
-        elif "Away" in col:
-            for team in all_teams:
-                sub_df = df[df["Team_Away"]==team]
-                df.loc[df["Team_Away"] == team, "Rolling_" + col] = sub_df[col].rolling(window=3, closed="left").mean()
-    
-    return df
+# columns that add_rolling_stats averages over the last matches of the home or away team
+def rolling_source_cols(df):
+    excluded_cols = ["Date", "League", "Matchday", "Team_Home", "Team_Away", "Upcoming",
+                     "Targ_Var_Goals_Home", "Targ_Var_Goals_Away"]
+    return [c for c in df.columns if c not in excluded_cols and not c.startswith("Rolling_")
+            and ("Home" in c or "Away" in c)]
+
+def add_rolling_stats(df, window=ROLLING_WINDOW):
+    rolled_cols = rolling_source_cols(df)
+
+    # roll the home columns per home team and the away columns per away team in one grouped pass each,
+    # working on positions so that duplicate match IDs cannot misalign the results
+    positions = pd.RangeIndex(len(df))
+    rolled_sides = []
+    for team_col, side_cols in [("Team_Home", [c for c in rolled_cols if "Home" in c]),
+                                ("Team_Away", [c for c in rolled_cols if "Home" not in c])]:
+        if not side_cols:
+            continue
+        side_df = df[side_cols].astype(float).set_axis(positions)
+        rolled = side_df.groupby(df[team_col].to_numpy(), sort=False).rolling(window=window, closed="left").mean()
+        rolled_sides.append(rolled.droplevel(0).reindex(positions))
+
+    if not rolled_sides:
+        return df
+    rolling_df = pd.concat(rolled_sides, axis=1)[rolled_cols].add_prefix("Rolling_").set_axis(df.index)
+    return pd.concat([df.drop(columns=rolling_df.columns, errors="ignore"), rolling_df], axis=1)
 
 def add_target_variables_and_wins(df):
-    def _winner(row):
-        diff = row["Targ_Var_Difference"]
-        return "Home" if diff > 0 else ("Draw" if diff == 0 else "Away")
-    
+    goals_home = df["Goals_Home"].to_numpy()
+    goals_away = df["Goals_Away"].to_numpy()
+    home_won, away_won = goals_home > goals_away, goals_home < goals_away
+
     df["Targ_Var_Difference"] = df["Goals_Home"] - df["Goals_Away"]
-    df["Targ_Var_Winner"] = df.apply(_winner, axis = 1)
+    df["Targ_Var_Winner"] = np.select([home_won, goals_home == goals_away], ["Home", "Draw"], "Away").astype(object)
     df["Targ_Var_Goals_Home"] = df["Goals_Home"].copy()
     df["Targ_Var_Goals_Away"] = df["Goals_Away"].copy()
-    df["Points_Home"] = df.apply(lambda x: 3 if x["Goals_Home"]>x["Goals_Away"] else (0 if x["Goals_Home"]<x["Goals_Away"] else 1), axis=1)
-    df["Points_Away"] = df.apply(lambda x: 3 if x["Goals_Home"]<x["Goals_Away"] else (0 if x["Goals_Home"]>x["Goals_Away"] else 1), axis=1)
+    df["Points_Home"] = np.select([home_won, away_won], [3, 0], 1)
+    df["Points_Away"] = np.select([away_won, home_won], [3, 0], 1)
     
     return df
 
 def drop_unwanted_cols(df):
-    legitimate_cols = (["Team_Home", "Team_Away"] + 
+    legitimate_cols = (["Date", "Team_Home", "Team_Away"] + 
                        [col for col in df.columns if any([s in col for s in ["Rolling", "Odds", "Targ_Var"]])])
     return df[legitimate_cols]
 
-def main():
-    matches_df, odds_df, stats_df = concat_all_data()
-    matches_df, stats_df = translate_team_names([matches_df, stats_df])
-
+# merges the translated raw data into one date-sorted frame of past and upcoming matches, before any rolling stats
+def merge_past_and_upcoming(matches_df, odds_df, stats_df):
     complete_df = join_and_sort(matches_df, odds_df, stats_df)
     complete_df = impute_missing_odds(complete_df)
     complete_df = complete_df.dropna()
     complete_df = add_target_variables_and_wins(complete_df)
     
     upcoming_df = odds_df[odds_df["Upcoming"]].copy()
+    upcoming_df["Date"] = pd.to_datetime(upcoming_df["Date"], format="%d.%m.%Y")
     upcoming_df = impute_missing_odds(upcoming_df)
-    complete_df = pd.concat([complete_df, upcoming_df.drop("Upcoming", axis=1)])
+    return pd.concat([complete_df, upcoming_df.drop("Upcoming", axis=1)])
+
+def finalize_prepared_data(df):
+    df = drop_unwanted_cols(df)
+    return df.dropna(subset=[col for col in df.columns if "Targ_Var" not in col])
+
+# keeps the last window home matches and the last window away matches of every team, which is all that
+# add_rolling_stats needs to featurize later matches
+def extract_rolling_state(past_df, window=ROLLING_WINDOW):
+    in_home_tail = past_df.groupby("Team_Home", sort=False).cumcount(ascending=False) < window
+    in_away_tail = past_df.groupby("Team_Away", sort=False).cumcount(ascending=False) < window
+    state_cols = ["Date", "Team_Home", "Team_Away"] + rolling_source_cols(past_df)
+    return past_df.loc[in_home_tail | in_away_tail, state_cols]
+
+def prepare_full(matches_df, odds_df, stats_df):
+    matches_df, stats_df = translate_team_names([matches_df, stats_df])
+    complete_df = merge_past_and_upcoming(matches_df, odds_df, stats_df)
+    state_df = extract_rolling_state(complete_df[complete_df["Targ_Var_Winner"].notna()])
+    return finalize_prepared_data(add_rolling_stats(complete_df)), state_df
+
+# featurizes only the matches played since the rolling state was saved and appends them to the prepared data.
+# Matches that are scraped late with a date before the last saved match require a full rebuild.
+def prepare_incremental(matches_df, odds_df, stats_df, prepared_df, state_df):
+    last_date = state_df["Date"].max()
+    match_dates = pd.to_datetime(matches_df["Date"], format="%d.%m.%Y")
+    new_matches_df = matches_df[match_dates >= last_date].copy()
+    new_stats_df = stats_df[stats_df.index.isin(new_matches_df.index)].copy()
+    new_matches_df, new_stats_df = translate_team_names([new_matches_df, new_stats_df])
+
+    # matches on the last saved date are only new if they did not make it into the state
+    processed = (pd.to_datetime(new_matches_df["Date"], format="%d.%m.%Y") == last_date) & new_matches_df.index.isin(state_df.index)
+    new_df = merge_past_and_upcoming(new_matches_df[~processed], odds_df, new_stats_df)
+
+    rolled_df = add_rolling_stats(pd.concat([state_df, new_df])).iloc[len(state_df):]
+    past_prepared_df = prepared_df[prepared_df["Targ_Var_Winner"].notna()]
+    prepared_df = pd.concat([past_prepared_df, finalize_prepared_data(rolled_df)])[prepared_df.columns]
+
+    new_past_df = new_df[new_df["Targ_Var_Winner"].notna()]
+    if not new_past_df.empty:
+        state_df = extract_rolling_state(pd.concat([state_df, new_past_df]))
+    return prepared_df, state_df
+
+def read_prepared_data_and_state(prepared_file_path=PREPARED_FILE_PATH, state_file_path=ROLLING_STATE_FILE_PATH):
+    prepared_df = dataset_store.widen(dataset_store.read_source(prepared_file_path))
+    state_df = dataset_store.widen(dataset_store.read_source(state_file_path))
+    return prepared_df, state_df
+
+# the files of the prepared data and rolling state: the complete ones, or those of the selected leagues and seasons
+# in SUBSET_DIR, e.g. ../data/prepared_subsets/Premier_League_last_2_seasons_prepared_data.csv
+def output_paths(leagues=None, last_n_seasons=None):
+    if leagues is None and last_n_seasons is None:
+        return PREPARED_FILE_PATH, ROLLING_STATE_FILE_PATH
+    name = "_".join([league.replace(".", "").replace(" ", "_") for league in sorted(leagues or ["all_leagues"])]
+                    + ([f"last_{last_n_seasons}_seasons"] if last_n_seasons is not None else []))
+    return os.path.join(SUBSET_DIR, name+"_prepared_data.csv"), os.path.join(SUBSET_DIR, name+"_rolling_state.csv")
+
+# checks that appending the most recent matches incrementally gives the same prepared data as a full rebuild
+def check_incremental_consistency(holdout_fraction=0.2):
+    matches_df, odds_df, stats_df = concat_all_data()
+    full_df, full_state_df = prepare_full(matches_df.copy(), odds_df.copy(), stats_df.copy())
+
+    match_dates = pd.to_datetime(matches_df["Date"], format="%d.%m.%Y")
+    cutoff_date = match_dates.sort_values().iloc[int(len(match_dates) * (1 - holdout_fraction))]
+    early_df, early_state_df = prepare_full(matches_df[match_dates < cutoff_date].copy(), odds_df.copy(), stats_df.copy())
+    incremental_df, incremental_state_df = prepare_incremental(matches_df.copy(), odds_df.copy(), stats_df.copy(),
+                                                               early_df, early_state_df)
+
+    print(f"Appended {len(incremental_df) - len(early_df[early_df['Targ_Var_Winner'].notna()])} rows "
+          f"incrementally from {cutoff_date.date()} on.")
+    for name, full, incremental in [("prepared data", full_df, incremental_df),
+                                    ("rolling state", full_state_df, incremental_state_df)]:
+        pd.testing.assert_frame_equal(incremental.sort_index(), full.sort_index(), check_exact=False, rtol=1e-9)
+        print(f"The incrementally built {name} is consistent with a full rebuild.")
+
+def main(incremental=False, leagues=None, last_n_seasons=None):
+    matches_df, odds_df, stats_df = concat_all_data(leagues, last_n_seasons)
+    prepared_file_path, state_file_path = output_paths(leagues, last_n_seasons)
+    if incremental and os.path.exists(prepared_file_path) and os.path.exists(state_file_path):
+        prepared_df, state_df = read_prepared_data_and_state(prepared_file_path, state_file_path)
+        prepared_df, state_df = prepare_incremental(matches_df, odds_df, stats_df, prepared_df, state_df)
+    else:
+        if incremental:
+            print("No prepared data or rolling state found. Rebuilding from scratch.")
+        prepared_df, state_df = prepare_full(matches_df, odds_df, stats_df)
 
-    complete_df = add_rolling_stats(complete_df)
-    complete_df = drop_unwanted_cols(complete_df)
-    complete_df = complete_df.dropna(subset=[col for col in complete_df.columns if "Targ_Var" not in col])
-    complete_df.to_csv("../data/complete_merged_and_prepared_data.csv")
+    os.makedirs(os.path.dirname(prepared_file_path), exist_ok=True)
+    dataset_store.write_source(prepared_df, prepared_file_path)
+    dataset_store.write_source(state_df, state_file_path)
+    print(f"Wrote the prepared data to {prepared_file_path} and the rolling state to {state_file_path}.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Merge the scraped data and prepare it for model training.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only featurize matches added since the last run and append them to the prepared data")
+    parser.add_argument("--check", action="store_true",
+                        help="check that incremental preparation is consistent with a full rebuild")
+    parser.add_argument("--leagues", nargs="+", help="only prepare these leagues, e.g. \"Premier League\", into "
+                                                     "files of their own in " + SUBSET_DIR)
+    parser.add_argument("--last-seasons", type=int, help="only prepare the most recent seasons of every league, into "
+                                                          "files of their own in " + SUBSET_DIR)
+    args = parser.parse_args()
+    if args.check:
+        check_incremental_consistency()
+    else:
+        main(incremental=args.incremental, leagues=args.leagues, last_n_seasons=args.last_seasons)
@@ -0,0 +1,130 @@
+'''
+Typed columnar storage for the data that is passed between the pipeline stages.
+Every CSV file in ../data gets a Feather counterpart in ../data/store with a fixed schema (categorical teams and
+leagues, real dates, float32 odds and small integer goals and statistics) that can be read memory-mapped and
+column by column instead of being re-parsed with inferred dtypes by every stage.
+'''
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+STORE_DIR = "../data/store"
+INDEX_NAME = "Match_ID"
+
+# oddsportal quotes decimal odds with two decimals, which float32 values can be widened back to exactly
+ODDS_DECIMALS = 2
+
+BOOKIES = ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"]
+ODDS_COLS = ["Odds_"+event+bookie for bookie in BOOKIES for event in ["Home_", "Draw_", "Away_"]]
+STATS = ["Attempts", "Attempts_On_Target", "Possession", "Passes",
+         "Passing_Accuracy", "Fouls", "Yellow_Cards", "Red_Cards", "Offside", "Corners"]
+STAT_COLS = [stat+"_"+team for stat in STATS for team in ["Home", "Away"]]
+
+SCHEMAS = {
+    "matches": {"Date": "datetime64[ns]", "League": "category", "Matchday": "category", "Team_Home": "category",
+                "Team_Away": "category", "Goals_Home": "Int8", "Goals_Away": "Int8"},
+    "statistics": {col: "Int16" for col in STAT_COLS},
+    "odds": {"Date": "datetime64[ns]", "Team_Home": "category", "Team_Away": "category", "Goals_Home": "Int8",
+             "Goals_Away": "Int8", **{col: "float32" for col in ODDS_COLS}, "Upcoming": "bool"},
+}
+
+# the prepared data has a variable set of columns, whose dtypes are derived from their names
+PREPARED_DTYPES = {"Date": "datetime64[ns]", "Team_Home": "category", "Team_Away": "category",
+                   "Targ_Var_Winner": "category", "Targ_Var_Difference": "Int8",
+                   "Targ_Var_Goals_Home": "Int8", "Targ_Var_Goals_Away": "Int8"}
+PREPARED_PREFIX_DTYPES = [("Odds_", "float32")]
+
+# returns "matches", "odds" or "statistics" for the scraped files and "prepared" otherwise
+def source_kind(file_path):
+    for kind in SCHEMAS:
+        if kind in os.path.basename(file_path):
+            return kind
+    return "prepared"
+
+def store_path(csv_path):
+    return os.path.join(STORE_DIR, os.path.splitext(os.path.basename(csv_path))[0] + ".feather")
+
+def schema_for(df, kind):
+    if kind in SCHEMAS:
+        missing = set(SCHEMAS[kind]) - set(df.columns)
+        if missing:
+            raise ValueError(f"The {kind} data is missing the columns {sorted(missing)}.")
+        return SCHEMAS[kind]
+    schema = {}
+    for col in df.columns:
+        if col in PREPARED_DTYPES:
+            schema[col] = PREPARED_DTYPES[col]
+        else:
+            schema[col] = next((dtype for prefix, dtype in PREPARED_PREFIX_DTYPES if col.startswith(prefix)), None)
+    return {col: dtype for col, dtype in schema.items() if dtype is not None}
+
+def _parse_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("datetime64[ns]")
+    try:
+        return pd.to_datetime(values, format="%d.%m.%Y")
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, format="mixed", dayfirst=True)
+
+# casts a scraped or prepared frame to the fixed schema of its kind
+def to_schema(df, kind):
+    df = df.copy()
+    for col, dtype in schema_for(df, kind).items():
+        if dtype.startswith("datetime"):
+            df[col] = _parse_dates(df[col])
+        elif dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype == "bool":
+            df[col] = df[col].astype(str).str.lower().eq("true") if df[col].dtype == object else df[col].astype(bool)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    df.index = df.index.astype(str)
+    df.index.name = INDEX_NAME
+    return df
+
+def write_store(df, kind, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # uncompressed so that the file can be memory-mapped when reading
+    feather.write_feather(to_schema(df, kind).reset_index(), path, compression="uncompressed")
+
+def read_store(path, columns=None):
+    if columns is not None:
+        columns = [INDEX_NAME] + [col for col in columns if col != INDEX_NAME]
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas().set_index(INDEX_NAME)
+
+# reads the typed counterpart of a CSV file and (re)builds it if the CSV has been written more recently
+def read_source(csv_path, columns=None):
+    path = store_path(csv_path)
+    if os.path.exists(path) and (not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        return read_store(path, columns)
+    write_store(pd.read_csv(csv_path, index_col=0), source_kind(csv_path), path)
+    return read_store(path, columns)
+
+# writes a frame both as CSV, which stays the human readable export, and to the typed store
+def write_source(df, csv_path):
+    df.to_csv(csv_path)
+    write_store(df, source_kind(csv_path), store_path(csv_path))
+
+# formats dates the way they are scraped from google and oddsportal, e.g. 18.9.2020
+def format_scraped_dates(dates):
+    return dates.dt.day.astype(str) + "." + dates.dt.month.astype(str) + "." + dates.dt.year.astype(str)
+
+# converts typed columns back to the dtypes that pandas infers for the CSV files, which the feature computations
+# in data_preparation and the scraping code work on
+def widen(df, scraped_dates=False):
+    df = df.copy()
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_integer_dtype(dtype):
+            df[col] = df[col].astype("float64" if df[col].hasnans else "int64")
+        elif dtype == np.float32:
+            values = df[col].astype("float64")
+            df[col] = values.round(ODDS_DECIMALS) if col.startswith("Odds_") else values
+        elif scraped_dates and pd.api.types.is_datetime64_any_dtype(dtype):
+            df[col] = format_scraped_dates(df[col])
+    return df
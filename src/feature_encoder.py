@@ -0,0 +1,93 @@
+'''
+Encoding of the prepared data into the feature matrices of the random forests.
+A FeatureEncoder is fitted once on the training rows: the teams are one-hot encoded against a fixed vocabulary (the
+training teams plus every other team of their leagues in team_aliases) and the numerical features are scaled with
+the statistics of the training rows only, so the other splits neither leak into the encoding nor end up with other
+columns. The encoded float32 matrices are cached in ../data/features, keyed on the feature set and a hash of the data.
+'''
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+import team_aliases
+
+FEATURE_CACHE_DIR = "../data/features"
+CATEGORICAL = ["Team_Home", "Team_Away", "League", "Matchday"]
+TEAM_FEATURES = ["Team_Home", "Team_Away"]
+
+class FeatureEncoder:
+    """One-hot encodes the categorical features and scales the numerical ones, with everything fitted on one frame"""
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.categorical = [f for f in self.features if f in CATEGORICAL]
+        self.numerical = [f for f in self.features if f not in CATEGORICAL]
+
+    def fit(self, df):
+        self.vocabulary = {}
+        for col in self.categorical:
+            values = set(pd.unique(df[col].dropna()))
+            if col in TEAM_FEATURES:
+                values |= set(team_aliases.league_teams(pd.unique(df[TEAM_FEATURES].to_numpy().ravel())))
+            self.vocabulary[col] = sorted(values, key=str)
+        self.scaler = StandardScaler().fit(df[self.numerical]) if self.numerical else None
+        # same column order as pd.get_dummies: the numerical features first, then the dummies of each categorical one
+        self.columns = self.numerical + [f"{col}_{value}" for col in self.categorical for value in self.vocabulary[col]]
+        return self
+
+    def transform(self, df):
+        X = np.zeros((len(df), len(self.columns)), dtype=np.float32)
+        if self.numerical:
+            X[:, :len(self.numerical)] = self.scaler.transform(df[self.numerical])
+        offset = len(self.numerical)
+        for col in self.categorical:
+            # values outside the vocabulary (and missing ones) get no dummy at all
+            codes = pd.Categorical(df[col].astype(object), categories=self.vocabulary[col]).codes
+            rows = np.flatnonzero(codes >= 0)
+            X[rows, offset + codes[rows]] = 1
+            offset += len(self.vocabulary[col])
+        return X
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+# hashes the splits together with the alias table, which the team vocabulary is taken from
+def data_hash(splits):
+    sha256 = hashlib.sha256(json.dumps(team_aliases.TEAM_ALIASES, sort_keys=True).encode())
+    for name, df in splits.items():
+        sha256.update(f"{name}:{list(df.columns)}".encode())
+        sha256.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return sha256.hexdigest()
+
+def cache_dir(feature_set_name, splits):
+    return os.path.join(FEATURE_CACHE_DIR, feature_set_name, "_".join(splits))
+
+# encodes a dict of splits with one encoder fitted on the first split. The encoder and the matrices are cached, so that
+# every feature set is encoded once per version of the data; older versions of the same splits are removed.
+def encode_splits(splits, features, feature_set_name):
+    splits = {name: df[features] for name, df in splits.items()}
+    directory = cache_dir(feature_set_name, splits)
+    path = os.path.join(directory, data_hash(splits)[:16])
+    encoder_path = os.path.join(path, "encoder.pkl")
+    # the encoder is written last, so a complete cache entry is one with an encoder
+    if os.path.exists(encoder_path):
+        with open(encoder_path, "rb") as file:
+            encoder = pickle.load(file)
+        return encoder, {name: np.load(os.path.join(path, name+".npy"), mmap_mode="r") for name in splits}
+
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(path)
+    encoder = FeatureEncoder(features).fit(next(iter(splits.values())))
+    matrices = {}
+    for name, df in splits.items():
+        matrices[name] = encoder.transform(df)
+        np.save(os.path.join(path, name+".npy"), matrices[name])
+    with open(encoder_path, "wb") as file:
+        pickle.dump(encoder, file)
+    return encoder, matrices
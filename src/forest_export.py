@@ -0,0 +1,131 @@
+'''
+Export of fitted random forests into flat node arrays and a vectorized NumPy predictor for them.
+All trees of a forest are concatenated into one set of arrays: int16 split features (-1 for leaves), float32
+thresholds, int32 left and right children (a leaf stores the row of its value as left child instead) and the float64
+values of the leaves only. The thresholds are rounded down to float32, which is exact because the trees compare
+float32 features with them. The arrays are stored as .npy files that are memory-mapped when loading, and the
+predictor walks all trees of a batch at once, accumulating the trees in the same order as sklearn so that its
+predictions are identical.
+'''
+
+import json
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+LEAF = -1
+ARRAYS = ["feature", "threshold", "children", "missing_left", "value", "roots"]
+
+class FlatForest:
+    """A random forest as flat node arrays, predicting like the forest it was exported from"""
+
+    def __init__(self, arrays, meta):
+        self.feature, self.threshold = arrays["feature"], arrays["threshold"]
+        self.children, self.missing_left = arrays["children"], arrays["missing_left"]
+        self.value, self.roots = arrays["value"], arrays["roots"]
+        self.meta = meta
+        self.classes_ = np.array(meta["classes"], dtype=object) if meta["classes"] is not None else None
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    # the value rows of the leaves that every sample ends up in, one column per tree
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_trees = len(X), len(self.roots)
+        has_nan = np.isnan(X).any()
+        X = X.ravel()
+        children = self.children.ravel()
+        leaves = np.empty(n_samples * n_trees, dtype=np.int32)
+        # the (sample, tree) pairs that have not reached a leaf yet, their current nodes and their rows in X
+        active = np.arange(n_samples * n_trees)
+        current = np.tile(self.roots, n_samples)
+        offset = np.repeat(np.arange(n_samples) * self.meta["n_features"], n_trees)
+        while len(active):
+            feature = self.feature[current]
+            inner = feature != LEAF
+            if not inner.all():
+                leaves[active[~inner]] = current[~inner]
+                active, current, feature, offset = active[inner], current[inner], feature[inner], offset[inner]
+            x = X[offset + feature]
+            go_right = ~(x <= self.threshold[current])
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.missing_left[current], go_right)
+            current = children[2 * current + go_right]
+        return self.children[leaves, 0].reshape(n_samples, n_trees)
+
+    def _accumulate(self, X):
+        leaves = self.apply(X)
+        total = np.zeros((len(leaves),) + self.value.shape[1:])
+        # tree by tree, like sklearn adds up the trees, so that the sums are the same to the last bit
+        for tree in range(leaves.shape[1]):
+            total += self.value[leaves[:, tree]]
+        return total / leaves.shape[1]
+
+    def predict_proba(self, X):
+        return self._accumulate(X)
+
+    def predict(self, X):
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self._accumulate(X), axis=1)]
+        prediction = self._accumulate(X)
+        return prediction[:, 0] if self.meta["n_outputs"] == 1 else prediction
+
+def flatten_forest(forest):
+    is_classifier = isinstance(forest, RandomForestClassifier)
+    if is_classifier and forest.n_outputs_ > 1:
+        raise ValueError("Only single output classifiers can be exported.")
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    if forest.n_features_in_ > np.iinfo(np.int16).max:
+        raise ValueError(f"{forest.n_features_in_} features do not fit into int16 feature indices.")
+
+    arrays = {name: [] for name in ARRAYS}
+    node_offset, leaf_offset = 0, 0
+    for tree in trees:
+        is_leaf = tree.children_left == -1
+        leaf_rows = np.cumsum(is_leaf) - 1 + leaf_offset
+        arrays["feature"].append(np.where(is_leaf, LEAF, tree.feature))
+        # float32 round towards minus infinity: x <= t holds for a float32 x exactly if x <= rounded t holds
+        threshold = tree.threshold.astype(np.float32)
+        too_large = threshold.astype(np.float64) > tree.threshold
+        threshold[too_large] = np.nextafter(threshold[too_large], np.float32(-np.inf))
+        arrays["threshold"].append(np.where(is_leaf, 0, threshold))
+        arrays["children"].append(np.stack([np.where(is_leaf, leaf_rows, tree.children_left + node_offset),
+                                            np.where(is_leaf, LEAF, tree.children_right + node_offset)], axis=1))
+        arrays["missing_left"].append(tree.missing_go_to_left.astype(bool))
+        value = tree.value[is_leaf]
+        # the classifier trees store the class fractions of their leaves, which predict_proba returns as they are
+        arrays["value"].append(value[:, 0, :forest.n_classes_] if is_classifier else value[:, :, 0])
+        arrays["roots"].append(node_offset)
+        node_offset += tree.node_count
+        leaf_offset += int(is_leaf.sum())
+
+    if node_offset > np.iinfo(np.int32).max:
+        raise ValueError(f"{node_offset} nodes do not fit into int32 child indices.")
+    dtypes = {"feature": np.int16, "threshold": np.float32, "children": np.int32,
+              "missing_left": np.bool_, "value": np.float64, "roots": np.int32}
+    arrays = {name: np.concatenate(parts) if name != "roots" else np.array(parts) for name, parts in arrays.items()}
+    arrays = {name: np.ascontiguousarray(array, dtype=dtypes[name]) for name, array in arrays.items()}
+    meta = {"classes": forest.classes_.tolist() if is_classifier else None, "n_outputs": forest.n_outputs_,
+            "n_features": forest.n_features_in_, "max_depth": max(tree.max_depth for tree in trees) + 1}
+    return FlatForest(arrays, meta)
+
+def save_flat_forest(flat_forest, path):
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, name+".npy"), getattr(flat_forest, name))
+    # written last, so that a directory with meta.json holds a complete export
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(flat_forest.meta, file)
+
+def load_flat_forest(path, mmap_mode="r"):
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    arrays = {name: np.load(os.path.join(path, name+".npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+    return FlatForest(arrays, meta)
+
+def export_forest(forest, path):
+    flat_forest = flatten_forest(forest)
+    save_flat_forest(flat_forest, path)
+    return flat_forest
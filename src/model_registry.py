@@ -0,0 +1,101 @@
+'''
+Registry of fitted models in ../data/models, so that the prediction only retrains when its training data changed.
+Every entry stores the models together with the feature encoder they were trained on and a manifest with the feature
+schema, and is versioned by a hash of the training data and the model parameters. The models are loaded lazily and
+memory-mapped, so scoring a few upcoming matches only pays for the models it actually uses. Next to the fitted
+forests, their flat node array exports (see forest_export) are stored, which load and predict small batches faster.
+'''
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+import joblib
+import feature_encoder
+import forest_export
+
+REGISTRY_DIR = "../data/models"
+# number of versions that are kept per model name, the older ones are removed when a new one is saved
+KEPT_VERSIONS = 3
+
+class RegistryEntry:
+    """The manifest, encoder and models of one version, with every model loaded on first use only"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as file:
+            self.manifest = json.load(file)
+        self._encoder = None
+        self._models = {}
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with open(os.path.join(self.path, "encoder.pkl"), "rb") as file:
+                self._encoder = pickle.load(file)
+        return self._encoder
+
+    def model(self, name):
+        if name not in self._models:
+            self._models[name] = joblib.load(os.path.join(self.path, name+".joblib"), mmap_mode="r")
+        return self._models[name]
+
+    # the forest as flat node arrays, which is exported from the fitted forest the first time it is needed
+    def flat_model(self, name):
+        key = name+".flat"
+        if key not in self._models:
+            path = os.path.join(self.path, key)
+            if os.path.exists(os.path.join(path, "meta.json")):
+                self._models[key] = forest_export.load_flat_forest(path)
+            else:
+                self._models[key] = forest_export.export_forest(self.model(name), path)
+        return self._models[key]
+
+# versions the models by the data they are trained on and their parameters
+def model_version(train_df, params):
+    sha256 = hashlib.sha256(feature_encoder.data_hash({"train": train_df}).encode())
+    sha256.update(json.dumps(params, sort_keys=True).encode())
+    return sha256.hexdigest()[:16]
+
+def entry_path(name, version):
+    return os.path.join(REGISTRY_DIR, name, version)
+
+# returns the registered version or None if the models have not been trained on this data yet
+def load_entry(name, version):
+    path = entry_path(name, version)
+    # the manifest is written last, so only complete entries are found
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    return RegistryEntry(path)
+
+def save_entry(name, version, models, encoder, targets, params):
+    path = entry_path(name, version)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    for model_name, model in models.items():
+        # uncompressed, so that the tree arrays can be memory-mapped when loading
+        joblib.dump(model, os.path.join(path, model_name+".joblib"))
+        forest_export.export_forest(model, os.path.join(path, model_name+".flat"))
+    with open(os.path.join(path, "encoder.pkl"), "wb") as file:
+        pickle.dump(encoder, file)
+    manifest = {"name": name, "version": version, "created": datetime.now().isoformat(timespec="seconds"),
+                "features": encoder.features, "columns": encoder.columns, "targets": targets, "params": params}
+    with open(os.path.join(path, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2, ensure_ascii=False)
+    prune_versions(name)
+    return RegistryEntry(path)
+
+def list_versions(name):
+    directory = os.path.join(REGISTRY_DIR, name)
+    if not os.path.isdir(directory):
+        return []
+    entries = [load_entry(name, version) for version in os.listdir(directory)]
+    entries = [entry for entry in entries if entry is not None]
+    return [entry.manifest["version"] for entry in sorted(entries, key=lambda entry: entry.manifest["created"])]
+
+def prune_versions(name, keep=KEPT_VERSIONS):
+    for version in list_versions(name)[:-keep]:
+        shutil.rmtree(entry_path(name, version))
@@ -1,10 +1,17 @@
 import pandas as pd
 import numpy as np
+import argparse
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, f1_score, mean_squared_error, mean_absolute_error, r2_score
 import matplotlib.pyplot as plt
 import seaborn as sns
+import dataset_store
+import feature_encoder
 
 def prepare_feature_sets(df):
     """Create different feature sets for evaluation"""
@@ -35,78 +42,170 @@ def chronological_split(df):
     
     return train, val, test
 
-def prepare_data(df, features):
-    """Prepare data for model training"""
-    categorical = ['Team_Home', 'Team_Away', "League", "Matchday"]
-    cat_features = [f for f in features if f in categorical]
-    num_features = [f for f in features if f not in categorical]
+def _score_classifier(clf, X_train, y_train, X_val, y_val):
+    train_pred, val_pred = clf.predict(X_train), clf.predict(X_val)
+    return {'train_acc': accuracy_score(y_train, train_pred),
+            'val_acc': accuracy_score(y_val, val_pred),
+            'train_f1': f1_score(y_train, train_pred, average='weighted'),
+            'val_f1': f1_score(y_val, val_pred, average='weighted')}
+
+def _score_regressor(reg, X_train, y_train, X_val, y_val):
+    train_pred, val_pred = reg.predict(X_train), reg.predict(X_val)
+    return {'train_mse': mean_squared_error(y_train, train_pred),
+            'val_mse': mean_squared_error(y_val, val_pred),
+            'train_r2': r2_score(y_train, train_pred),
+            'val_r2': r2_score(y_val, val_pred)}
+
+def _load_search_data(features_name, model_type, data_dir):
+    """Memory-map the matrices of a feature set and pick the forest and scoring for the model type"""
+    load = lambda name: np.load(os.path.join(data_dir, f"{features_name}_{name}.npy"), mmap_mode="r")
+    target = "winner" if model_type == "classifier" else "difference"
+    arrays = load("X_train"), load(f"y_train_{target}"), load("X_val"), load(f"y_val_{target}")
+    if model_type == "classifier":
+        return (*arrays, RandomForestClassifier, _score_classifier)
+    return (*arrays, RandomForestRegressor, _score_regressor)
+
+def _fit_and_score(job):
+    """Grow one forest of the grid on the memory-mapped matrices of its feature set and score it at every tree count"""
+    features_name, params, n_estimators_levels, model_type, data_dir = job
+    X_train, y_train, X_val, y_val, model, score = _load_search_data(features_name, model_type, data_dir)
     
-    # Handle categorical features
-    X = pd.get_dummies(df[features], columns=cat_features)
+    # with warm_start every fit only adds the missing trees, and sklearn draws their seeds as if the forest had been
+    # fitted in one go, so each level is identical to a forest trained from scratch with that many trees
+    forest = model(**params, n_estimators=n_estimators_levels[0], warm_start=True, random_state=42)
+    scores = []
+    for n_estimators in n_estimators_levels:
+        forest.set_params(n_estimators=n_estimators)
+        forest.fit(X_train, y_train)
+        scores.append(score(forest, X_train, y_train, X_val, y_val))
+    return scores
+
+def _grow_and_score(job):
+    """Grow a forest of the successive halving search to the tree count of the current rung and score it"""
+    features_name, params, n_estimators, model_type, data_dir, forest_path, keep = job
+    X_train, y_train, X_val, y_val, model, score = _load_search_data(features_name, model_type, data_dir)
     
-    # Scale numerical features if there are any
-    if num_features:
-        scaler = StandardScaler()
-        X[num_features] = scaler.fit_transform(X[num_features])
+    if os.path.exists(forest_path):
+        with open(forest_path, "rb") as file:
+            forest = pickle.load(file)
+    else:
+        forest = model(**params, warm_start=True, random_state=42)
+    forest.set_params(n_estimators=n_estimators)
+    forest.fit(X_train, y_train)
     
-    return X
+    # survivors are grown further in the next rung, possibly by another worker
+    if keep:
+        with open(forest_path, "wb") as file:
+            pickle.dump(forest, file)
+    elif os.path.exists(forest_path):
+        os.remove(forest_path)
+    return score(forest, X_train, y_train, X_val, y_val)
 
-def train_and_evaluate_models(df, param_grid):
-    """Train and evaluate models with different parameters and feature sets"""
-    train, val, test = chronological_split(df)
-    feature_sets = prepare_feature_sets(df)
-    results = []
-    
+def write_search_matrices(train, val, feature_sets, data_dir):
+    """Write the feature matrices and targets as .npy files that the search workers memory-map"""
     for features_name, features in feature_sets.items():
         print(f"Processing feature set: {features_name}")
-        X_train = prepare_data(train, features)
-        X_val = prepare_data(val, features)
-        X_test = prepare_data(test, features)
+        _, matrices = feature_encoder.encode_splits({"train": train, "val": val}, features, features_name)
         
-        # Ensure consistent columns
-        for col in set(X_train.columns) - set(X_val.columns):
-            X_val[col] = 0
-        for col in set(X_train.columns) - set(X_test.columns):
-            X_test[col] = 0
-            
-        X_val = X_val[X_train.columns]
-        X_test = X_test[X_train.columns]
+        arrays = {"X_train": matrices["train"], "X_val": matrices["val"],
+                  "y_train_winner": train['Targ_Var_Winner'].to_numpy(dtype=str),
+                  "y_val_winner": val['Targ_Var_Winner'].to_numpy(dtype=str),
+                  "y_train_difference": train['Targ_Var_Difference'].to_numpy(dtype=float),
+                  "y_val_difference": val['Targ_Var_Difference'].to_numpy(dtype=float)}
+        for name, array in arrays.items():
+            np.save(os.path.join(data_dir, f"{features_name}_{name}.npy"), np.ascontiguousarray(array))
+
+def _map(func, jobs, executor):
+    return [func(job) for job in jobs] if executor is None else list(executor.map(func, jobs))
+
+def _grid_search(feature_sets, forest_configs, data_dir, executor):
+    """Score every configuration at every tree count of the grid"""
+    jobs = [(features_name, dict(config), sorted(levels), model_type, data_dir)
+            for features_name in feature_sets for config, levels in forest_configs.items()
+            for model_type in ["classifier", "regressor"]]
+    
+    # start the largest forests first so that no worker is left with a big one at the end
+    jobs = sorted(jobs, key=lambda job: -job[2][-1])
+    job_scores = _map(_fit_and_score, jobs, executor)
+    print(f"Grew {len(jobs)} forests with {sum(job[2][-1] for job in jobs)} trees in total.")
+    
+    scores = {}
+    for (features_name, params, levels, model_type, _), level_scores in zip(jobs, job_scores):
+        for n_estimators, level_score in zip(levels, level_scores):
+            scores[(features_name, tuple(params.items()), n_estimators, model_type)] = level_score
+    return scores
+
+def _successive_halving(feature_sets, forest_configs, data_dir, executor, eta):
+    """Grow all configurations to the smallest tree count of the grid and only keep growing the best 1/eta of them
+    (by val_acc for the classifiers and val_mse for the regressors) at every further tree count"""
+    rungs = sorted(set().union(*forest_configs.values()))
+    config_ids = {config: i for i, config in enumerate(forest_configs)}
+    objectives = {"classifier": lambda score: -score["val_acc"], "regressor": lambda score: score["val_mse"]}
+    candidates = {model_type: [(features_name, config) for features_name in feature_sets for config in forest_configs]
+                  for model_type in objectives}
+    
+    scores, trees = {}, 0
+    for rung, n_estimators in enumerate(rungs):
+        last = rung == len(rungs) - 1
+        jobs = [(features_name, dict(config), n_estimators, model_type, data_dir,
+                 os.path.join(data_dir, f"{model_type}_{features_name}_{config_ids[config]}.pkl"), not last)
+                for model_type, model_candidates in candidates.items() for features_name, config in model_candidates]
+        for job, score in zip(jobs, _map(_grow_and_score, jobs, executor)):
+            scores[(job[0], tuple(job[1].items()), n_estimators, job[3])] = score
+        trees += len(jobs) * (n_estimators - (rungs[rung - 1] if rung else 0))
+        print(f"Rung {rung + 1}/{len(rungs)}: scored {len(jobs)} forests with {n_estimators} trees.")
         
+        if not last:
+            for model_type, objective in objectives.items():
+                ranked = sorted(candidates[model_type], key=lambda candidate: objective(
+                    scores[(candidate[0], candidate[1], n_estimators, model_type)]))
+                candidates[model_type] = ranked[:max(1, -(-len(ranked) // eta))]
+    print(f"Grew {trees} trees in total.")
+    return scores
+
+def train_and_evaluate_models(df, param_grid, n_workers=1, search="grid", eta=3):
+    """Train and evaluate models with different parameters and feature sets, spread over n_workers processes.
+    search="halving" only grows the most promising configurations to the larger tree counts, so the classifier or
+    regressor metrics of the configurations it dropped early are missing (NaN) for those tree counts."""
+    train, val, test = chronological_split(df)
+    feature_sets = prepare_feature_sets(df)
+    
+    # one forest per configuration is grown through all tree counts of the grid that share it
+    forest_configs = {}
+    for params in param_grid:
+        config = tuple((key, value) for key, value in params.items() if key != "n_estimators")
+        forest_configs.setdefault(config, set()).add(params["n_estimators"])
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_search_matrices(train, val, feature_sets, data_dir)
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        try:
+            if search == "halving":
+                scores = _successive_halving(feature_sets, forest_configs, data_dir, executor, eta)
+            else:
+                scores = _grid_search(feature_sets, forest_configs, data_dir, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        print(f"The {search} search took {time.perf_counter() - start:.1f}s with {n_workers} worker(s).")
+    
+    results = []
+    for features_name in feature_sets:
         for params in param_grid:
-            print(f"Training with params: {params}")
-            
-            # Classification model
-            clf = RandomForestClassifier(**params, random_state=42)
-            clf.fit(X_train, train['Targ_Var_Winner'])
-            
-            train_acc = accuracy_score(train['Targ_Var_Winner'], clf.predict(X_train))
-            val_acc = accuracy_score(val['Targ_Var_Winner'], clf.predict(X_val))
-            train_f1 = f1_score(train['Targ_Var_Winner'], clf.predict(X_train), average='weighted')
-            val_f1 = f1_score(val['Targ_Var_Winner'], clf.predict(X_val), average='weighted')
-            
-            # Regression model
-            reg = RandomForestRegressor(**params, random_state=42)
-            reg.fit(X_train, train['Targ_Var_Difference'])
-            
-            train_mse = mean_squared_error(train['Targ_Var_Difference'], reg.predict(X_train))
-            val_mse = mean_squared_error(val['Targ_Var_Difference'], reg.predict(X_val))
-            train_r2 = r2_score(train['Targ_Var_Difference'], reg.predict(X_train))
-            val_r2 = r2_score(val['Targ_Var_Difference'], reg.predict(X_val))
-            
+            config = tuple((key, value) for key, value in params.items() if key != "n_estimators")
+            classifier = scores.get((features_name, config, params["n_estimators"], "classifier"))
+            regressor = scores.get((features_name, config, params["n_estimators"], "regressor"))
+            if classifier is None and regressor is None:
+                continue
             results.append({
                 'features': features_name,
                 'n_estimators': params["n_estimators"],
                 "max_depth": params["max_depth"],
                 "min_samples_split": params["min_samples_split"],
                 "min_samples_leaf": params["min_samples_leaf"],
-                'train_acc': train_acc,
-                'val_acc': val_acc,
-                'train_f1': train_f1,
-                'val_f1': val_f1,
-                'train_mse': train_mse,
-                'val_mse': val_mse,
-                'train_r2': train_r2,
-                'val_r2': val_r2
+                **(classifier or dict.fromkeys(['train_acc', 'val_acc', 'train_f1', 'val_f1'], np.nan)),
+                **(regressor or dict.fromkeys(['train_mse', 'val_mse', 'train_r2', 'val_r2'], np.nan))
             })
     
     return pd.DataFrame(results)
@@ -165,54 +264,57 @@ param_grid = [
     for l in [1, 2, 4]
 ]
 
-# Run analysis
-df = pd.read_csv("../data/complete_merged_and_prepared_data.csv", index_col = 0)
-df["Date"] = pd.to_datetime(df["Date"])
-
-results = train_and_evaluate_models(df, param_grid)
-results.to_csv("../data/model_evaluation_results.csv")
-plot_results(results).savefig("../plots/evaluation_parameters.png")
-
-results.sort_values("val_acc", ascending=False).head(10)
-results.sort_values("val_f1", ascending=False).head(10)
-results.sort_values("val_mse").head(10)
-results.sort_values("val_r2", ascending=False).head(10)
-
-train, val, test = chronological_split(df)
-train_plus_val = pd.concat([train, val])
-
-features = prepare_feature_sets(df)["all_features"]
-features
-
-X_train_plus_val = prepare_data(train_plus_val, features)
-X_test = prepare_data(test, features)
-
-# Ensure consistent columns
-for col in set(X_train_plus_val.columns) - set(X_test.columns):
-    X_test[col] = 0
+def main(n_workers=1, search="grid"):
+    df = dataset_store.widen(dataset_store.read_source("../data/complete_merged_and_prepared_data.csv"))
+    df = df.dropna(subset=["Targ_Var_Winner"])
     
-X_test = X_test[X_train_plus_val.columns]
-
-# Classification model
-clf = RandomForestClassifier(n_estimators=200, max_depth=25, min_samples_split=10, min_samples_leaf=2, random_state=37)
-clf.fit(X_train_plus_val, train_plus_val['Targ_Var_Winner'])
-
-train_acc = accuracy_score(train_plus_val['Targ_Var_Winner'], clf.predict(X_train_plus_val))
-test_acc = accuracy_score(test['Targ_Var_Winner'], clf.predict(X_test))
-train_f1 = f1_score(train_plus_val['Targ_Var_Winner'], clf.predict(X_train_plus_val), average='weighted')
-test_f1 = f1_score(test['Targ_Var_Winner'], clf.predict(X_test), average='weighted')
-
-# Regression model
-reg = RandomForestRegressor(n_estimators=100, max_depth = 30, min_samples_split = 5, min_samples_leaf = 1, random_state=37)
-reg.fit(X_train_plus_val, train_plus_val['Targ_Var_Difference'])
-
-train_mse = mean_squared_error(train_plus_val['Targ_Var_Difference'], reg.predict(X_train_plus_val))
-test_mse = mean_squared_error(test['Targ_Var_Difference'], reg.predict(X_test))
-train_r2 = r2_score(train_plus_val['Targ_Var_Difference'], reg.predict(X_train_plus_val))
-test_r2 = r2_score(test['Targ_Var_Difference'], reg.predict(X_test))
-
-print(train_acc)
-print(test_acc)
+    results = train_and_evaluate_models(df, param_grid, n_workers, search)
+    results.to_csv("../data/model_evaluation_results.csv")
+    plot_results(results).savefig("../plots/evaluation_parameters.png")
+    
+    print(results.sort_values("val_acc", ascending=False).head(10))
+    print(results.sort_values("val_f1", ascending=False).head(10))
+    print(results.sort_values("val_mse").head(10))
+    print(results.sort_values("val_r2", ascending=False).head(10))
+    
+    train, val, test = chronological_split(df)
+    train_plus_val = pd.concat([train, val])
+    
+    features = prepare_feature_sets(df)["all_features"]
+    
+    _, matrices = feature_encoder.encode_splits({"train_plus_val": train_plus_val, "test": test}, features, "all_features")
+    X_train_plus_val, X_test = matrices["train_plus_val"], matrices["test"]
+    
+    # Classification model
+    clf = RandomForestClassifier(n_estimators=200, max_depth=25, min_samples_split=10, min_samples_leaf=2, random_state=37)
+    clf.fit(X_train_plus_val, train_plus_val['Targ_Var_Winner'])
+    
+    train_acc = accuracy_score(train_plus_val['Targ_Var_Winner'], clf.predict(X_train_plus_val))
+    test_acc = accuracy_score(test['Targ_Var_Winner'], clf.predict(X_test))
+    train_f1 = f1_score(train_plus_val['Targ_Var_Winner'], clf.predict(X_train_plus_val), average='weighted')
+    test_f1 = f1_score(test['Targ_Var_Winner'], clf.predict(X_test), average='weighted')
+    
+    # Regression model
+    reg = RandomForestRegressor(n_estimators=100, max_depth = 30, min_samples_split = 5, min_samples_leaf = 1, random_state=37)
+    reg.fit(X_train_plus_val, train_plus_val['Targ_Var_Difference'])
+    
+    train_mse = mean_squared_error(train_plus_val['Targ_Var_Difference'], reg.predict(X_train_plus_val))
+    test_mse = mean_squared_error(test['Targ_Var_Difference'], reg.predict(X_test))
+    train_r2 = r2_score(train_plus_val['Targ_Var_Difference'], reg.predict(X_train_plus_val))
+    test_r2 = r2_score(test['Targ_Var_Difference'], reg.predict(X_test))
+    
+    print(train_acc)
+    print(test_acc)
+    
+    print(train_mse)
+    print(test_mse)
 
-print(train_mse)
-print(test_mse)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the random forests on a grid of parameters and feature sets.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of processes the grid search is spread over (default: all cores)")
+    parser.add_argument("--search", choices=["grid", "halving"], default="grid",
+                        help="score the full grid or only grow the most promising configurations to the larger "
+                             "tree counts by successive halving (default: grid)")
+    args = parser.parse_args()
+    main(args.workers, args.search)
@@ -0,0 +1,199 @@
+'''
+Archive of every page the scrapers fetched, so that the matches, statistics and odds can be parsed again without a
+browser when the markup or a parser changes.
+The pages are stored gzip compressed under the sha256 of their content in ../data/archive/pages, so a page that is
+fetched again unchanged is only stored once. index.jsonl records every fetch with its URL, timestamp, page kind,
+league, season and match. The re-parse command rebuilds the scraped CSV files from the latest snapshot of every page,
+e.g. "python page_archive.py --league "1. Bundesliga" --season 2023/24". With --check, the re-parsed rows are compared
+with the rows stored in ../data instead, which shows whether the parsers still read the fetched pages the way they did
+when the data was scraped, e.g. "python page_archive.py --check".
+'''
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import catalog
+import dataset_store
+import page_parsing
+
+ARCHIVE_DIR = "../data/archive"
+REPARSED_DIR = "../data/reparsed"
+# the pages the scrapers fetch: a google league page with all its matches, the google page of a match after its
+# statistics were expanded, an oddsportal results page and the odds page of a match
+KINDS = ["google_matches", "google_statistics", "odds_events", "match_odds"]
+# shared by the archives of all partitions, which are scraped side by side by the scrape scheduler
+INDEX_LOCK = threading.Lock()
+
+class PageArchive:
+    """Saves the pages fetched while scraping a league and season into the archive. Thread-safe."""
+
+    def __init__(self, league, season, directory=ARCHIVE_DIR):
+        self.league, self.season, self.directory = league, season, directory
+        os.makedirs(os.path.join(directory, "pages"), exist_ok=True)
+
+    def save(self, kind, url, page_source, match=None):
+        data = page_source.encode()
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = page_path(sha256, self.directory)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written under a temporary name first, so that a page in the archive is always complete
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(gzip.compress(data, compresslevel=6))
+            os.replace(temp_path, path)
+        entry = {"url": url, "fetched_at": datetime.now().isoformat(timespec="milliseconds"), "sha256": sha256,
+                 "kind": kind, "league": self.league, "season": self.season, "match": match, "bytes": len(data)}
+        with INDEX_LOCK:
+            with open(os.path.join(self.directory, "index.jsonl"), "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return sha256
+
+def page_path(sha256, directory=ARCHIVE_DIR):
+    return os.path.join(directory, "pages", sha256[:2], sha256 + ".html.gz")
+
+def load_page(sha256, directory=ARCHIVE_DIR):
+    with open(page_path(sha256, directory), "rb") as file:
+        return gzip.decompress(file.read()).decode()
+
+# every fetch in the archive, optionally only those of some kinds, leagues or seasons
+def read_index(directory=ARCHIVE_DIR, kinds=None, leagues=None, seasons=None):
+    try:
+        with open(os.path.join(directory, "index.jsonl"), encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            # the last line of a scraper that was killed while writing it
+            continue
+    index = pd.DataFrame(entries, columns=["url", "fetched_at", "sha256", "kind", "league", "season", "match", "bytes"])
+    for col, values in [("kind", kinds), ("league", leagues), ("season", seasons)]:
+        if values is not None:
+            index = index[index[col].isin(values)]
+    return index
+
+# the latest snapshot of every page: per match for the match pages and per URL for the others
+def latest_pages(index):
+    key = index["match"].where(index["match"].notna(), index["url"])
+    return index.assign(key=key).sort_values("fetched_at", kind="stable").drop_duplicates(["kind", "key"], keep="last")
+
+def reparse_partition(index, league, season, directory=ARCHIVE_DIR):
+    """Rebuild the matches, statistics and odds of a league and season from the latest archived pages"""
+    pages = latest_pages(index[(index["league"] == league) & (index["season"] == season)])
+    pages_of = lambda kind: pages[pages["kind"] == kind]
+
+    matches = {}
+    for sha256 in pages_of("google_matches")["sha256"]:
+        matches.update(page_parsing.parse_google_matches(load_page(sha256, directory), league))
+    matches_df = pd.DataFrame.from_dict(matches, orient="index", columns=dataset_store.SCHEMAS["matches"].keys())
+
+    # like the scrapers, pages whose statistics were parsed only in part are skipped instead of shifting the columns
+    statistics = {}
+    for match, sha256 in pages_of("google_statistics")[["match", "sha256"]].itertuples(index=False):
+        row = page_parsing.parse_google_statistics(load_page(sha256, directory))
+        if len(row) != len(dataset_store.STAT_COLS):
+            print(f"Skipped the statistics of {match}: {len(row)} of {len(dataset_store.STAT_COLS)} values in page {sha256}.")
+            continue
+        statistics[match] = row
+    stats_df = pd.DataFrame.from_dict(statistics, orient="index", columns=dataset_store.STAT_COLS)
+
+    match_odds = dict(pages_of("match_odds")[["match", "sha256"]].itertuples(index=False))
+    odds = {}
+    for sha256 in pages_of("odds_events")["sha256"]:
+        for event in page_parsing.parse_odds_events(load_page(sha256, directory), season):
+            idx = "_".join([event["date"], event["team_home"], event["team_away"],
+                            str(event["goals_home"]), str(event["goals_away"])])
+            if idx not in match_odds:
+                continue
+            odds_dict = page_parsing.parse_match_odds(load_page(match_odds[idx], directory))
+            odds[idx] = ([event["date"], event["team_home"], event["team_away"], event["goals_home"], event["goals_away"]]
+                         + [odds_dict[event_type+bookie] for bookie in dataset_store.BOOKIES
+                            for event_type in ["Home_", "Draw_", "Away_"]]
+                         + [season == catalog.UPCOMING_SEASON])
+    odds_df = pd.DataFrame.from_dict(odds, orient="index", columns=dataset_store.SCHEMAS["odds"].keys())
+
+    frames = {"matches": matches_df, "statistics": stats_df, "odds": odds_df}
+    for df in frames.values():
+        df.index.name = dataset_store.INDEX_NAME
+    return {source: df for source, df in frames.items() if len(df)}
+
+def reparse(directory=ARCHIVE_DIR, output_dir=REPARSED_DIR, leagues=None, seasons=None, in_place=False):
+    """Rebuild the scraped CSV files of all archived partitions, into output_dir or over the files in ../data
+    (and the typed store) if in_place"""
+    start = time.perf_counter()
+    index = read_index(directory, leagues=leagues, seasons=seasons)
+    rows = []
+    for league, season in index[["league", "season"]].drop_duplicates().itertuples(index=False):
+        for source, df in reparse_partition(index, league, season, directory).items():
+            csv_path = catalog.partition_path(league, season, source)
+            if in_place:
+                dataset_store.write_source(df, csv_path)
+            else:
+                os.makedirs(output_dir, exist_ok=True)
+                csv_path = os.path.join(output_dir, os.path.basename(csv_path))
+                df.to_csv(csv_path)
+            rows.append({"league": league, "season": season, "source": source, "rows": len(df), "file": csv_path})
+    print(f"Re-parsed {len(index)} archived pages in {time.perf_counter() - start:.1f}s.")
+    return pd.DataFrame(rows, columns=["league", "season", "source", "rows", "file"])
+
+def check(directory=ARCHIVE_DIR, leagues=None, seasons=None):
+    """Compare the rows re-parsed from the latest archived pages with the rows stored in ../data. Every re-parsed row
+    has to be stored with identical values, as the scrapers stored what the parsers returned for the same pages."""
+    index = read_index(directory, leagues=leagues, seasons=seasons)
+    rows = []
+    for league, season in index[["league", "season"]].drop_duplicates().itertuples(index=False):
+        for source, df in reparse_partition(index, league, season, directory).items():
+            normalize = lambda df: dataset_store.widen(dataset_store.to_schema(df, source),
+                                                       scraped_dates=source != "statistics")
+            csv_path = catalog.partition_path(league, season, source)
+            stored = normalize(pd.read_csv(csv_path, index_col=0)) if os.path.exists(csv_path) else df.iloc[:0]
+            parsed = normalize(df)
+            common = parsed.index.intersection(stored.index)
+            parsed_rows, stored_rows = parsed.loc[common, stored.columns], stored.loc[common]
+            differing = common[~((parsed_rows == stored_rows) | (parsed_rows.isna() & stored_rows.isna())).all(axis=1)]
+            rows.append({"league": league, "season": season, "source": source, "parsed": len(parsed),
+                         "not_stored": len(parsed) - len(common), "differing": len(differing),
+                         "examples": ", ".join(list(parsed.index.difference(common)[:2]) + list(differing[:2]))})
+    return pd.DataFrame(rows, columns=["league", "season", "source", "parsed", "not_stored", "differing", "examples"])
+
+def main(leagues=None, seasons=None, output_dir=REPARSED_DIR, in_place=False, check_only=False):
+    if check_only:
+        checked = check(ARCHIVE_DIR, leagues, seasons)
+        if checked.empty:
+            sys.exit(f"No archived pages found in {ARCHIVE_DIR}.")
+        print(checked.to_string(index=False))
+        if (checked["not_stored"] + checked["differing"]).any():
+            sys.exit("The archived pages do not parse into the stored rows.")
+        print("The archived pages parse into the stored rows.")
+        return
+    written = reparse(ARCHIVE_DIR, output_dir, leagues, seasons, in_place)
+    if written.empty:
+        print(f"No archived pages found in {ARCHIVE_DIR}.")
+    else:
+        print(written.to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the scraped CSV files from the archived pages.")
+    parser.add_argument("--league", action="append",
+                        help="only re-parse this league, can be given several times (default: all)")
+    parser.add_argument("--season", action="append",
+                        help="only re-parse this season, can be given several times (default: all)")
+    parser.add_argument("--output-dir", default=REPARSED_DIR,
+                        help=f"directory the CSV files are written to (default: {REPARSED_DIR})")
+    parser.add_argument("--in-place", action="store_true",
+                        help="overwrite the scraped files in ../data and the typed store instead")
+    parser.add_argument("--check", action="store_true",
+                        help="only compare the re-parsed rows with the stored ones, exits with 1 if they differ")
+    args = parser.parse_args()
+    main(args.league, args.season, args.output_dir, args.in_place, args.check)
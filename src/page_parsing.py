@@ -0,0 +1,182 @@
+'''
+Parsing of the scraped pages from a single page_source snapshot instead of WebDriver calls on the live page.
+Every find_element(s) and .text call of the scraping code is a round-trip to the browser, so the matches, statistics
+and odds of a page are extracted from one HTML snapshot with lxml instead, by the same class names. rendered_text
+follows WebDriver's visible text rules closely enough for these pages: block elements start a new line, hidden
+elements are left out and whitespace is collapsed. As the parsers only need the HTML, they work on saved pages too.
+'''
+
+import re
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from lxml import etree, html
+import dataset_store
+
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "details", "dialog", "div", "dl", "dt", "fieldset",
+              "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li",
+              "main", "nav", "ol", "p", "pre", "section", "summary", "table", "tbody", "tfoot", "thead", "tr", "ul"}
+CELL_TAGS = {"td", "th"}
+SKIPPED_TAGS = {"head", "noscript", "script", "style", "template", "title"}
+ODDS_ROW_CLASSES = "flex.text-xs.h-9.border-black-borders"
+
+def parse_page(page_source):
+    return html.fromstring(page_source)
+
+# compiled XPath of the elements that have all the given classes, written like a CSS class selector without the
+# leading dot, e.g. "flex.text-xs". The content of templates is not part of the live page, so it is not searched.
+@lru_cache(maxsize=None)
+def _class_xpath(class_names):
+    conditions = "".join(f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+                         for name in class_names.split("."))
+    return etree.XPath(".//*"+conditions+"[not(ancestor::template)]")
+
+def find_all(element, class_names):
+    return _class_xpath(class_names)(element)
+
+def _is_hidden(element):
+    return (element.tag in SKIPPED_TAGS or element.get("hidden") is not None
+            or "display:none" in (element.get("style") or "").replace(" ", ""))
+
+def _collect_text(element, parts):
+    # comments and processing instructions have no string tag, only their tail text is shown
+    if not isinstance(element.tag, str) or _is_hidden(element):
+        return
+    block = element.tag in BLOCK_TAGS
+    if block or element.tag == "br":
+        parts.append("\n")
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    if block:
+        parts.append("\n")
+    elif element.tag in CELL_TAGS:
+        parts.append(" ")
+
+# the text of an element like WebDriver's .text returns it
+def rendered_text(element):
+    parts = []
+    _collect_text(element, parts)
+    lines = [" ".join(line.split()) for line in "".join(parts).split("\n")]
+    return "\n".join(line for line in lines if line)
+
+# returns the date in pandas datetime format from the google date text of football matches
+def extract_date_from_google_text(text):
+    if ("Heute" in text) or ("Gestern" in text):
+        if "Heute" in text:
+            date = datetime.now().date()
+        else:
+            date = datetime.now().date() - pd.Timedelta(days=1)
+        day = date.day
+        month = date.month
+        year = date.year
+    else:
+        d = re.search(r"\d{1,2}\.\d{1,2}\.", text)
+        day, month = d.group().split(".")[0:2]
+
+        # Find out the year, which is either given as two digits by google, ...
+        if y := re.search(r"\d{1,2}\.\d{1,2}\.\d{2}", text):
+            year = "20" + y.group().split('.')[2]
+        # or not explicitly written out if it is recent. In that case it is either the current year or the last year.
+        else:
+            current_year = datetime.now().year 
+            if datetime.strptime(f"{day}.{month}.{str(current_year)}", "%d.%m.%Y").date() <= datetime.now().date():
+                year = str(current_year)
+            else:
+                year = str(current_year-1)
+
+    # Reconstruct the date string
+    return f"{day}.{month}.{year}"
+
+# the finished matches of a google league page as {idx: [date, league, matchday, team_home, team_away, goals_home,
+# goals_away]} in the order of the page
+def parse_google_matches(page_source, league):
+    matches = {}
+    matchday_text = "No matchday text found"
+    for matchday in find_all(parse_page(page_source), "OcbAbf"):
+        headers = find_all(matchday, "GVj7ae")
+        if headers:
+            matchday_text = rendered_text(headers[0])
+
+        # some "KAIX8d" elements are empty, and only matches with a result line that has a score are finished
+        for match in find_all(matchday, "KAIX8d"):
+            if rendered_text(match) == "":
+                continue
+            result_lines = find_all(match, "imspo_mt__tt-w")
+            if not result_lines or not find_all(result_lines[0], "imspo_mt__t-sc"):
+                continue
+            date = extract_date_from_google_text(rendered_text(find_all(match, "GOsQPe")[0]))
+            teams = [rendered_text(team).split("\n") for team in find_all(match, "L5Kkcd")]
+            team_home, team_away = [team[1] for team in teams]
+            goals_home, goals_away = [team[0] for team in teams]
+            idx = "_".join([date, team_home, team_away, goals_home, goals_away])
+            matches[idx] = [date, league, matchday_text, team_home, team_away, goals_home, goals_away]
+    return matches
+
+# the 20 statistics of a google match page after "Mehr zu diesem Spiel" was clicked, or NaNs if it has none
+def parse_google_statistics(page_source):
+    statistics = find_all(parse_page(page_source), "MzWkAb")
+    if not statistics:
+        return [np.nan]*20
+    return [w for statistic in statistics[:10] for w in rendered_text(statistic).split() if w.isdigit()]
+
+def extract_oddsportal_date(text, last_date):
+    if any([day in text for day in ["Today", "Yesterday", "Tomorrow"]]):
+        if "Today" in text:
+            date = datetime.now().date()
+        elif "Yesterday" in text:
+            date = datetime.now().date() - pd.Timedelta(days=1)
+        elif "Tomorrow" in text:
+            date = datetime.now().date() + pd.Timedelta(days=1)
+        day = date.day
+        month = date.month
+        year = date.year
+    else:
+        d = re.search(r"\d{2}\s(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s\d{4}", text)
+        if d:
+            date_str = d.group()
+            day = int(date_str[:2])
+            month = datetime.strptime(date_str[3:6], '%b').month
+            year = int(date_str[-4:])
+        else:
+            return last_date
+    return f"{day}.{month}.{year}"
+
+def extract_teams_and_goals(text, season):
+    infos = text.split("\n")
+    if season != "Upcoming Matches":
+        if not "pen." in text:
+            return [infos[i] for i in [-9, -5, -8, -6]]
+        else:
+            return [infos[i-1] for i in [-9, -5, -8, -6]]
+    else:
+        return [infos[-7], infos[-5], None, None]
+
+# the matches of an oddsportal results (or upcoming matches) page with their date, teams, goals and the link to
+# their odds, in the order of the page. date is the date of the matches above the first row, if they are continued.
+def parse_odds_events(page_source, season, date=None):
+    events = []
+    for event_row in find_all(parse_page(page_source), "eventRow"):
+        event_text = rendered_text(event_row)
+        date = extract_oddsportal_date(event_text, date)
+        team_home, team_away, goals_home, goals_away = extract_teams_and_goals(event_text, season)
+        links = find_all(event_row, "group")
+        events.append({"date": date, "team_home": team_home, "team_away": team_away, "goals_home": goals_home,
+                       "goals_away": goals_away, "link": links[0].get("href") if links else None})
+    return events
+
+# the home, draw and away odds of every bookie on an oddsportal match page, None for the bookies it does not list
+def parse_match_odds(page_source):
+    bookies = dataset_store.BOOKIES
+    odds_dict = {key: None for key in [event+bookie for bookie in bookies for event in ["Home_", "Draw_", "Away_"]]}
+    for info in [rendered_text(row) for row in find_all(parse_page(page_source), ODDS_ROW_CLASSES)]:
+        for bookie in bookies:
+            if bookie in info:
+                odds_dict["Home_"+bookie] = info.split("\n")[-4]
+                odds_dict["Draw_"+bookie] = info.split("\n")[-3]
+                odds_dict["Away_"+bookie] = info.split("\n")[-2]
+    return odds_dict
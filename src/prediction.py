@@ -1,48 +1,61 @@
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
+import argparse
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from datetime import datetime
+import dataset_store
+import feature_encoder
+import model_registry
 
+MODEL_NAME = "prediction"
+TARGETS = {"classifier": ["Targ_Var_Winner"],
+           "regressor": ['Targ_Var_Difference', "Targ_Var_Goals_Home", "Targ_Var_Goals_Away"]}
+PARAMS = {"classifier": {"n_estimators": 500, "max_depth": 30, "min_samples_split": 10, "min_samples_leaf": 4, "random_state": 37},
+          "regressor": {"n_estimators": 500, "max_depth": 10, "min_samples_split": 10, "min_samples_leaf": 4, "random_state": 37}}
 
-def explaining_data(df):
-    """Prepare data for model training"""
-    features = [col for col in df.columns if not "Targ_Var" in col]
-    categorical = ['Team_Home', 'Team_Away']
-    cat_features = [f for f in features if f in categorical]
-    num_features = [f for f in features if f not in categorical]
-    
-    # Handle categorical features
-    X = pd.get_dummies(df[features], columns=cat_features)
-    
-    # Scale numerical features if there are any
-    if num_features:
-        scaler = StandardScaler()
-        X[num_features] = scaler.fit_transform(X[num_features])
-    
-    return X
-
-def main():
-    complete_df = pd.read_csv("../data/complete_merged_and_prepared_data.csv", index_col = 0)
-    past_df = complete_df.dropna()
-    upcoming_df = complete_df[complete_df["Targ_Var_Winner"].isna()]
-    X_past = explaining_data(past_df)
-    X_upcoming = explaining_data(upcoming_df)
-    for col in set(X_past.columns) - set(X_upcoming.columns):
-        X_upcoming[col] = 0
-    X_upcoming = X_upcoming[X_past.columns]
+
+def explaining_data(past_df):
+    """Encode the past matches with an encoder fitted on them"""
+    features = [col for col in past_df.columns if not "Targ_Var" in col and col != "Date"]
+    encoder, matrices = feature_encoder.encode_splits({"past": past_df}, features, MODEL_NAME)
+    return encoder, matrices["past"]
+
+def train_models(past_df):
+    """Train the models on all past matches and register them"""
+    encoder, X_past = explaining_data(past_df)
 
     # Classification model
-    clf = RandomForestClassifier(n_estimators=500, max_depth=30, min_samples_split=10, min_samples_leaf=4, random_state=37)
-    clf.fit(X_past, past_df['Targ_Var_Winner'])
+    clf = RandomForestClassifier(**PARAMS["classifier"])
+    clf.fit(X_past, past_df[TARGETS["classifier"][0]])
 
     # Regression model
-    reg = RandomForestRegressor(n_estimators=500, max_depth = 10, min_samples_split = 10, min_samples_leaf = 4, random_state=37)
-    reg.fit(X_past, past_df[['Targ_Var_Difference', "Targ_Var_Goals_Home", "Targ_Var_Goals_Away"]])
+    reg = RandomForestRegressor(**PARAMS["regressor"])
+    reg.fit(X_past, past_df[TARGETS["regressor"]])
+
+    return model_registry.save_entry(MODEL_NAME, model_registry.model_version(past_df, PARAMS),
+                                     {"classifier": clf, "regressor": reg}, encoder, TARGETS, PARAMS)
+
+# returns the registered models for the past matches and only trains them if the past matches have changed
+def load_models(past_df, retrain=False):
+    entry = None if retrain else model_registry.load_entry(MODEL_NAME, model_registry.model_version(past_df, PARAMS))
+    if entry is None:
+        print("The past matches have changed, training the models.")
+        entry = train_models(past_df)
+    return entry
+
+def main(retrain=False):
+    complete_df = dataset_store.widen(dataset_store.read_source("../data/complete_merged_and_prepared_data.csv"))
+    past_df = complete_df.dropna()
+    upcoming_df = complete_df[complete_df["Targ_Var_Winner"].isna()]
+    models = load_models(past_df, retrain)
+    X_upcoming = models.encoder.transform(upcoming_df)
 
-    upcoming_df.loc[:, ["Winner_Prediction"]] = clf.predict(X_upcoming)
-    upcoming_df.loc[:, ["Difference_Prediction", "Goals_Home_Prediction", "Goals_Away_Prediction"]] = reg.predict(X_upcoming)
+    upcoming_df.loc[:, ["Winner_Prediction"]] = models.flat_model("classifier").predict(X_upcoming)
+    upcoming_df.loc[:, ["Difference_Prediction", "Goals_Home_Prediction", "Goals_Away_Prediction"]] = models.flat_model("regressor").predict(X_upcoming)
     upcoming_df[["Team_Home", "Team_Away", "Winner_Prediction", "Difference_Prediction", "Goals_Home_Prediction", "Goals_Away_Prediction"]].to_excel("../data/prediction"+str(datetime.now().date())+".xlsx")
 
 if __name__ == "__main__":
-    main()
-
+    parser = argparse.ArgumentParser(description="Predict the upcoming matches with the registered models.")
+    parser.add_argument("--retrain", action="store_true",
+                        help="train new models even if the past matches have not changed")
+    args = parser.parse_args()
+    main(args.retrain)
@@ -0,0 +1,269 @@
+'''
+Local prediction service that keeps the registered models and the rolling state of every team in memory, so that
+upcoming fixtures can be scored again whenever their odds change, without rereading or retraining anything.
+POST /predict takes {"fixtures": [{"Team_Home": ..., "Team_Away": ..., "Odds_Home_Average": ..., ...}, ...]} and returns
+the winner, goal difference and goal predictions of every fixture; odds of single bookmakers that are left out are
+imputed from the average odds. Concurrent requests are gathered into micro-batches that are scored together.
+Fixtures that cannot be read, e.g. with odds that are no numbers, are answered with 400 and do not fail the batch.
+GET /metrics reports the p50/p99 request latencies and the batch sizes, POST /reload reloads the models and the state
+after the data has been prepared again. Run it from the src directory, e.g. "python prediction_server.py --port 8765".
+'''
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import data_preparation
+import dataset_store
+import prediction
+import team_aliases
+
+PREDICTION_COLS = ["Winner_Prediction", "Difference_Prediction", "Goals_Home_Prediction", "Goals_Away_Prediction"]
+
+# rolling features of the next home match and the next away match of every team, computed from the rolling state the
+# same way add_rolling_stats computes them for the first upcoming match of a team
+def next_match_rolling_features(state_df, window=data_preparation.ROLLING_WINDOW):
+    source_cols = data_preparation.rolling_source_cols(state_df)
+    sides = {}
+    for team_col, side_cols in [("Team_Home", [c for c in source_cols if "Home" in c]),
+                                ("Team_Away", [c for c in source_cols if "Home" not in c])]:
+        tails = state_df.groupby(team_col, sort=False).tail(window)
+        means = tails[side_cols].astype(float).groupby(tails[team_col]).mean()
+        # like the rolling mean, teams with fewer than window matches on this side get no features
+        means[tails.groupby(team_col).size().reindex(means.index) < window] = np.nan
+        sides[team_col] = means.add_prefix("Rolling_")
+    return sides
+
+class Predictor:
+    """The registered models, their feature encoder and the rolling features of every team"""
+
+    def __init__(self):
+        self.reload()
+
+    def reload(self):
+        prepared_df = dataset_store.widen(dataset_store.read_source(data_preparation.PREPARED_FILE_PATH))
+        try:
+            state_df = dataset_store.widen(dataset_store.read_source(data_preparation.ROLLING_STATE_FILE_PATH))
+        except FileNotFoundError:
+            raise FileNotFoundError("No rolling state found, run data_preparation.py first.") from None
+        models = prediction.load_models(prepared_df.dropna())
+        self.encoder, self.classifier, self.regressor = models.encoder, models.flat_model("classifier"), models.flat_model("regressor")
+        self.rolling = next_match_rolling_features(state_df)
+
+    # builds the feature frame of the fixtures from their teams and odds and the rolling state. Raises a ValueError
+    # (for some odds a TypeError) for fixtures with team names that are no strings or odds that are no numbers.
+    def features(self, fixtures_df):
+        fixtures_df = fixtures_df.copy()
+        for col in ["Team_Home", "Team_Away"]:
+            if not fixtures_df[col].map(lambda team: isinstance(team, str)).all():
+                raise ValueError(f"Every fixture needs a team name as {col}.")
+            fixtures_df[col] = fixtures_df[col].map(team_aliases.resolve_name)
+        odds_cols = [f for f in self.encoder.features if f.startswith("Odds_")]
+        features_df = fixtures_df.reindex(columns=["Team_Home", "Team_Away"] + odds_cols)
+        features_df[odds_cols] = features_df[odds_cols].astype(float)
+        features_df = data_preparation.impute_missing_odds(features_df)
+        for team_col, rolling_df in self.rolling.items():
+            rolling = rolling_df.reindex(features_df[team_col])
+            features_df[rolling_df.columns] = rolling.to_numpy()
+        return features_df.reindex(columns=self.encoder.features)
+
+    def predict(self, fixtures_df):
+        return self.predict_features(self.features(fixtures_df))
+
+    def predict_features(self, features_df):
+        # fixtures of teams without enough past matches, or without average odds, cannot be featurized
+        complete = features_df.notna().all(axis=1).to_numpy()
+        predictions = pd.DataFrame(index=features_df.index, columns=PREDICTION_COLS, dtype=object)
+        if complete.any():
+            X = self.encoder.transform(features_df[complete])
+            predictions.loc[complete, "Winner_Prediction"] = self.classifier.predict(X)
+            predictions.loc[complete, PREDICTION_COLS[1:]] = self.regressor.predict(X)
+        results = []
+        for (_, fixture), (_, row), ok in zip(features_df.iterrows(), predictions.iterrows(), complete):
+            result = {"Team_Home": fixture["Team_Home"], "Team_Away": fixture["Team_Away"]}
+            if ok:
+                result.update({col: row[col] if col == "Winner_Prediction" else float(row[col]) for col in PREDICTION_COLS})
+            else:
+                result["error"] = "not enough past matches or odds to featurize the fixture"
+            results.append(result)
+        return results
+
+class LatencyMetrics:
+    """Request latencies and batch sizes of the most recent requests"""
+
+    def __init__(self, size=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=size)
+        self.batch_sizes = deque(maxlen=size)
+        self.requests = 0
+
+    def record_request(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+
+    def record_batch(self, n_fixtures):
+        with self.lock:
+            self.batch_sizes.append(n_fixtures)
+
+    def summary(self):
+        with self.lock:
+            latencies, batch_sizes = np.array(self.latencies), np.array(self.batch_sizes)
+            requests = self.requests
+        if not len(latencies):
+            return {"requests": requests}
+        return {"requests": requests, "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+                "p99_ms": 1000 * float(np.percentile(latencies, 99)), "batches": len(batch_sizes),
+                "mean_batch_size": float(batch_sizes.mean()), "max_batch_size": int(batch_sizes.max())}
+
+class MicroBatcher:
+    """Scores the fixtures of concurrent requests together: a batch is closed once max_batch_size fixtures have been
+    queued or max_wait seconds have passed since its first request. The fixtures of every request are featurized
+    before they are queued, so that invalid fixtures are rejected without failing the rest of the batch."""
+
+    def __init__(self, predictor, metrics, max_batch_size=256, max_wait=0.002):
+        self.predictor, self.metrics = predictor, metrics
+        self.max_batch_size, self.max_wait = max_batch_size, max_wait
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, fixtures_df):
+        return self.submit_features(self.predictor.features(fixtures_df))
+
+    # scores the fixtures of a feature frame built by Predictor.features in the next batch
+    def submit_features(self, features_df):
+        future = Future()
+        self.queue.put((features_df, future))
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        n_fixtures, deadline = len(batch[0][0]), time.monotonic() + self.max_wait
+        while n_fixtures < self.max_batch_size:
+            try:
+                batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+            n_fixtures += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with self.lock:
+                    results = self.predictor.predict_features(pd.concat([features_df for features_df, _ in batch],
+                                                                        ignore_index=True))
+            except Exception:
+                # the requests of a failed batch are scored one by one, so that only the one that fails gets the error
+                self._run_one_by_one(batch)
+                continue
+            self.metrics.record_batch(len(results))
+            start = 0
+            for features_df, future in batch:
+                future.set_result(results[start:start + len(features_df)])
+                start += len(features_df)
+
+    def _run_one_by_one(self, batch):
+        for features_df, future in batch:
+            try:
+                with self.lock:
+                    results = self.predictor.predict_features(features_df)
+            except Exception as error:
+                future.set_exception(error)
+                continue
+            self.metrics.record_batch(len(results))
+            future.set_result(results)
+
+    def reload(self):
+        with self.lock:
+            self.predictor.reload()
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    batcher = None
+    metrics = None
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.metrics.summary())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if self.path == "/reload":
+            self.batcher.reload()
+            self._send_json(200, {"status": "reloaded"})
+            return
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            fixtures_df = pd.DataFrame(body["fixtures"])
+            missing = {"Team_Home", "Team_Away"} - set(fixtures_df.columns)
+            if fixtures_df.empty or missing:
+                raise ValueError("Every fixture needs Team_Home and Team_Away.")
+            features_df = self.batcher.predictor.features(fixtures_df)
+        except (ValueError, KeyError, TypeError) as error:
+            self._send_json(400, {"error": str(error)})
+            self.metrics.record_request(time.perf_counter() - start)
+            return
+        try:
+            predictions = self.batcher.submit_features(features_df)
+        except Exception as error:
+            self._send_json(500, {"error": f"{type(error).__name__}: {error}"})
+        else:
+            self._send_json(200, {"predictions": predictions})
+        self.metrics.record_request(time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        # one log line per request would dominate the latency under load
+        pass
+
+class PredictionServer(ThreadingHTTPServer):
+    # the default backlog of 5 connections resets clients as soon as a few dozen of them connect at once
+    request_queue_size = 128
+    daemon_threads = True
+
+def make_server(host="127.0.0.1", port=8765, max_batch_size=256, max_wait=0.002):
+    metrics = LatencyMetrics()
+    batcher = MicroBatcher(Predictor(), metrics, max_batch_size, max_wait)
+    handler = type("Handler", (PredictionRequestHandler,), {"batcher": batcher, "metrics": metrics})
+    return PredictionServer((host, port), handler)
+
+def main(host="127.0.0.1", port=8765, max_batch_size=256, max_wait=0.002):
+    server = make_server(host, port, max_batch_size, max_wait)
+    print(f"Serving predictions on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve predictions for upcoming fixtures over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=256,
+                        help="number of fixtures after which a micro-batch is scored (default: 256)")
+    parser.add_argument("--max-wait-ms", type=float, default=2,
+                        help="time a micro-batch waits for further requests (default: 2)")
+    args = parser.parse_args()
+    main(args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000)
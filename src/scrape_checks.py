@@ -0,0 +1,173 @@
+'''
+This script checks that the scrapers recover from crashes and faulty pages without losing or duplicating rows. Every
+check scrapes the stand-in pages of the 2023/24 Bundesliga from the local server (see scrape_fixtures.py) and raises an
+AssertionError that says what went wrong, so that the script exits with 1 if a check fails. The timings of the same
+runs are measured by benchmarking.py.
+Run it from the src directory, e.g. "python scrape_checks.py kill_and_resume".
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import traceback
+from multiprocessing import Process
+import numpy as np
+import pandas as pd
+from selenium.common.exceptions import TimeoutException
+
+import benchmarking
+import browser
+import dataset_store
+import page_parsing
+import scrape_fixtures
+import scrape_journal
+import webscraping
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+# whether the scraped statistics are the stored ones of the same matches
+def same_statistics(scraped, stats_df):
+    return np.array_equal(scraped.astype(float).to_numpy(), stats_df.loc[scraped.index].to_numpy(float), equal_nan=True)
+
+# adds rows to a journal and then stalls like a worker that retries a failing page, until it is killed
+def stalled_journal(csv_path, journal_dir, values, flush_interval):
+    journal = scrape_journal.ScrapeJournal(csv_path, dataset_store.STAT_COLS, flush_interval=flush_interval,
+                                           directory=journal_dir)
+    for i, row in enumerate(values):
+        journal.add(f"match_{i}", row)
+    time.sleep(60)
+
+# kills a scrape of the statistics with scrape_pages_parallel midway, with half a line written at the end of the
+# journal, and resumes it: only the matches that were not journaled are fetched again, and the compacted rows are the
+# stored ones
+def check_kill_and_resume(kill_after=1.0, delay=0.02):
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    with tempfile.TemporaryDirectory() as directory, \
+            scrape_fixtures.FixtureServer(matches_df, stats_df, expanded=True) as server:
+        csv_path = os.path.join(directory, "journal_check_google_statistics.csv")
+        journal_file = benchmarking.killed_statistics_scrape(server.url, matches_df, csv_path, directory, kill_after,
+                                                             delay)
+        killed_requests = server.requests
+        columns, rows = scrape_journal.read_journal(journal_file)
+        expect(0 < len(rows) < len(matches_df),
+               f"{len(rows)} of {len(matches_df)} matches were journaled before the kill, expected a part of them.")
+        expect(same_statistics(pd.DataFrame.from_dict(rows, orient="index", columns=columns), stats_df),
+               "The rows journaled before the kill differ from the stored ones.")
+
+        benchmarking.run_process(benchmarking.journaled_statistics_scrape, server.url, matches_df, csv_path, directory)
+        resumed_requests = server.requests - killed_requests
+        expect(resumed_requests == len(matches_df) - len(rows),
+               f"The resumed scrape fetched {resumed_requests} pages, expected the {len(matches_df) - len(rows)} "
+               "of the matches that were not journaled.")
+        exported = {}
+        compacted = scrape_journal.compact(csv_path, lambda df, path: exported.update(df=df), directory)
+        expect(compacted == len(matches_df), f"{compacted} of {len(matches_df)} matches were compacted.")
+        expect(not os.path.exists(journal_file), "The journal was not removed after compacting it.")
+        scraped = exported["df"]
+        expect(scraped.index.is_unique and set(scraped.index) == set(stats_df.index),
+               "The compacted matches are not the stored ones.")
+        expect(same_statistics(scraped, stats_df), "The compacted statistics differ from the stored ones.")
+
+# kills a worker that journaled fewer rows than a batch and then stalled for a few flush intervals: its rows are on
+# disk all the same
+def check_kill_while_stalled(flush_interval=0.2, n_rows=5):
+    _, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    values = stats_df.astype(str).to_numpy().tolist()[:n_rows]
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "stalled_google_statistics.csv")
+        stall = Process(target=stalled_journal, args=(csv_path, directory, values, flush_interval))
+        stall.start()
+        time.sleep(5 * flush_interval)
+        stall.kill()
+        stall.join()
+        rows = scrape_journal.read_journal(scrape_journal.journal_path(csv_path, directory))[1]
+        expect(len(rows) == n_rows, f"{len(rows)} of the {n_rows} rows of the stalled worker were on disk.")
+        expect(list(rows.values()) == values, "The rows of the stalled worker differ from the added ones.")
+
+# the statistics of the page, or a TimeoutException like scrape_statistics raises when the page has no button to show
+# them, e.g. a broken page
+def statistics_or_timeout(driver):
+    if not page_parsing.find_all(page_parsing.parse_page(driver.page_source), "U0faLd"):
+        raise TimeoutException("The button that shows the statistics did not show up.")
+    return page_parsing.parse_google_statistics(driver.page_source)
+
+# scrapes the statistics of the stand-in pages with the retries of the policy, into a journal and a skip list in
+# journal_dir. Run in a process of its own, as it replaces the drivers.
+def retried_statistics_scrape(server_url, matches_df, csv_path, journal_dir, policy):
+    browser.new_driver = benchmarking.UrllibDriver
+    skip_list = scrape_journal.SkipList(csv_path, journal_dir)
+    with scrape_journal.ScrapeJournal(csv_path, dataset_store.STAT_COLS, directory=journal_dir) as journal:
+        jobs = [(idx, webscraping.google_match_url(match, server_url+"/search?q=")) for idx, match in matches_df.iterrows()]
+        webscraping.scrape_pages_parallel(jobs, lambda driver, idx: statistics_or_timeout(driver), journal, n_workers=2,
+                                          min_interval=0, jitter=0, policy=policy, skip_list=skip_list)
+
+# scrapes from a server that breaks or hangs a share of the pages, without retries and with the retries of the
+# unattended mode: without retries every faulty page is put on the skip list, with them every faulty page is fetched
+# once more and all statistics are scraped. The rows that are scraped are the stored ones.
+def check_unattended_retries(n_matches=20, fault_rate=0.3, hang_seconds=2.0):
+    matches_df, stats_df = scrape_fixtures.load_scraped_matches_and_stats()
+    matches_df = matches_df.head(n_matches)
+    policies = {"no retries": webscraping.RetryPolicy(max_attempts=1, page_load_timeout=1.0),
+                "retries": webscraping.RetryPolicy(max_attempts=6, base_delay=0.05, max_delay=0.5, fresh_driver_after=3,
+                                                   page_load_timeout=1.0)}
+    for fault in scrape_fixtures.FAULTS:
+        for name, policy in policies.items():
+            with tempfile.TemporaryDirectory() as directory, \
+                    scrape_fixtures.FixtureServer(matches_df, stats_df, expanded=True, fault_rate=fault_rate, fault=fault,
+                                                  hang_seconds=hang_seconds) as server:
+                csv_path = os.path.join(directory, "retry_check_google_statistics.csv")
+                benchmarking.run_process(retried_statistics_scrape, server.url, matches_df, csv_path, directory, policy)
+                columns, rows = scrape_journal.read_journal(scrape_journal.journal_path(csv_path, directory))
+                skipped = scrape_journal.SkipList(csv_path, directory)
+                run = f"{name} with {fault} pages"
+                expect(server.faults > 0, f"The server served no {fault} pages in the run {run}.")
+                expect(not (set(rows) & {idx for idx in matches_df.index if idx in skipped}),
+                       f"Matches were both journaled and skipped in the run {run}.")
+                expect(len(rows) + len(skipped) == n_matches,
+                       f"{len(rows)} matches were journaled and {len(skipped)} skipped of {n_matches} in the run {run}.")
+                if name == "retries":
+                    expect(len(rows) == n_matches, f"{len(skipped)} matches were skipped in the run {run}.")
+                    expect(server.requests == n_matches + server.faults,
+                           f"{server.requests} pages were fetched for {n_matches} matches and {server.faults} faulty "
+                           f"pages in the run {run}, expected every faulty page to be fetched once more.")
+                else:
+                    expect(len(skipped) == server.faults,
+                           f"{len(skipped)} matches were skipped for {server.faults} faulty pages in the run {run}.")
+                if rows:
+                    expect(same_statistics(pd.DataFrame.from_dict(rows, orient="index", columns=columns), stats_df),
+                           f"The scraped statistics differ from the stored ones in the run {run}.")
+
+CHECKS = {
+    "kill_and_resume": check_kill_and_resume,
+    "kill_while_stalled": check_kill_while_stalled,
+    "unattended_retries": check_unattended_retries,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the scrapers recover from crashes and faulty pages.")
+    parser.add_argument("checks", nargs="*", metavar="check", help="any of: " + ", ".join(CHECKS) + " (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.checks) - set(CHECKS)
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+    failed = []
+    for name in args.checks or CHECKS:
+        print(f"Running check: {name}")
+        start = time.perf_counter()
+        try:
+            CHECKS[name]()
+        except AssertionError:
+            traceback.print_exc()
+            failed.append(name)
+            print(f"FAILED: {name}")
+        else:
+            print(f"passed: {name} ({time.perf_counter() - start:.1f}s)")
+    if failed:
+        sys.exit(f"{len(failed)} of {len(args.checks or CHECKS)} checks failed: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
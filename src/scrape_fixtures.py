@@ -0,0 +1,274 @@
+'''
+Local stand-in for the scraped websites, so that the scrapers can be tested and benchmarked offline.
+FixtureServer runs a local HTTP server in a background thread that serves saved pages and stand-in pages generated
+from the already scraped data, with the markup (class names) that the scrapers look for. Point the scrapers at
+server.url instead of https://www.google.com, e.g. with search_url=server.url+"/search?q=". The pages saved into the
+page archive while scraping can be replayed the same way (see add_archived_pages), to profile the scrapers offline.
+The server can inject faults into a share of its pages, to test how the scrapers recover from them.
+'''
+
+import hashlib
+import html
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pandas as pd
+import catalog
+import dataset_store
+import page_archive
+
+# the labels google shows next to the statistics, in the order of dataset_store.STATS
+GOOGLE_STAT_LABELS = ["Schüsse", "Torschüsse", "Ballbesitz", "Pässe", "Passgenauigkeit", "Fouls",
+                      "Gelbe Karten", "Rote Karten", "Abseits", "Ecken"]
+PERCENT_STATS = ["Possession", "Passing_Accuracy"]
+GOOGLE_WEEKDAYS = ["Mo.", "Di.", "Mi.", "Do.", "Fr.", "Sa.", "So."]
+ODDS_EVENTS = ["Home_", "Draw_", "Away_"]
+# a broken page is served without the elements the scrapers wait for, a hanging page only after hang_seconds
+FAULTS = ["broken", "hang"]
+
+def page(body, title="Stand-in"):
+    return f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>{body}</body></html>"
+
+# the google result page of one match: the statistics are only added to the page when the "Mehr zu diesem Spiel"
+# button is clicked, like on google, or are already shown if expanded
+def google_match_page(stats, expanded=False):
+    rows = ""
+    if stats is not None and not pd.isna(stats).any():
+        for stat, label in zip(dataset_store.STATS, GOOGLE_STAT_LABELS):
+            unit = " %" if stat in PERCENT_STATS else ""
+            home, away = int(stats[stat+"_Home"]), int(stats[stat+"_Away"])
+            rows += f"<tr class='MzWkAb'>\n<td>{home}{unit}</td>\n<td>{label}</td>\n<td>{away}{unit}</td>\n</tr>"
+    details = f"<table>{rows}</table>" if expanded else ""
+    body = (f"<template id='stats'><table>{rows}</table></template><div id='details'>{details}</div>"
+            "<div class='U0faLd' role='button' tabindex='0' onclick=\"document.getElementById('details')"
+            ".appendChild(document.getElementById('stats').content.cloneNode(true))\">Mehr zu diesem Spiel</div>")
+    return page(body, "Google stand-in")
+
+# the google page of a league season with all its matches grouped by matchday, and an empty match element per
+# matchday like google has them
+def google_matches_page(matches_df):
+    matchdays = ""
+    for matchday, matches in matches_df.groupby("Matchday", sort=False):
+        rows = "<div class='KAIX8d'></div>"
+        for _, match in matches.iterrows():
+            date = pd.to_datetime(match["Date"], format="%d.%m.%Y")
+            date_text = f"{GOOGLE_WEEKDAYS[date.weekday()]}, {date.day}.{date.month}.{date.strftime('%y')}"
+            teams = "".join(f"<div class='L5Kkcd'><div>{match['Goals_'+side]}</div><div>{html.escape(match['Team_'+side])}</div></div>"
+                            for side in ["Home", "Away"])
+            rows += (f"<div class='KAIX8d'><div class='imspo_mt__tt-w'><div class='GOsQPe'>{date_text}</div>{teams}"
+                     f"<div class='imspo_mt__t-sc'>{match['Goals_Home']} : {match['Goals_Away']}</div></div></div>")
+        matchdays += f"<div class='OcbAbf'><div class='GVj7ae'>{html.escape(matchday)}</div>{rows}</div>"
+    return page(f"<div class='Z4Cazf' role='button'>Weitere Begegnungen</div>{matchdays}", "Google stand-in")
+
+# a page that lazy-loads its rows in batches of batch_size from the server, which answers after load_delay seconds,
+# when its first or last row was scrolled into view, like the matchdays on google and the matches on oddsportal.
+# The rows start at start_row, so rows are loaded both above and below it, and are only shown after the "Weitere
+# Begegnungen" button is clicked if expand_button is set. The header keeps the rows out of view until scrolled to.
+def lazy_rows_page(class_name="eventRow", n_rows=200, batch_size=20, load_delay=0.5, start_row=0, expand_button=False):
+    script = f"""
+const total = {n_rows}, batchSize = {batch_size}, className = "{class_name}", delay = {load_delay};
+let low = {start_row}, high = {start_row}, loading = false;
+const list = document.getElementById("rows");
+function load(up) {{
+    if (loading || (up ? low <= 0 : high >= total)) return;
+    loading = true;
+    const from = up ? Math.max(0, low - batchSize) : high, to = up ? low : Math.min(total, high + batchSize);
+    fetch(`/rows?class=${{className}}&from=${{from}}&to=${{to}}&delay=${{delay}}`)
+        .then(response => response.text())
+        .then(rows => {{
+            list.insertAdjacentHTML(up ? "afterbegin" : "beforeend", rows);
+            if (up) low = from; else high = to;
+            loading = false;
+        }});
+}}
+function inView(row) {{
+    const box = row.getBoundingClientRect();
+    return box.bottom > 0 && box.top < window.innerHeight;
+}}
+window.addEventListener("scroll", () => {{
+    if (!list.firstElementChild) return;
+    if (inView(list.firstElementChild)) load(true);
+    else if (inView(list.lastElementChild)) load(false);
+}});
+"""
+    button = "<div class='Z4Cazf' role='button' onclick='load(false)'>Weitere Begegnungen</div>" if expand_button else ""
+    start = "" if expand_button else "load(false);"
+    return page(f"{button}<div style='height: 1500px'>Header</div><div id='rows'></div><script>{script}{start}</script>",
+                "Lazy-loading stand-in")
+
+# the rows from (inclusive) to to (exclusive) of a lazy-loading page
+def lazy_rows(class_name, start, end):
+    return "".join(f"<div class='{html.escape(class_name)}' style='height: 100px'>Row {i}</div>" for i in range(start, end))
+
+# the search query that scrape_all_google_stats sends for a match
+def google_match_query(match):
+    return match["Team_Home"]+" vs. "+match["Team_Away"]+" "+match["Date"]+" "+match["League"]
+
+def _odds_text(odds):
+    return "-" if pd.isna(odds) else f"{odds:.2f}"
+
+# the link of a match on the oddsportal results page, e.g. /football/germany/bundesliga-2023-2024/bayern-koln-1a2b3c4d/
+def odds_match_path(idx, match, results_path="/football/germany/bundesliga-2023-2024/results/"):
+    slug = "-".join(re.sub(r"[^a-z0-9]+", "-", match["Team_"+side].lower()).strip("-") for side in ["Home", "Away"])
+    return results_path.replace("results/", "") + slug + "-" + hashlib.sha1(idx.encode()).hexdigest()[:8] + "/"
+
+# an oddsportal results page: one eventRow per match, with the date header in the first row of every date and the
+# average odds next to the link to the match page, and the cookie banner
+def odds_results_page(odds_df, results_path="/football/germany/bundesliga-2023-2024/results/"):
+    rows, last_date = "", None
+    for idx, match in odds_df.iterrows():
+        date = pd.to_datetime(match["Date"], format="%d.%m.%Y")
+        header = ""
+        if date != last_date:
+            header = f"<div class='flex'><div>{date.strftime('%d %b %Y')}</div><div>1</div><div>X</div><div>2</div><div>B's</div></div>"
+            last_date = date
+        teams = (f"<div>{html.escape(match['Team_Home'])}</div><div>{match['Goals_Home']}</div><div>–</div>"
+                 f"<div>{match['Goals_Away']}</div><div>{html.escape(match['Team_Away'])}</div>")
+        odds = "".join(f"<div>{_odds_text(match['Odds_'+event+'Average'])}</div>" for event in ODDS_EVENTS)
+        rows += (f"<div class='eventRow flex w-full flex-col'>{header}<div class='flex'><div>15:30</div>"
+                 f"<a class='group flex' href='{odds_match_path(idx, match, results_path)}'>{teams}</a>{odds}<div>8</div></div></div>")
+    pagination = "<a class='pagination-link'>1</a><a class='pagination-link'>Next</a>"
+    cookies = ("<button id='onetrust-accept-btn-handler' onclick=\"document.cookie = 'OptanonAlertBoxClosed=1; "
+               "max-age=31536000; path=/'; this.remove()\">I Accept</button>")
+    return page(cookies + rows + pagination, "Oddsportal stand-in")
+
+# adds the images, fonts and ad scripts of a real website to a page, which are served by add_resources
+def with_resources(page_html, n_images=20):
+    resources = "".join(f"<img src='/static/logo-{i}.png'>" for i in range(n_images))
+    resources += ("<style>@font-face {font-family: Stand-in; src: url('/static/font.woff2');} "
+                  "body {font-family: Stand-in;}</style><script src='/ads/doubleclick.net/tag.js'></script>")
+    return page_html.replace("</body>", resources + "</body>")
+
+# the odds page of one match with a row per bookie that has odds for it
+def odds_match_page(match):
+    rows = ""
+    for bookie in dataset_store.BOOKIES:
+        odds = [match["Odds_"+event+bookie] for event in ODDS_EVENTS]
+        if not pd.isna(odds).all():
+            cells = "".join(f"<div>{_odds_text(o)}</div>" for o in odds)
+            rows += f"<div class='flex text-xs h-9 border-black-borders'><div><p>{bookie}</p></div>{cells}<div>95.0%</div></div>"
+    return page(rows, "Oddsportal stand-in")
+
+class FixtureServer:
+    """Serves saved pages by path and query, and google stand-in pages for the given matches and statistics.
+    latency delays every response by that many seconds to mimic the network. If expanded, the statistics are already
+    shown without clicking, so that the pages can be scraped without a browser. A fault_rate share of the pages (all
+    but the lazy-loaded rows) is served with the fault, drawn at random from seed for every request."""
+
+    def __init__(self, matches_df=None, stats_df=None, latency=0.0, port=0, expanded=False,
+                 fault_rate=0.0, fault="broken", hang_seconds=5.0, seed=0):
+        if fault not in FAULTS:
+            raise ValueError(f"Unknown fault {fault}, expected one of {FAULTS}.")
+        self.pages = {}
+        self.latency = latency
+        self.expanded = expanded
+        self.fault_rate, self.fault, self.hang_seconds = fault_rate, fault, hang_seconds
+        self.random = random.Random(seed)
+        self.requests, self.faults = 0, 0
+        self.lock = threading.Lock()
+        self.google_stats, self.search_pages = {}, {}
+        if matches_df is not None:
+            for idx, match in matches_df.iterrows():
+                stats = stats_df.loc[idx] if stats_df is not None and idx in stats_df.index else None
+                self.google_stats[google_match_query(match)] = stats if stats is None or stats.ndim == 1 else stats.iloc[0]
+
+        fixtures = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fixtures.lock:
+                    fixtures.requests += 1
+                if fixtures.latency:
+                    time.sleep(fixtures.latency)
+                status, body = fixtures.respond(self.path)
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the scraper gave up on a hanging page
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def add_page(self, path, body):
+        self.pages[re.sub("/{2,}", "/", path)] = body
+
+    # serves the results page of the odds at results_path and the odds page of every match at its link
+    def add_odds_pages(self, odds_df, results_path="/football/germany/bundesliga-2023-2024/results/"):
+        self.add_page(results_path, odds_results_page(odds_df, results_path))
+        for idx, match in odds_df.iterrows():
+            self.add_page(odds_match_path(idx, match, results_path), odds_match_page(match))
+
+    # serves the resources of with_resources pages with kilobytes of filler each
+    def add_resources(self, n_images=20, kilobytes=50):
+        for path in [f"/static/logo-{i}.png" for i in range(n_images)] + ["/static/font.woff2", "/ads/doubleclick.net/tag.js"]:
+            self.add_page(path, "x" * (1000 * kilobytes))
+
+    # serves the latest archived snapshot of every page (see page_archive) at the path and query of its URL, and the
+    # google pages also for their search query alone, as google adds parameters of its own to the URLs
+    def add_archived_pages(self, index, directory=page_archive.ARCHIVE_DIR):
+        for url, sha256 in page_archive.latest_pages(index)[["url", "sha256"]].itertuples(index=False):
+            parts = urlsplit(url)
+            body = page_archive.load_page(sha256, directory)
+            self.add_page(parts.path + ("?"+parts.query if parts.query else ""), body)
+            if parts.path == "/search" and "q" in parse_qs(parts.query):
+                self.search_pages[parse_qs(parts.query)["q"][0]] = body
+
+    def respond(self, path):
+        # the scrapers append "/#/page/1/" to URLs that end with a slash, which oddsportal serves like a single slash
+        path = re.sub("/{2,}", "/", path)
+        if self.fault_rate and urlsplit(path).path != "/rows":
+            with self.lock:
+                faulty = self.random.random() < self.fault_rate
+                self.faults += faulty
+            if faulty and self.fault == "broken":
+                return 200, page("<p>Something went wrong.</p>", "Broken stand-in")
+            if faulty:
+                time.sleep(self.hang_seconds)
+        if path in self.pages:
+            return 200, self.pages[path]
+        parts = urlsplit(path)
+        if parts.path == "/rows":
+            query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+            time.sleep(float(query.get("delay", 0)))
+            return 200, lazy_rows(query["class"], int(query["from"]), int(query["to"]))
+        if parts.path == "/search":
+            query = parse_qs(parts.query).get("q", [""])[0]
+            if query in self.google_stats:
+                return 200, google_match_page(self.google_stats[query], self.expanded)
+            if query in self.search_pages:
+                return 200, self.search_pages[query]
+        return 404, page(f"<p>No stand-in page for {html.escape(path)}</p>", "Not found")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+# a scraped partition of a league and season, as the scraping code reads it, to serve it as stand-in pages
+def load_scraped(league="1. Bundesliga", season="2023/24", source="matches"):
+    return dataset_store.widen(dataset_store.read_source(catalog.partition_path(league, season, source)),
+                               scraped_dates=source != "statistics")
+
+def load_scraped_matches_and_stats(league="1. Bundesliga", season="2023/24"):
+    return load_scraped(league, season, "matches"), load_scraped(league, season, "statistics")
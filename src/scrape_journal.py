@@ -0,0 +1,192 @@
+'''
+Append-only journal of the scraped rows, so that a crash or abort of the scraper does not lose the matches it already
+scraped. Every scraped row is appended as one JSON line to ../data/journal/<file name>.jsonl, and the lines are
+flushed to disk in batches, and at least every FLUSH_INTERVAL seconds, also while no rows come in. A restarted
+scraper loads the journal and skips the matches in it. After scraping, the journal is compacted into the CSV file
+and its typed store, and removed.
+The matches that the unattended scraper could not scrape are kept on a skip list next to the journal, so that the
+next run tries them again after all other matches.
+'''
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import dataset_store
+
+JOURNAL_DIR = "../data/journal"
+# rows that are buffered before they are written, and the maximum number of seconds a row stays in the buffer
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 10.0
+
+def journal_path(csv_path, directory=JOURNAL_DIR):
+    return os.path.join(directory, os.path.splitext(os.path.basename(csv_path))[0] + ".jsonl")
+
+def skip_list_path(csv_path, directory=JOURNAL_DIR):
+    return os.path.join(directory, os.path.splitext(os.path.basename(csv_path))[0] + ".skipped.json")
+
+def read_journal(path):
+    """The columns and the rows {idx: values} of a journal, later rows of the same idx replace earlier ones.
+    A last line that was cut off by a crash is left out."""
+    columns, rows = None, {}
+    try:
+        with open(path, encoding="utf-8") as file:
+            lines = file.readlines()
+    except FileNotFoundError:
+        return columns, rows
+    for line in lines:
+        if not line.endswith("\n"):
+            break
+        record = json.loads(line)
+        if "columns" in record:
+            columns = record["columns"]
+        else:
+            rows[record["id"]] = record["values"]
+    return columns, rows
+
+class ScrapeJournal:
+    """The journal of the rows scraped for one CSV file. Thread-safe, so that scraping workers can share it."""
+
+    def __init__(self, csv_path, columns, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, directory=JOURNAL_DIR):
+        self.csv_path, self.columns = csv_path, list(columns)
+        self.batch_size, self.flush_interval = batch_size, flush_interval
+        self.path = journal_path(csv_path, directory)
+        os.makedirs(directory, exist_ok=True)
+        journal_columns, self.rows = read_journal(self.path)
+        if journal_columns is not None and journal_columns != self.columns:
+            raise ValueError(f"The journal {self.path} has the columns {journal_columns}, not {self.columns}.")
+        self._cut_off_partial_line()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if journal_columns is None:
+            self.file.write(json.dumps({"columns": self.columns}) + "\n")
+        self.buffer, self.buffered_since = [], None
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+        if self.rows:
+            print(f"Resuming from the journal {self.path} with {len(self.rows)} scraped rows.")
+
+    # a crash while writing can leave half a line at the end, which the next row must not be appended to
+    def _cut_off_partial_line(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def __contains__(self, idx):
+        return idx in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, idx, values):
+        values = [None if pd.isna(value) else value for value in values]
+        with self.lock:
+            self.rows[idx] = values
+            self.buffer.append(json.dumps({"id": idx, "values": values}, ensure_ascii=False) + "\n")
+            if self.buffered_since is None:
+                self.buffered_since = time.monotonic()
+            if len(self.buffer) >= self.batch_size or time.monotonic() - self.buffered_since >= self.flush_interval:
+                self._flush()
+
+    # flushes the buffered rows also while no rows are added, e.g. while the workers retry failing pages
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def _flush(self):
+        if self.buffer and not self.file.closed:
+            self.file.write("".join(self.buffer))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.buffer, self.buffered_since = [], None
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+    def to_frame(self):
+        df = pd.DataFrame.from_dict(self.rows, orient="index", columns=self.columns)
+        df.index.name = dataset_store.INDEX_NAME
+        return df
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class SkipList:
+    """The matches of a CSV file that failed in every attempt, with the number of runs that tried them, the last
+    error and when they were last tried. Saved on every change and thread-safe."""
+
+    def __init__(self, csv_path, directory=JOURNAL_DIR):
+        self.path = skip_list_path(csv_path, directory)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            self.entries = {}
+        self.lock = threading.Lock()
+        if self.entries:
+            print(f"{len(self.entries)} matches on the skip list {self.path} are tried again last.")
+
+    def __contains__(self, idx):
+        return idx in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # error is the exception of the last attempt or a description of what went wrong
+    def add(self, idx, error):
+        if isinstance(error, Exception):
+            error = type(error).__name__ + (f": {error.msg}" if getattr(error, "msg", None) else "")
+        with self.lock:
+            runs = self.entries.get(idx, {}).get("runs", 0) + 1
+            self.entries[idx] = {"runs": runs, "error": error,
+                                 "last_tried": datetime.now().isoformat(timespec="seconds")}
+            self._save()
+
+    def discard(self, idx):
+        with self.lock:
+            if self.entries.pop(idx, None) is not None:
+                self._save()
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+def compact(csv_path, export=dataset_store.write_source, directory=JOURNAL_DIR):
+    """Merge the journaled rows into the rows of the CSV file, export them with export(df, csv_path) and remove the
+    journal. Journaled rows replace the rows with the same idx. Returns the number of journaled rows."""
+    path = journal_path(csv_path, directory)
+    columns, rows = read_journal(path)
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    journaled = pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+    try:
+        kind = dataset_store.source_kind(csv_path)
+        existing = dataset_store.widen(dataset_store.read_source(csv_path), scraped_dates=kind != "statistics")
+        df = pd.concat([existing[~existing.index.isin(journaled.index)], journaled])
+    except FileNotFoundError:
+        df = journaled
+    df.index.name = dataset_store.INDEX_NAME
+    export(df, csv_path)
+    # only removed once the rows are exported, a crash before just leaves the journal to be compacted again
+    os.remove(path)
+    return len(journaled)
@@ -0,0 +1,169 @@
+'''
+Batch scraping of many leagues and seasons in one non-interactive job. The targets are ranked by what is already in
+their scraped files (see catalog.py): partitions that were never scraped first, then those with fewer statistics or
+odds than matches, then seasons that were still running when they were last scraped, then the upcoming matches.
+Complete seasons are left out. The targets are scraped unattended (see webscraping.scrape_unattended) side by side,
+with at most --browsers headless browsers open at a time, and their progress is reported while they run.
+Run it from the src directory, e.g. "python scrape_scheduler.py --plan" to only show the ranking, or
+"python scrape_scheduler.py --league 1 --league 3 --season 2024/25 --browsers 8".
+'''
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+import pandas as pd
+import catalog
+import scrape_journal
+import scrape_timing
+import webscraping
+
+RESULTS_FILE_PATH = "../data/scrape_schedule_results.csv"
+# the reasons a target is scraped, in the order they are scheduled
+REASONS = ["new", "incomplete", "stale", "upcoming"]
+# a season counts as finished once a match of this month or later of its second year was scraped
+SEASON_END_MONTH = 5
+
+def all_targets():
+    return [(league, season) for league in catalog.LEAGUES.values() for season in catalog.SEASONS.values()]
+
+# reads the targets from a JSON file with a list of {"league": ..., "season": ...}
+def read_targets(path):
+    with open(path, encoding="utf-8") as file:
+        return [(target["league"], target["season"]) for target in json.load(file)]
+
+def assess_target(league, season, entries, today=None):
+    """The reason to scrape a target and what is missing, judged by the catalog entries of its scraped files.
+    The reason is None for a finished season whose statistics and odds are complete."""
+    today = date.today() if today is None else today
+    entry = lambda source: entries.get(os.path.basename(catalog.partition_path(league, season, source)))
+    rows = lambda source: entry(source)["rows"] if entry(source) else 0
+    assessment = {"league": league, "season": season, "matches": rows("matches"),
+                  "missing_statistics": max(0, rows("matches") - rows("statistics")),
+                  "missing_odds": max(0, rows("matches") - rows("odds")), "days_stale": 0}
+    if season == catalog.UPCOMING_SEASON:
+        return {**assessment, "reason": "upcoming"}
+    if entry("matches") is None:
+        return {**assessment, "reason": "new"}
+    if assessment["missing_statistics"] or assessment["missing_odds"]:
+        return {**assessment, "reason": "incomplete"}
+    last_match = date.fromisoformat(entry("matches")["date_max"]) if entry("matches")["date_max"] else None
+    if last_match is None or last_match < date(int(season[:4]) + 1, SEASON_END_MONTH, 1):
+        days_stale = (today - last_match).days if last_match else 0
+        return {**assessment, "reason": "stale", "days_stale": days_stale}
+    return {**assessment, "reason": None}
+
+def plan_targets(targets, include_complete=False, today=None):
+    """Rank the targets: new before incomplete before stale ones before the upcoming matches, and within these
+    the ones with the most missing rows or days first"""
+    entries = catalog.refresh_catalog()
+    plan = pd.DataFrame([assess_target(league, season, entries, today) for league, season in targets],
+                        columns=["league", "season", "reason", "matches", "missing_statistics", "missing_odds",
+                                 "days_stale"])
+    if include_complete:
+        plan["reason"] = plan["reason"].fillna("complete")
+    plan = plan.dropna(subset=["reason"])
+    plan = plan.assign(rank=plan["reason"].map({reason: i for i, reason in enumerate(REASONS + ["complete"])}),
+                       missing=plan["missing_statistics"] + plan["missing_odds"])
+    plan = plan.sort_values(["rank", "missing", "days_stale"], ascending=[True, False, False], kind="stable")
+    return plan.drop(columns=["rank", "missing"]).reset_index(drop=True)
+
+# the rows journaled so far by the scraping of a target
+def journaled_rows(league, season):
+    return {source: len(scrape_journal.read_journal(scrape_journal.journal_path(catalog.partition_path(league, season, source)))[1])
+            for source in ["statistics", "odds"]}
+
+def _run_target(scrape, league, season, workers_per_target, min_interval, archive_pages, policy):
+    league_input = {name: number for number, name in catalog.LEAGUES.items()}[league]
+    started, start = datetime.now().isoformat(timespec="seconds"), time.perf_counter()
+    summary = scrape(league_input, season, workers_per_target, min_interval, archive_pages, policy)
+    return summary, started, time.perf_counter() - start
+
+def run_schedule(plan, browsers=os.cpu_count(), workers_per_target=2, min_interval=2.0, archive_pages=True,
+                 policy=None, report_interval=60.0, scrape=webscraping.scrape_unattended):
+    """Scrape the planned targets in their order with scrape(league_input, season, n_workers, min_interval,
+    archive_pages, policy), running browsers // workers_per_target targets at a time. Prints the progress of the
+    running targets every report_interval seconds and returns the results per target."""
+    workers_per_target = max(1, min(workers_per_target, browsers))
+    parallel_targets = max(1, browsers // workers_per_target)
+    print(f"Scraping {len(plan)} targets, {parallel_targets} at a time with {workers_per_target} browser(s) each.")
+    results = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel_targets) as executor:
+        futures = {executor.submit(_run_target, scrape, league, season, workers_per_target, min_interval,
+                                   archive_pages, policy): (league, season)
+                   for league, season in plan[["league", "season"]].itertuples(index=False)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=report_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                league, season = futures[future]
+                try:
+                    summary, started, seconds = future.result()
+                    statistics, odds = summary.get("statistics", {}), summary.get("odds", {})
+                    results[(league, season)] = {
+                        "status": "done", "started": started, "seconds": seconds,
+                        "statistics": statistics.get("matches", 0), "statistics_failed": len(statistics.get("failed", [])),
+                        "odds": odds.get("matches", 0), "odds_failed": len(odds.get("failed", []))}
+                except Exception as e:
+                    results[(league, season)] = {"status": f"failed: {type(e).__name__}: {e}"}
+                print(f"[{len(results)}/{len(futures)}] {league} {season}: {results[(league, season)]}")
+            running = [futures[future] for future in pending if future.running()]
+            for league, season in running:
+                print(f"Running {league} {season}, journaled so far: {journaled_rows(league, season)}")
+    print(f"Scraped {len(results)} targets in {time.perf_counter() - start:.1f}s.")
+    targets = list(plan[["league", "season"]].itertuples(index=False, name=None))
+    return plan.assign(**{column: [results[target].get(column) for target in targets]
+                          for column in ["status", "started", "seconds", "statistics", "statistics_failed", "odds",
+                                         "odds_failed"]})
+
+def main(targets, include_complete=False, plan_only=False, browsers=os.cpu_count(), workers_per_target=2,
+         min_interval=2.0, archive_pages=True, policy=None):
+    plan = plan_targets(targets, include_complete)
+    print(plan.to_string())
+    if plan_only or plan.empty:
+        return
+    log_path = scrape_timing.start_log()
+    try:
+        report = run_schedule(plan, browsers, workers_per_target, min_interval, archive_pages, policy)
+    finally:
+        scrape_timing.stop_log()
+    report.to_csv(RESULTS_FILE_PATH, index=False)
+    print(report.to_string())
+    print(scrape_timing.summary().to_string(index=False))
+    print(f"The timing spans were logged to {log_path}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape many leagues and seasons unattended, the stale and incomplete ones first.")
+    parser.add_argument("--league", type=int, action="append", choices=catalog.LEAGUES,
+                        help="number of a league to scrape, can be given several times (default: all): "
+                             + ", ".join(f"{key}: {value}" for key, value in catalog.LEAGUES.items()))
+    parser.add_argument("--season", action="append", choices=catalog.SEASONS.values(),
+                        help="season to scrape, can be given several times (default: all)")
+    parser.add_argument("--targets", metavar="FILE",
+                        help="JSON file with a list of {\"league\": ..., \"season\": ...} to scrape instead")
+    parser.add_argument("--include-complete", action="store_true",
+                        help="scrape the finished and complete seasons as well, last")
+    parser.add_argument("--plan", action="store_true",
+                        help="only show which targets would be scraped in which order")
+    parser.add_argument("--browsers", type=int, default=os.cpu_count(),
+                        help="maximum number of headless browsers open at a time (default: all cores)")
+    parser.add_argument("--workers-per-target", type=int, default=2,
+                        help="number of browsers that scrape the statistics of one target (default: 2)")
+    parser.add_argument("--min-interval", type=float, default=2.0,
+                        help="minimum number of seconds between two requests of a browser (default: 2.0)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="do not save the fetched pages into the page archive")
+    parser.add_argument("--max-attempts", type=int, default=4,
+                        help="number of times a page is tried (default: 4)")
+    args = parser.parse_args()
+    if args.targets:
+        targets = read_targets(args.targets)
+    else:
+        targets = [(league, season) for league, season in all_targets()
+                   if (args.league is None or league in [catalog.LEAGUES[number] for number in args.league])
+                   and (args.season is None or season in args.season)]
+    main(targets, args.include_complete, args.plan, args.browsers, args.workers_per_target, args.min_interval,
+         not args.no_archive, webscraping.RetryPolicy(args.max_attempts))
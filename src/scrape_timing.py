@@ -0,0 +1,132 @@
+'''
+Timing spans of the scraper phases, to see where the scraping time goes: page loads, expanding the matchdays,
+clicking "Mehr zu diesem Spiel", parsing, archiving, inserting the rows and waiting for the rate limit or a retry.
+The scrapers wrap every phase in "with scrape_timing.span(name, **fields):". The spans of all threads are written as
+JSON lines to a log file once start_log was called, and only their running totals per phase are kept in memory, which
+summary() reports. The log of a run can be summarized again later with "python scrape_timing.py <log file>".
+'''
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+LOG_DIR = "../data/logs"
+SUMMARY_COLUMNS = ["span", "count", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms", "errors"]
+# the spans of a phase whose seconds are kept for the percentiles, beyond that a uniform sample of them is kept
+SAMPLE_SIZE = 10000
+
+class PhaseTimes:
+    """The count, total, maximum and errors of the spans of a phase, and a uniform sample of at most sample_size of
+    their seconds for the percentiles (reservoir sampling), so that memory does not grow with the length of a run"""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.count, self.total, self.max, self.errors = 0, 0.0, 0.0, 0
+        self.sample, self.sample_size = [], sample_size
+        self.random = random.Random(0)
+
+    def add(self, seconds, error):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += error is not None
+        if len(self.sample) < self.sample_size:
+            self.sample.append(seconds)
+        else:
+            i = self.random.randrange(self.count)
+            if i < self.sample_size:
+                self.sample[i] = seconds
+
+class SpanRecorder:
+    """Keeps the running totals of the spans of all threads per phase, and writes the spans to a JSON lines log file
+    if one is open. Thread-safe."""
+
+    def __init__(self):
+        self.phases, self.file = {}, None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **fields):
+        started, start = datetime.now(), time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record = {"span": name, "started": started.isoformat(timespec="milliseconds"),
+                      "seconds": time.perf_counter() - start, "thread": threading.current_thread().name,
+                      "error": error, **fields}
+            with self.lock:
+                self.phases.setdefault(name, PhaseTimes()).add(record["seconds"], error)
+                if self.file is not None:
+                    self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def start_log(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            self.file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def stop_log(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def reset(self):
+        with self.lock:
+            self.phases = {}
+
+    def summary(self):
+        with self.lock:
+            rows = [{"span": name, "count": phase.count, "total_s": phase.total,
+                     "mean_ms": 1000 * phase.total / phase.count, "p50_ms": 1000 * np.percentile(phase.sample, 50),
+                     "p95_ms": 1000 * np.percentile(phase.sample, 95), "max_ms": 1000 * phase.max,
+                     "errors": phase.errors} for name, phase in self.phases.items()]
+        return pd.DataFrame(rows, columns=SUMMARY_COLUMNS).sort_values("total_s", ascending=False, ignore_index=True)
+
+RECORDER = SpanRecorder()
+
+# times the block under the name, with the fields (e.g. url, idx) added to its record
+def span(name, **fields):
+    return RECORDER.span(name, **fields)
+
+# writes the spans to ../data/logs/scrape_<date and time>.jsonl (or path) from now on and returns the path
+def start_log(path=None):
+    path = os.path.join(LOG_DIR, f"scrape_{datetime.now():%Y-%m-%d_%H-%M-%S}.jsonl") if path is None else path
+    RECORDER.start_log(path)
+    return path
+
+def stop_log():
+    RECORDER.stop_log()
+
+def read_log(path):
+    with open(path, encoding="utf-8") as file:
+        return pd.DataFrame([json.loads(line) for line in file if line.endswith("\n")])
+
+def summary(spans=None):
+    """The count, total and percentiles of the seconds and the errors of every phase, the slowest phases first, of the
+    spans recorded so far or of the spans of a log. Phases nest, e.g. a page load within a match, so their totals add
+    up to more than the run took."""
+    if spans is None:
+        return RECORDER.summary()
+    if spans.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    grouped = spans.groupby("span")
+    return pd.DataFrame({"count": grouped.size(), "total_s": grouped["seconds"].sum(),
+                         "mean_ms": 1000 * grouped["seconds"].mean(), "p50_ms": 1000 * grouped["seconds"].median(),
+                         "p95_ms": 1000 * grouped["seconds"].quantile(0.95), "max_ms": 1000 * grouped["seconds"].max(),
+                         "errors": grouped["error"].count()}).sort_values("total_s", ascending=False).reset_index()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the timing spans of a scraping run per phase.")
+    parser.add_argument("log", help="JSON lines log file of the run, e.g. ../data/logs/scrape_2025-01-10_20-00-00.jsonl")
+    args = parser.parse_args()
+    print(summary(read_log(args.log)).to_string(index=False))
@@ -0,0 +1,372 @@
+'''
+Resolution of the team spellings used by Google and oddsportal to one canonical name per club.
+The canonical names are the oddsportal spellings, which the prepared data has always used. The alias table below is
+compiled into an index of exact and normalized (accent and case insensitive) spellings, which is stored in
+../data/team_alias_index.json and rebuilt whenever the table changes. Teams are resolved as a categorical remap, so
+every distinct spelling is looked up once no matter how many rows it appears in.
+'''
+
+import hashlib
+import json
+import unicodedata
+import numpy as np
+import pandas as pd
+
+ALIAS_INDEX_PATH = "../data/team_alias_index.json"
+
+# canonical (oddsportal) name: other spellings, mostly the German short names shown by Google
+TEAM_ALIASES = {
+    "1. Bundesliga": {
+        "Bayern Munich": ["Bayern", "FC Bayern", "FC Bayern München", "Bayern München"],
+        "Dortmund": ["Borussia Dortmund", "BVB"],
+        "Bayer Leverkusen": ["Leverkusen", "Bayer 04 Leverkusen"],
+        "RB Leipzig": ["Leipzig", "RasenBallsport Leipzig"],
+        "Stuttgart": ["VfB Stuttgart"],
+        "Eintracht Frankfurt": ["Frankfurt"],
+        "Union Berlin": ["1. FC Union Berlin"],
+        "Werder Bremen": ["Bremen", "SV Werder Bremen"],
+        "FC Koln": ["Köln", "1. FC Köln", "FC Köln"],
+        "Wolfsburg": ["VfL Wolfsburg"],
+        "Hertha Berlin": ["Hertha", "Hertha BSC"],
+        "Augsburg": ["FC Augsburg"],
+        "B. Monchengladbach": ["Mönchengladbach", "Borussia Mönchengladbach", "Gladbach"],
+        "Arminia Bielefeld": ["Arminia", "Bielefeld"],
+        "Mainz": ["Mainz 05", "1. FSV Mainz 05"],
+        "Schalke": ["Schalke 04", "FC Schalke 04"],
+        "Hoffenheim": ["TSG Hoffenheim", "TSG 1899 Hoffenheim"],
+        "Freiburg": ["SC Freiburg"],
+        "Bochum": ["VfL Bochum"],
+        "Greuther Furth": ["Greuther Fürth", "SpVgg Greuther Fürth", "Fürth"],
+        "Heidenheim": ["1. FC Heidenheim"],
+        "Darmstadt": ["Darmstadt 98", "SV Darmstadt 98"],
+        "St. Pauli": ["FC St. Pauli"],
+        "Holstein Kiel": ["Holstein", "Kiel"],
+        "Hamburger SV": ["Hamburg", "HSV"],
+        "Dusseldorf": ["Düsseldorf", "Fortuna Düsseldorf"],
+    },
+    "2. Bundesliga": {
+        "Hannover": ["Hannover 96"],
+        "Karlsruher": ["Karlsruhe", "Karlsruher SC"],
+        "Paderborn": ["SC Paderborn", "SC Paderborn 07"],
+        "Nurnberg": ["Nürnberg", "1. FC Nürnberg"],
+        "Kaiserslautern": ["1. FC Kaiserslautern"],
+        "Magdeburg": ["1. FC Magdeburg"],
+        "Elversberg": ["SV Elversberg"],
+        "Braunschweig": ["Eintracht Braunschweig"],
+        "Regensburg": ["Jahn Regensburg", "SSV Jahn Regensburg"],
+        "Ulm": ["SSV Ulm", "SSV Ulm 1846"],
+        "Preussen Munster": ["Münster", "Preußen Münster", "SC Preußen Münster"],
+        "Hansa Rostock": ["Rostock", "FC Hansa Rostock"],
+        "Wehen": ["Wehen Wiesbaden", "SV Wehen Wiesbaden"],
+        "Osnabruck": ["Osnabrück", "VfL Osnabrück"],
+        "Sandhausen": ["SV Sandhausen"],
+        "Dresden": ["Dynamo Dresden"],
+        "Ingolstadt": ["FC Ingolstadt", "FC Ingolstadt 04"],
+        "Aue": ["Erzgebirge Aue"],
+    },
+    "Premier League": {
+        "Manchester City": ["Man City", "Manchester City FC"],
+        "Manchester Utd": ["Man United", "Man Utd", "Manchester United"],
+        "Liverpool": ["FC Liverpool"],
+        "Arsenal": ["FC Arsenal"],
+        "Chelsea": ["FC Chelsea"],
+        "Tottenham": ["Tottenham Hotspur", "Spurs"],
+        "Newcastle": ["Newcastle United"],
+        "Aston Villa": ["Villa"],
+        "Brighton": ["Brighton & Hove Albion", "Brighton and Hove Albion"],
+        "West Ham": ["West Ham United"],
+        "Wolves": ["Wolverhampton", "Wolverhampton Wanderers"],
+        "Nottingham": ["Nottingham Forest", "Nottm Forest"],
+        "Crystal Palace": ["Palace"],
+        "Fulham": ["FC Fulham"],
+        "Brentford": ["FC Brentford"],
+        "Everton": ["FC Everton"],
+        "Bournemouth": ["AFC Bournemouth"],
+        "Leicester": ["Leicester City"],
+        "Southampton": ["FC Southampton"],
+        "Ipswich": ["Ipswich Town"],
+    },
+    "EFL Championship": {
+        "Leeds": ["Leeds United"],
+        "Burnley": ["FC Burnley"],
+        "Sheffield Utd": ["Sheffield United"],
+        "Sunderland": ["AFC Sunderland"],
+        "Middlesbrough": ["FC Middlesbrough"],
+        "West Brom": ["West Bromwich Albion", "West Bromwich"],
+        "Norwich": ["Norwich City"],
+        "Coventry": ["Coventry City"],
+        "Watford": ["FC Watford"],
+        "Millwall": ["FC Millwall"],
+        "Bristol City": ["Bristol"],
+        "Blackburn": ["Blackburn Rovers"],
+        "Preston": ["Preston North End"],
+        "Hull": ["Hull City"],
+        "Stoke": ["Stoke City"],
+        "Swansea": ["Swansea City"],
+        "Cardiff": ["Cardiff City"],
+        "QPR": ["Queens Park Rangers"],
+        "Plymouth": ["Plymouth Argyle"],
+        "Derby": ["Derby County"],
+        "Portsmouth": ["FC Portsmouth"],
+        "Oxford Utd": ["Oxford United"],
+        "Luton": ["Luton Town"],
+        "Sheffield Wed": ["Sheffield Wednesday"],
+        "Huddersfield": ["Huddersfield Town"],
+        "Birmingham": ["Birmingham City"],
+        "Rotherham": ["Rotherham United"],
+        "Reading": ["FC Reading"],
+        "Wigan": ["Wigan Athletic"],
+        "Blackpool": ["FC Blackpool"],
+    },
+    "La Liga": {
+        "Real Madrid": ["Real Madrid CF"],
+        "Barcelona": ["FC Barcelona"],
+        "Atl. Madrid": ["Atlético Madrid", "Atletico Madrid", "Atlético"],
+        "Ath Bilbao": ["Athletic Bilbao", "Athletic Club"],
+        "Real Sociedad": ["San Sebastián"],
+        "Betis": ["Real Betis", "Betis Sevilla"],
+        "Villarreal": ["FC Villarreal"],
+        "Valencia": ["FC Valencia"],
+        "Sevilla": ["FC Sevilla"],
+        "Girona": ["FC Girona"],
+        "Osasuna": ["CA Osasuna"],
+        "Celta Vigo": ["Celta"],
+        "Mallorca": ["RCD Mallorca"],
+        "Rayo Vallecano": ["Rayo"],
+        "Getafe": ["FC Getafe"],
+        "Alaves": ["Deportivo Alavés", "Alavés"],
+        "Las Palmas": ["UD Las Palmas"],
+        "Granada CF": ["FC Granada", "Granada"],
+        "Cadiz CF": ["FC Cádiz", "Cádiz"],
+        "Almeria": ["UD Almería", "Almería"],
+        "Leganes": ["CD Leganés", "Leganés"],
+        "Valladolid": ["Real Valladolid"],
+        "Espanyol": ["Espanyol Barcelona"],
+        "Elche": ["FC Elche"],
+        "Levante": ["UD Levante"],
+        "Oviedo": ["Real Oviedo"],
+    },
+    "Segunda División": {
+        "Eibar": ["SD Eibar"],
+        "Zaragoza": ["Real Zaragoza"],
+        "Sporting Gijon": ["Sporting Gijón"],
+        "Racing Santander": ["Racing"],
+        "Dep. La Coruna": ["Deportivo La Coruña", "La Coruña"],
+        "Burgos CF": ["FC Burgos", "Burgos"],
+        "Albacete": ["Albacete Balompié"],
+        "Cartagena": ["FC Cartagena"],
+        "Castellon": ["CD Castellón", "Castellón"],
+        "Cordoba": ["FC Córdoba", "Córdoba"],
+        "Eldense": ["CD Eldense"],
+        "Huesca": ["SD Huesca"],
+        "Malaga": ["FC Málaga", "Málaga"],
+        "Mirandes": ["CD Mirandés", "Mirandés"],
+        "Tenerife": ["CD Teneriffa", "Teneriffa"],
+        "Racing Ferrol": ["Ferrol"],
+    },
+    "Serie A": {
+        "Inter": ["Inter Mailand", "Inter Milan"],
+        "AC Milan": ["AC Mailand", "Milan"],
+        "Juventus": ["Juventus Turin"],
+        "Napoli": ["SSC Neapel", "Neapel"],
+        "AS Roma": ["AS Rom", "Roma"],
+        "Lazio": ["Lazio Rom"],
+        "Atalanta": ["Atalanta Bergamo"],
+        "Fiorentina": ["AC Florenz", "Florenz"],
+        "Bologna": ["FC Bologna"],
+        "Torino": ["FC Turin"],
+        "Genoa": ["CFC Genua", "Genua"],
+        "Udinese": ["Udinese Calcio"],
+        "Sassuolo": ["US Sassuolo"],
+        "Empoli": ["FC Empoli"],
+        "Verona": ["Hellas Verona"],
+        "Lecce": ["US Lecce"],
+        "Cagliari": ["Cagliari Calcio"],
+        "Monza": ["AC Monza"],
+        "Frosinone": ["Frosinone Calcio"],
+        "Salernitana": ["US Salernitana"],
+        "Sampdoria": ["Sampdoria Genua"],
+        "Spezia": ["Spezia Calcio"],
+        "Cremonese": ["US Cremonese"],
+        "Como": ["Como 1907"],
+        "Parma": ["Parma Calcio"],
+        "Venezia": ["FC Venedig", "Venedig"],
+    },
+    "Serie B": {
+        "Palermo": ["US Palermo"],
+        "Bari": ["SSC Bari"],
+        "Pisa": ["AC Pisa"],
+        "Brescia": ["Brescia Calcio"],
+        "Catanzaro": ["US Catanzaro"],
+        "Cittadella": ["AS Cittadella"],
+        "Modena": ["Modena FC"],
+        "Reggiana": ["AC Reggiana"],
+        "Sudtirol": ["Südtirol", "FC Südtirol"],
+        "Cosenza": ["Cosenza Calcio"],
+        "Carrarese": ["Carrarese Calcio"],
+        "Juve Stabia": ["SS Juve Stabia"],
+        "Mantova": ["Mantova 1911"],
+        "Cesena": ["AC Cesena"],
+    },
+    "Ligue 1": {
+        "PSG": ["Paris Saint-Germain", "Paris SG", "Paris St. Germain"],
+        "Marseille": ["Olympique Marseille"],
+        "Monaco": ["AS Monaco"],
+        "Lille": ["OSC Lille"],
+        "Lyon": ["Olympique Lyon"],
+        "Nice": ["OGC Nizza", "Nizza"],
+        "Lens": ["RC Lens"],
+        "Rennes": ["Stade Rennes"],
+        "Reims": ["Stade Reims"],
+        "Strasbourg": ["Racing Straßburg", "Straßburg"],
+        "Montpellier": ["HSC Montpellier"],
+        "Nantes": ["FC Nantes"],
+        "Toulouse": ["FC Toulouse"],
+        "Brest": ["Stade Brest"],
+        "Le Havre": ["Le Havre AC"],
+        "Auxerre": ["AJ Auxerre"],
+        "Angers": ["SCO Angers"],
+        "St Etienne": ["AS Saint-Étienne", "Saint-Étienne"],
+        "Lorient": ["FC Lorient"],
+        "Metz": ["FC Metz"],
+        "Clermont": ["Clermont Foot"],
+        "Troyes": ["ES Troyes AC", "Troyes AC"],
+        "Ajaccio": ["AC Ajaccio"],
+    },
+    "Ligue 2": {
+        "Paris FC": ["FC Paris"],
+        "Bastia": ["SC Bastia"],
+        "Guingamp": ["EA Guingamp"],
+        "Caen": ["SM Caen"],
+        "Amiens": ["Amiens SC"],
+        "Grenoble": ["Grenoble Foot"],
+        "Laval": ["Stade Laval"],
+        "Pau FC": ["FC Pau", "Pau"],
+        "Rodez": ["Rodez AF"],
+        "Dunkerque": ["USL Dunkerque"],
+        "Annecy": ["FC Annecy"],
+        "Red Star": ["Red Star Paris"],
+        "Martigues": ["FC Martigues"],
+        "Quevilly Rouen": ["QRM"],
+        "Valenciennes": ["FC Valenciennes"],
+        "Bordeaux": ["Girondins Bordeaux"],
+        "Concarneau": ["US Concarneau"],
+        "Niort": ["Chamois Niort"],
+        "Sochaux": ["FC Sochaux"],
+    },
+    # clubs from outside the domestic leagues above that play in the European competitions
+    "European Competitions": {
+        "Benfica": ["Benfica Lissabon"],
+        "FC Porto": ["Porto"],
+        "Sporting CP": ["Sporting Lissabon"],
+        "Braga": ["Sporting Braga", "SC Braga"],
+        "PSV": ["PSV Eindhoven"],
+        "Ajax": ["Ajax Amsterdam"],
+        "Feyenoord": ["Feyenoord Rotterdam"],
+        "AZ Alkmaar": ["Alkmaar"],
+        "Twente": ["FC Twente"],
+        "Celtic": ["Celtic Glasgow"],
+        "Rangers": ["Glasgow Rangers"],
+        "Club Brugge KV": ["FC Brügge", "Club Brügge"],
+        "Anderlecht": ["RSC Anderlecht"],
+        "Union SG": ["Royale Union Saint-Gilloise", "Union Saint-Gilloise"],
+        "Gent": ["KAA Gent"],
+        "Salzburg": ["RB Salzburg", "Red Bull Salzburg"],
+        "Sturm Graz": ["SK Sturm Graz"],
+        "Rapid Vienna": ["Rapid Wien", "SK Rapid Wien"],
+        "Young Boys": ["Young Boys Bern", "BSC Young Boys"],
+        "Basel": ["FC Basel"],
+        "Servette": ["Servette Genf"],
+        "Shakhtar Donetsk": ["Schachtar Donezk"],
+        "Dyn. Kyiv": ["Dynamo Kiew"],
+        "Galatasaray": ["Galatasaray Istanbul"],
+        "Fenerbahce": ["Fenerbahçe", "Fenerbahçe Istanbul"],
+        "Besiktas": ["Beşiktaş", "Beşiktaş Istanbul"],
+        "Olympiacos Piraeus": ["Olympiakos Piräus", "Olympiakos"],
+        "PAOK": ["PAOK Thessaloniki"],
+        "Panathinaikos": ["Panathinaikos Athen"],
+        "AEK Athens FC": ["AEK Athen"],
+        "Crvena zvezda": ["Roter Stern Belgrad"],
+        "D. Zagreb": ["Dinamo Zagreb"],
+        "Slavia Prague": ["Slavia Prag"],
+        "Sparta Prague": ["Sparta Prag"],
+        "Plzen": ["Viktoria Pilsen"],
+        "FC Copenhagen": ["FC Kopenhagen"],
+        "Midtjylland": ["FC Midtjylland"],
+        "Malmo FF": ["Malmö FF"],
+        "Bodo/Glimt": ["FK Bodø/Glimt", "Bodø/Glimt"],
+        "Molde": ["Molde FK"],
+        "Ferencvaros": ["Ferencváros Budapest", "Ferencváros"],
+        "Legia": ["Legia Warschau"],
+        "Maccabi Tel Aviv": ["Maccabi Tel-Aviv"],
+    },
+}
+
+def normalize_name(name):
+    name = unicodedata.normalize("NFKD", name.replace("ß", "ss")).encode("ascii", "ignore").decode()
+    return " ".join(name.casefold().split())
+
+def _table_fingerprint():
+    return hashlib.sha256(json.dumps(TEAM_ALIASES, sort_keys=True).encode()).hexdigest()
+
+# compiles the alias table into exact and normalized lookups and fails on spellings that point to two clubs
+def build_alias_index():
+    exact, normalized = {}, {}
+    for league, teams in TEAM_ALIASES.items():
+        for canonical, aliases in teams.items():
+            for alias in [canonical] + aliases:
+                for lookup, key in [(exact, alias), (normalized, normalize_name(alias))]:
+                    if lookup.get(key, canonical) != canonical:
+                        raise ValueError(f"The spelling {alias} ({league}) is used for {lookup[key]} and {canonical}.")
+                    lookup[key] = canonical
+    return {"fingerprint": _table_fingerprint(), "exact": exact, "normalized": normalized}
+
+_alias_index = None
+
+# loads the compiled index from disk and rebuilds it if it is missing or was compiled from another table
+def load_alias_index():
+    global _alias_index
+    if _alias_index is not None:
+        return _alias_index
+    try:
+        with open(ALIAS_INDEX_PATH, encoding="utf-8") as file:
+            index = json.load(file)
+    except FileNotFoundError:
+        index = None
+    if index is None or index["fingerprint"] != _table_fingerprint():
+        index = build_alias_index()
+        with open(ALIAS_INDEX_PATH, "w", encoding="utf-8") as file:
+            json.dump(index, file, ensure_ascii=False)
+    _alias_index = index
+    return index
+
+def resolve_name(name):
+    index = load_alias_index()
+    return index["exact"].get(name) or index["normalized"].get(normalize_name(name), name)
+
+# maps every spelling of a team column to its canonical name; unknown spellings are kept as they are
+def resolve_teams(teams):
+    categorical = pd.Categorical(teams)
+    resolved = np.array([resolve_name(str(team)) for team in categorical.categories], dtype=object)
+    categories, codes = np.unique(resolved, return_inverse=True)
+    codes = np.where(categorical.codes >= 0, codes[categorical.codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=getattr(teams, "index", None))
+
+# rewrites the team names inside match IDs of the form date_home_away_goalshome_goalsaway
+def resolve_match_ids(match_ids):
+    parts = pd.Index(match_ids).str.extract(r"^(?P<date>[^_]*)_(?P<home>[^_]*)_(?P<away>[^_]*)_(?P<rest>.*)$")
+    resolved = (parts["date"] + "_" + resolve_teams(parts["home"]).astype(object) + "_"
+                + resolve_teams(parts["away"]).astype(object) + "_" + parts["rest"])
+    # IDs that do not follow the pattern are kept as they are
+    return pd.Index(resolved.fillna(pd.Series(match_ids, dtype=object)).to_numpy(), name=pd.Index(match_ids).name)
+
+# all canonical teams of the leagues that any of the given teams plays in, e.g. to cover promoted teams as well
+def league_teams(teams):
+    teams = set(teams)
+    return sorted({canonical for league in TEAM_ALIASES.values() if teams & set(league)
+                   for canonical in league})
+
+def unknown_teams(teams):
+    index = load_alias_index()
+    return sorted(team for team in pd.unique(pd.Series(teams).dropna())
+                  if team not in index["exact"] and normalize_name(team) not in index["normalized"])
@@ -3,27 +3,34 @@ This script can be used to webscrape the google statistics of any football leagu
 Sometimes manual user inputs will be required (to select a league to be scraped, or to solve a Captcha while scraping.)
 '''
 
+import argparse
 import pandas as pd
-import numpy as np
-import re
+import queue
+import random
+import threading
 import traceback
 import time
 from datetime import datetime
-from selenium import webdriver
+from urllib.parse import urljoin
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import TimeoutException, WebDriverException
+import browser
+import catalog
+import dataset_store
+import page_archive
+import page_parsing
+import scrape_journal
+import scrape_timing
+
+GOOGLE_SEARCH_URL = "https://www.google.com/search?q="
 
 # function to request user input of the league and season to be scraped
 def get_inputs_from_user():
     
     # league input
-    scrapable_leagues = {1: "1. Bundesliga", 2: "2. Bundesliga", 3: "Premier League", 4: "EFL Championship", 5: "La Liga",
-                         6: "Segunda División", 7: "Serie A", 8: "Serie B", 9: "Ligue 1", 10: "Ligue 2",
-                         11: "Champions League", 12: "Europa League", 13: "Conference League"}
+    scrapable_leagues = catalog.LEAGUES
     while True:
         league_input = input("Please enter the league of the matches you want to scrape by providing the respective number:\n" +
                                      "\n".join([f"{key}: {value}" for key, value in scrapable_leagues.items()]) + "\n")
@@ -40,7 +47,7 @@ def get_inputs_from_user():
             print("The input must be between 1 and 13. Please try again.")
     
     # season input
-    scrapable_seasons = {1: "2021/22", 2: "2022/23", 3: "2023/24", 4: "2024/25", 5: "Upcoming Matches"}
+    scrapable_seasons = catalog.SEASONS
     while True:
         season_input = input("Please enter the season of the matches you want to scrape by providing the respective number:\n" +
                                      "\n".join([f"{key}: {value}" for key, value in scrapable_seasons.items()]) + "\n")
@@ -56,9 +63,15 @@ def get_inputs_from_user():
         else:
             print("The input must be between 1 and 5. Please try again.")
 
+    return partition_inputs(league_input, season)
+
+# the google and oddsportal urls and the file paths of a league (by its number in catalog.LEAGUES) and season
+def partition_inputs(league_input, season):
+    league = catalog.LEAGUES[league_input]
+
     # google search query and file path
     google_url = "https://www.google.com/search?q="+league.replace(" ", "+")+"+Spiele+"+season.replace("/", "+")
-    google_file_path = "../data/"+league.replace(" ", "_").replace(".","")+"_"+season.replace("/", "_")+"_google_statistics.csv"
+    google_file_path = catalog.partition_path(league, season, "statistics")
 
     # oddsportal page and file path
     oddsportal_pages = {1: "germany/bundesliga",
@@ -83,99 +96,130 @@ def get_inputs_from_user():
         odds_url = "https://www.oddsportal.com/football/"+oddsportal_pages[league_input]
     else:
         odds_url = "https://www.oddsportal.com/football/"+oddsportal_pages[league_input]+"-"+season.replace("/", "-20")+"/results/"
-    odds_file_path = "../data/"+league.replace(" ", "_").replace(".","")+"_"+season.replace("/", "_")+"_oddsportal_odds.csv"
+    odds_file_path = catalog.partition_path(league, season, "odds")
 
     # file path for all matches
-    matches_file_path = "../data/"+league.replace(" ", "_").replace(".","")+"_"+season.replace("/", "_")+"_matches.csv"
+    matches_file_path = catalog.partition_path(league, season, "matches")
     
     return league, season, google_url, odds_url, google_file_path, matches_file_path, odds_file_path
 
-# clicks the expand button and scroll up and down to expand all matchdays
-def expand_all_matchdays(driver):
-
-    # checks if a new element has been loaded while scrolling up or down through the page
-    def _check(driver, prior_element, scroll_up):
-        matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
-        idx = 0 if scroll_up else len(matchdays)-1
-        return matchdays[idx].text != prior_element.text
-
-    expand_button = WebDriverWait(driver, 3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "Z4Cazf")))
-    expand_button.click()
-
-    # load all matches by scrolling up and then down through the page
-    WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "OcbAbf")))
-    actions = ActionChains(driver)
-    for idx, scrup in [(0, True), (-1, False)]:        
-        while True:
-            try:
-                matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
-                prior_match = matchdays[idx]
-                actions.move_to_element(prior_match).perform()
-                WebDriverWait(driver, 3.5).until(lambda d: _check(d, prior_match, scroll_up=scrup))
-            except TimeoutException:
-                break
-
-# returns the date in pandas datetime format from the google date text of football matches
-def extract_date_from_google_text(text):
-    if ("Heute" in text) or ("Gestern" in text):
-        if "Heute" in text:
-            date = datetime.now().date()
-        else:
-            date = datetime.now().date() - pd.Timedelta(days=1)
-        day = date.day
-        month = date.month
-        year = date.year
-    else:
-        d = re.search(r"\d{1,2}\.\d{1,2}\.", text)
-        day, month = d.group().split(".")[0:2]
+# seconds between two polls of the rows while a page loads, which grow from POLL_INTERVAL to MAX_POLL_INTERVAL
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+# returns the number of rows with the class, the text of the first or last of them, the milliseconds since the page
+# last changed and the number of its fetch and XMLHttpRequest requests in flight. A MutationObserver and wrappers of
+# fetch and XMLHttpRequest that keep track of these are installed on the first call. Scrolls the row into view first
+# if scroll is set.
+WATCH_ROWS_SCRIPT = """
+const [className, first, scroll] = arguments;
+if (!window.rowWatcher) {
+    const watcher = window.rowWatcher = {lastMutation: performance.now(), requests: 0};
+    new MutationObserver(() => { watcher.lastMutation = performance.now(); })
+        .observe(document.body, {childList: true, subtree: true, characterData: true});
+    const fetch = window.fetch;
+    window.fetch = function () {
+        watcher.requests++;
+        return fetch.apply(this, arguments).finally(() => { watcher.requests--; });
+    };
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        watcher.requests++;
+        this.addEventListener("loadend", () => { watcher.requests--; });
+        return send.apply(this, arguments);
+    };
+}
+const rows = document.getElementsByClassName(className);
+const edge = rows.length ? rows[first ? 0 : rows.length - 1] : null;
+if (scroll && edge) {
+    edge.scrollIntoView({block: first ? "start" : "end"});
+}
+return [rows.length, edge ? edge.textContent : "", performance.now() - window.rowWatcher.lastMutation,
+        window.rowWatcher.requests];
+"""
+
+def load_all_rows(driver, class_name, first=False, timeout=10, settle=0.5):
+    """Scroll the first (or last) row with the class into view until no more rows are loaded.
+    Instead of waiting for a full timeout after the last row, the page is polled with a growing interval, and loading
+    is done as soon as the rows have not changed for settle seconds after the last scroll, while no request of the
+    page is in flight and the page has not changed for settle seconds either. The wait after a scroll is limited to
+    timeout. Returns the number of rows, scrolls and seconds."""
+    with scrape_timing.span("load_rows", class_name=class_name, first=first):
+        return _load_all_rows(driver, class_name, first, timeout, settle)
+
+def _load_all_rows(driver, class_name, first, timeout, settle):
+    start = time.monotonic()
+    count, edge, _, _ = driver.execute_script(WATCH_ROWS_SCRIPT, class_name, first, True)
+    scrolled_at, scrolls, interval = start, 1, POLL_INTERVAL
+    while True:
+        time.sleep(interval)
+        new_count, new_edge, since_mutation, requests = driver.execute_script(WATCH_ROWS_SCRIPT, class_name, first, False)
+        if (new_count, new_edge) != (count, edge):
+            count, edge, _, _ = driver.execute_script(WATCH_ROWS_SCRIPT, class_name, first, True)
+            scrolled_at, scrolls, interval = time.monotonic(), scrolls + 1, POLL_INTERVAL
+            continue
+        waited = time.monotonic() - scrolled_at
+        if waited >= timeout or (waited >= settle and requests == 0 and since_mutation >= 1000 * settle):
+            return {"rows": count, "scrolls": scrolls, "seconds": time.monotonic() - start}
+        interval = min(1.5 * interval, MAX_POLL_INTERVAL)
 
-        # Find out the year, which is either given as two digits by google, ...
-        if y := re.search(r"\d{1,2}\.\d{1,2}\.\d{2}", text):
-            year = "20" + y.group().split('.')[2]
-        # or not explicitly written out if it is recent. In that case it is either the current year or the last year.
-        else:
-            current_year = datetime.now().year 
-            if datetime.strptime(f"{day}.{month}.{str(current_year)}", "%d.%m.%Y").date() <= datetime.now().date():
-                year = str(current_year)
-            else:
-                year = str(current_year-1)
+# waits until the first row with the class differs from previous_first_row and returns whether it did
+def wait_for_new_rows(driver, class_name, previous_first_row, timeout=3.0):
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script(WATCH_ROWS_SCRIPT, class_name, True, False)[1] not in ("", previous_first_row))
+        return True
+    except TimeoutException:
+        return False
 
-    # Reconstruct the date string
-    return f"{day}.{month}.{year}"
+# clicks the expand button and scroll up and down to expand all matchdays
+def expand_all_matchdays(driver):
 
-# function to find all scrapable matches that are not in the mathes_df dataframe and add them
-def find_all_scrapable_matches(driver, matches_df, league):
+    with scrape_timing.span("expand_matchdays"):
+        expand_button = WebDriverWait(driver, 3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "Z4Cazf")))
+        expand_button.click()
 
-        # find and iterate over all matchdays on the page
+        # load all matches by scrolling up and then down through the page
         WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "OcbAbf")))
-        matchdays = driver.find_elements(By.CLASS_NAME, "OcbAbf")
-        matchday_text = "No matchday text found"
-        for matchday in matchdays:
-            try:
-                matchday_text = matchday.find_element(By.CLASS_NAME, "GVj7ae").text
-            except NoSuchElementException:
-                pass
-
-            # find and iterate over all matches of the matchday (some "KAIX8d" elements are empty)
-            matches = [match for match in matchday.find_elements(By.CLASS_NAME, "KAIX8d") if match.text != ""]
-            for match in matches:
-
-                # if the match has a result, scrape identifiers of the match and check if it's not already in the dataframe
-                try:
-                    result_line = match.find_element(By.CLASS_NAME, "imspo_mt__tt-w")
-                    result_line.find_element(By.CLASS_NAME, "imspo_mt__t-sc")
-                except NoSuchElementException:
-                    continue
-
-                date = extract_date_from_google_text(match.find_element(By.CLASS_NAME, "GOsQPe").text)  
-                team_home, team_away = [t.text.split("\n")[1] for t in match.find_elements(By.CLASS_NAME, "L5Kkcd")]
-                goals_home, goals_away = [t.text.split("\n")[0] for t in match.find_elements(By.CLASS_NAME, "L5Kkcd")]
-                idx = "_".join([date, team_home, team_away, goals_home, goals_away])
-
-                if not idx in matches_df.index:
-                    matches_df.loc[idx] = [date, league, matchday_text, team_home, team_away, goals_home, goals_away]
-        
-        return matches_df
+        for first in [True, False]:
+            load_all_rows(driver, "OcbAbf", first, timeout=3.5)
+
+# the page_source of the driver, which is saved into the archive as a page of the kind (of match idx) if there is one
+def snapshot(driver, archive=None, kind=None, idx=None, url=None):
+    with scrape_timing.span("page_source"):
+        page_source = driver.page_source
+    if archive is not None:
+        with scrape_timing.span("archive_save", kind=kind):
+            archive.save(kind, driver.current_url if url is None else url, page_source, idx)
+    return page_source
+
+# function to find all scrapable matches that are not in the mathes_df dataframe, returns matches_df with them added
+def find_all_scrapable_matches(driver, matches_df, league, archive=None):
+
+        # parse all matchdays from one snapshot of the page
+        WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "OcbAbf")))
+        page_source = snapshot(driver, archive, "google_matches")
+        with scrape_timing.span("parse_matches"):
+            matches = page_parsing.parse_google_matches(page_source, league)
+        # the new matches are added in one go, adding them row by row copies the frame for every match
+        with scrape_timing.span("insert_matches", matches=len(matches)):
+            new_matches = pd.DataFrame.from_dict({idx: match for idx, match in matches.items() if idx not in matches_df.index},
+                                                orient="index", columns=matches_df.columns)
+            new_matches.index.name = matches_df.index.name
+            if not len(matches_df):
+                return new_matches
+            return pd.concat([matches_df, new_matches]) if len(new_matches) else matches_df
+
+# loads url in the driver of the interactive scraping and lets the user load it manually if it does not load in time.
+# Returns whether the page is loaded, or raises a KeyboardInterrupt if the user chooses to abort.
+def load_or_let_user_fix(driver, url):
+    try:
+        driver.get(url)
+        return True
+    except TimeoutException:
+        print("An error occured. \nFull stack trace:")
+        traceback.print_exc()
+        return let_user_fix_page_state_manually(f"Can you load the page {url} manually? I'm expecting it to be loaded next.")
 
 # function that does nothing or raises a KeyboardInterrupt if the user chooses to abort.
 def let_user_fix_page_state_manually(problem_message):
@@ -199,25 +243,127 @@ def let_user_fix_page_state_manually(problem_message):
         if choice == 3:
             raise KeyboardInterrupt("Aborting the webscraping due to user choice.")
 
-def init_google_stats_scraping(google_url, google_file_path, matches_file_path, league):
-    
-    # Read existing or create csv files for the matches and match statistics to be scraped
+# accept the cookies if the page asks for them, without asking the user for help if it does not. A driver whose
+# profile has the consent cookie already does not wait for the button.
+def accept_google_cookies(driver, google_url):
+    driver.get(google_url)
+    if browser.has_consent(driver, browser.GOOGLE_CONSENT_COOKIES):
+        return
+    try:
+        WebDriverWait(driver, 3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "sy4vM"))).click()
+    except TimeoutException:
+        pass
+
+def accept_oddsportal_cookies(driver, odds_url):
+    driver.get(odds_url)
+    if browser.has_consent(driver, browser.ONETRUST_CONSENT_COOKIES):
+        return
     try:
-        google_stats_df = pd.read_csv(google_file_path, index_col=0)
-        matches_df = pd.read_csv(matches_file_path, index_col=0)
+        WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, "[id='onetrust-accept-btn-handler']"))).click()
+    except TimeoutException:
+        pass
+
+class RetryPolicy:
+    """How the unattended mode deals with pages that fail: every page is tried up to max_attempts times, navigating
+    to it again after an exponential backoff of base_delay * 2**attempt seconds (at most max_delay, with jitter),
+    and the driver is replaced by a fresh one after fresh_driver_after failures in a row."""
+
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=60.0, fresh_driver_after=3,
+                 page_load_timeout=browser.PAGE_LOAD_TIMEOUT):
+        self.max_attempts = max_attempts
+        self.base_delay, self.max_delay = base_delay, max_delay
+        self.fresh_driver_after = fresh_driver_after
+        self.page_load_timeout = page_load_timeout
+
+    def backoff(self, attempt):
+        return min(self.max_delay, self.base_delay * 2**attempt) * random.uniform(0.5, 1)
+
+class DriverSession:
+    """A headless driver that runs page actions with the retries of a RetryPolicy. The driver is started on the first
+    action and set up with setup(driver), e.g. to accept the cookies, like every fresh driver that replaces it."""
+
+    def __init__(self, policy, setup=None):
+        self.policy, self.setup = policy, setup
+        self.driver, self.failures_in_row = None, 0
+        self.attempts, self.failures, self.drivers = 0, 0, 0
+
+    def renew(self):
+        self.quit()
+        self.failures_in_row = 0
+        self.drivers += 1
+        with scrape_timing.span("driver_start"):
+            driver = browser.new_driver(page_load_timeout=self.policy.page_load_timeout)
+            # a driver whose setup failed is replaced on the next attempt
+            try:
+                if self.setup is not None:
+                    self.setup(driver)
+            except Exception:
+                driver.quit()
+                raise
+        self.driver = driver
+
+    def run(self, url, action, description="the page"):
+        """Navigate to url (unless it is None) and return action(driver), trying again as the policy says.
+        Raises the last error if all attempts failed. Other errors than those of the driver, e.g. of parsing an
+        unexpected page, would only come again and are raised after the first attempt."""
+        for attempt in range(self.policy.max_attempts):
+            self.attempts += 1
+            try:
+                if self.driver is None:
+                    self.renew()
+                if url is not None:
+                    self.driver.get(url)
+                result = action(self.driver)
+                self.failures_in_row = 0
+                return result
+            except WebDriverException as e:
+                error = e
+                self.failures += 1
+                self.failures_in_row += 1
+                print(f"Attempt {attempt + 1} of {self.policy.max_attempts} failed for {description}: {type(e).__name__}.")
+                if self.driver is not None and self.failures_in_row >= self.policy.fresh_driver_after:
+                    print("Starting a fresh driver.")
+                    self.quit()
+                if attempt + 1 < self.policy.max_attempts:
+                    with scrape_timing.span("backoff"):
+                        time.sleep(self.policy.backoff(attempt))
+            except Exception as e:
+                self.failures += 1
+                print(f"Attempt {attempt + 1} of {self.policy.max_attempts} failed for {description}: {type(e).__name__}, "
+                      "it is not tried again.")
+                raise
+        raise error
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+
+# Read existing or create csv files for the matches and match statistics to be scraped
+def load_google_dataframes(google_file_path, matches_file_path):
+    try:
+        google_stats_df = dataset_store.widen(dataset_store.read_source(google_file_path))
+        matches_df = dataset_store.widen(dataset_store.read_source(matches_file_path), scraped_dates=True)
     except FileNotFoundError:
         print("This league and season has not been scraped yet. Creating a new dataframe.")
         stats = ["Attempts", "Attempts_On_Target", "Possession", "Passes",
             "Passing_Accuracy", "Fouls", "Yellow_Cards", "Red_Cards", "Offside", "Corners"]
         google_stats_df = pd.DataFrame(columns=[stat+"_"+team for stat in stats for team in ["Home", "Away"]])
-        google_stats_df.to_csv(google_file_path)
+        dataset_store.write_source(google_stats_df, google_file_path)
         matches_df = pd.DataFrame(columns=["Date", "League", "Matchday", "Team_Home", "Team_Away", "Goals_Home", "Goals_Away"])
-        matches_df.to_csv(matches_file_path)
+        dataset_store.write_source(matches_df, matches_file_path)
+    return google_stats_df, matches_df
+
+def init_google_stats_scraping(google_url, google_file_path, matches_file_path, league, archive=None):
+    google_stats_df, matches_df = load_google_dataframes(google_file_path, matches_file_path)
 
-    # Initialize driver and accept Cookies
-    driver = webdriver.Chrome()
+    # Initialize driver and accept Cookies, unless its profile has accepted them already
+    driver = browser.new_driver(headless=False)
     driver.get(google_url)
-    while True:
+    while not browser.has_consent(driver, browser.GOOGLE_CONSENT_COOKIES):
         try:
             cookies_button = WebDriverWait(driver, 3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "sy4vM")))
             cookies_button.click()
@@ -234,7 +380,7 @@ def init_google_stats_scraping(google_url, google_file_path, matches_file_path,
     while True:
         try:
             expand_all_matchdays(driver)
-            find_all_scrapable_matches(driver, matches_df, league)
+            matches_df = find_all_scrapable_matches(driver, matches_df, league, archive)
             break
         except TimeoutException:
             print("An error occured. \nFull stack trace:")
@@ -247,37 +393,50 @@ def init_google_stats_scraping(google_url, google_file_path, matches_file_path,
     print(f"Driver and DataFrames are ready. {len(matches_df)} scrapable matches were found.")
     return driver, google_stats_df, matches_df
 
-def scrape_statistics(driver):
+# scrapes the statistics of the match page that the driver is on, which is saved into the archive as match idx
+def scrape_statistics(driver, archive=None, idx=None):
 
     # click on the "Mehr zu diesem Spiel" button to show the statistics
-    show_more_button = WebDriverWait(driver,3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "U0faLd")))
-    show_more_button.click()
+    with scrape_timing.span("stats_click", idx=idx):
+        show_more_button = WebDriverWait(driver,3.5).until(EC.element_to_be_clickable((By.CLASS_NAME, "U0faLd")))
+        show_more_button.click()
 
     # if match has statistics, scrape them, otherwise insert NaNs
     try:
-        WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "MzWkAb")))
-        statistics = driver.find_elements(By.CLASS_NAME, "MzWkAb")
-        scraped_stats = [w for i in range(10) for w in statistics[i].text.split() if w.isdigit()]
+        with scrape_timing.span("stats_wait", idx=idx):
+            WebDriverWait(driver, 3.5).until(EC.presence_of_element_located((By.CLASS_NAME, "MzWkAb")))
     except TimeoutException:
-        scraped_stats = [np.nan]*20
-    
-    return scraped_stats
-
-# function to scrape all matches from matches_df that are not in google_stats_df
-def scrape_all_google_stats(driver, matches_df, google_stats_df):
+        pass
+    page_source = snapshot(driver, archive, "google_statistics", idx)
+    with scrape_timing.span("parse_statistics"):
+        return page_parsing.parse_google_statistics(page_source)
+
+# the google search of a match, which shows its result and statistics
+def google_match_url(row, search_url=GOOGLE_SEARCH_URL):
+    return (search_url+row["Team_Home"]+" vs. "+row["Team_Away"]+" "+row["Date"]+" "+row["League"]).replace(" ", "+")
+
+# function to scrape all matches from matches_df that are neither in google_stats_df nor in the journal. Matches whose
+# statistics are incomplete are put on the skip list instead.
+def scrape_all_google_stats(driver, matches_df, google_stats_df, journal, archive=None, skip_list=None):
     
-    # iterate over all scrapable matches and search the statistics of those that are not in the google_stats_df
+    # iterate over all scrapable matches and search the statistics of those that have not been scraped yet
     progress_counter = 1
     for idx, row in matches_df.iterrows():
         print(f"Attempting to scrape match {progress_counter} of {len(matches_df)}: {row['Team_Home']} vs {row['Team_Away']} on {row['Date']}.")
         progress_counter += 1
-        if not idx in google_stats_df.index:
-            match_url = ("https://www.google.com/search?q="+row["Team_Home"]+" vs. "+row["Team_Away"]+" "+row["Date"]+" "+row["League"]).replace(" ", "+")
-            driver.get(match_url)
+        if not (idx in google_stats_df.index or idx in journal):
+            driver.get(google_match_url(row))
             while True:
                 try:
-                    match_stats = scrape_statistics(driver)
-                    google_stats_df.loc[idx] = match_stats
+                    match_stats = scrape_statistics(driver, archive, idx)
+                    if not is_complete_row(match_stats, journal):
+                        print(f"Only {len(match_stats)} of {len(journal.columns)} statistics were found, the match was skipped.")
+                        if skip_list is not None:
+                            skip_list.add(idx, "incomplete row")
+                        break
+                    journal.add(idx, match_stats)
+                    if skip_list is not None:
+                        skip_list.discard(idx)
                     print(f"Scraping was successful!")
                     break
                 except TimeoutException:
@@ -290,200 +449,403 @@ def scrape_all_google_stats(driver, matches_df, google_stats_df):
         else:
             print("The match is already in the DataFrame.")
 
+# whether a scraped row has a value for every column of the journal, which a page that was parsed only in part has not
+def is_complete_row(row, journal):
+    return row is not None and len(row) == len(journal.columns)
+
+class RateLimiter:
+    """Spaces the requests of one worker at least min_interval seconds apart, plus a random jitter of up to jitter seconds"""
+
+    def __init__(self, min_interval, jitter=0.0):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.next_request = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_request > now:
+            time.sleep(self.next_request - now)
+        self.next_request = max(now, self.next_request) + self.min_interval + random.uniform(0, self.jitter)
+
+# scrapes its shard of (idx, url) jobs with its own headless driver session and puts (worker_id, idx, result or
+# exception, seconds) into the results queue, followed by (worker_id, None, session, None) when it is done. A job
+# that fails for any reason is passed on as its exception, so that the rest of the shard is still scraped.
+def page_worker(worker_id, jobs, results, stop, scrape, setup, min_interval, jitter, policy):
+    session = DriverSession(policy, setup)
+    try:
+        rate_limiter = RateLimiter(min_interval, jitter)
+        for idx, url in jobs:
+            if stop.is_set():
+                break
+            with scrape_timing.span("rate_limit_wait"):
+                rate_limiter.wait()
+            start = time.perf_counter()
+            try:
+                with scrape_timing.span("match", idx=idx):
+                    result = session.run(url, lambda driver: scrape(driver, idx), f"match {idx}")
+            except Exception as e:
+                result = e
+            results.put((worker_id, idx, result, time.perf_counter() - start))
+    finally:
+        session.quit()
+        results.put((worker_id, None, session, None))
+
+def scrape_pages_parallel(jobs, scrape, journal, to_row=lambda idx, result: result, n_workers=4, min_interval=2.0,
+                          jitter=1.0, setup=None, policy=None, skip_list=None):
+    """Scrape the pages of the (idx, url) jobs with scrape(driver, idx) with a pool of headless drivers, which are set
+    up with setup(driver). The jobs are sharded over n_workers threads with a driver each, whose requests are spaced
+    at least min_interval seconds apart. Every page is retried as the policy says (by default only tried once). The
+    rows to_row(idx, result) are added to the journal as they come in. Matches that still fail are put on the skip
+    list, whose matches are tried last, and are returned with the timings of the run and of every match."""
+    policy = RetryPolicy(max_attempts=1) if policy is None else policy
+    jobs = list(jobs)
+    if skip_list is not None:
+        jobs.sort(key=lambda job: job[0] in skip_list)
+    n_workers = max(1, min(n_workers, len(jobs)))
+    results, stop = queue.Queue(), threading.Event()
+    workers = [threading.Thread(target=page_worker, daemon=True,
+                                args=(worker_id, jobs[worker_id::n_workers], results, stop, scrape, setup,
+                                      min_interval, jitter, policy))
+               for worker_id in range(n_workers)]
+    print(f"Scraping {len(jobs)} matches with {n_workers} worker(s).")
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    scraped, failed, timings, running, attempts, drivers = 0, [], [], n_workers, 0, 0
+    try:
+        while running:
+            worker_id, idx, result, seconds = results.get()
+            if idx is None:
+                running -= 1
+                attempts, drivers = attempts + result.attempts, drivers + result.drivers
+                continue
+            row = None
+            if not isinstance(result, Exception):
+                try:
+                    row = to_row(idx, result)
+                except Exception as e:
+                    result = e
+            timings.append({"idx": idx, "worker": worker_id, "seconds": seconds, "scraped": is_complete_row(row, journal)})
+            if not is_complete_row(row, journal):
+                failed.append(idx)
+                if skip_list is not None:
+                    skip_list.add(idx, result if isinstance(result, Exception) else "incomplete row")
+                print(f"Worker {worker_id} could not scrape match {idx}, it was skipped.")
+                continue
+            if skip_list is not None:
+                skip_list.discard(idx)
+            journal.add(idx, row)
+            scraped += 1
+            minutes = (time.perf_counter() - start) / 60
+            print(f"Scraped {scraped + len(failed)} of {len(jobs)} matches ({scraped / minutes:.1f} matches/min).")
+    finally:
+        stop.set()
+    for worker in workers:
+        worker.join()
+
+    seconds = time.perf_counter() - start
+    matches_per_minute = scraped / seconds * 60 if seconds else 0.0
+    print(f"Scraped {scraped} matches in {seconds:.1f}s with {n_workers} worker(s): {matches_per_minute:.1f} matches/min.")
+    return {"workers": n_workers, "matches": scraped, "failed": failed, "attempts": attempts, "drivers": drivers,
+            "seconds": seconds, "matches_per_minute": matches_per_minute,
+            "timings": pd.DataFrame(timings, columns=["idx", "worker", "seconds", "scraped"])}
+
+def scrape_all_google_stats_parallel(matches_df, google_stats_df, journal, n_workers=4, min_interval=2.0, jitter=1.0,
+                                     search_url=GOOGLE_SEARCH_URL, google_url=None, archive=None, policy=None,
+                                     skip_list=None):
+    """Scrape the statistics of all matches that are neither in google_stats_df nor in the journal with a pool of
+    headless drivers (see scrape_pages_parallel)"""
+    jobs = [(idx, google_match_url(row, search_url)) for idx, row in matches_df.iterrows()
+            if not (idx in google_stats_df.index or idx in journal)]
+    setup = None if google_url is None else lambda driver: accept_google_cookies(driver, google_url)
+    return scrape_pages_parallel(jobs, lambda driver, idx: scrape_statistics(driver, archive, idx), journal,
+                                 n_workers=n_workers, min_interval=min_interval, jitter=jitter, setup=setup,
+                                 policy=policy, skip_list=skip_list)
+
 # function that attempts to export and waits for user to grant permissions in case they're denied
 def wait_for_permission_and_export(df, file_path):
         while True:
             try:
                 print(f"Exporting {file_path}.")
-                df.to_csv(file_path)
+                dataset_store.write_source(df, file_path)
                 break
             except PermissionError:
                 input("Cannot access the file. Please hit Enter when you closed the file.")
 
-# initialize dataframe and driver to scrape betting odds
-def init_oddsportal_scraping(odds_url, odds_file_path, season):
+# Read existing or create the csv file for the odds to be scraped, the upcoming matches are scraped anew every time
+def load_odds_dataframe(odds_file_path, season):
     if season != "Upcoming Matches":
         # Read existing or create csv files for the matches and match statistics to be scraped
         try:
-            odds_df = pd.read_csv(odds_file_path, index_col=0)
+            odds_df = dataset_store.widen(dataset_store.read_source(odds_file_path), scraped_dates=True)
         except FileNotFoundError:
             print("The odds for this league and season have not been scraped yet. Creating a new dataframe.")
             odds_cols = ["Odds_"+event+bookie for bookie in ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"] for event in ["Home_", "Draw_", "Away_"]]
             odds_df = pd.DataFrame(columns=["Date", "Team_Home", "Team_Away", "Goals_Home", "Goals_Away"]+odds_cols+["Upcoming"])
-            odds_df.to_csv(odds_file_path)
+            dataset_store.write_source(odds_df, odds_file_path)
     else:
         odds_cols = ["Odds_"+event+bookie for bookie in ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"] for event in ["Home_", "Draw_", "Away_"]]
         odds_df = pd.DataFrame(columns=["Date", "Team_Home", "Team_Away", "Goals_Home", "Goals_Away"]+odds_cols+["Upcoming"])
-        odds_df.to_csv(odds_file_path)
+        dataset_store.write_source(odds_df, odds_file_path)
+    return odds_df
 
-    # Initialize driver and accept Cookies
-    driver = webdriver.Chrome()
+# initialize dataframe and driver to scrape betting odds, or reuse the driver of the google statistics scraping
+def init_oddsportal_scraping(odds_url, odds_file_path, season, driver=None):
+    odds_df = load_odds_dataframe(odds_file_path, season)
+
+    # Initialize driver and accept Cookies, unless its profile has accepted them already
+    if driver is None:
+        driver = browser.new_driver(headless=False)
     driver.get(odds_url)
-    cookies_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, "[id='onetrust-accept-btn-handler']")))
-    cookies_button.click()
+    if not browser.has_consent(driver, browser.ONETRUST_CONSENT_COOKIES):
+        cookies_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, "[id='onetrust-accept-btn-handler']")))
+        cookies_button.click()
 
-    
     return driver, odds_df
 
-def extract_oddsportal_date(text, last_date):
-    if any([day in text for day in ["Today", "Yesterday", "Tomorrow"]]):
-        if "Today" in text:
-            date = datetime.now().date()
-        elif "Yesterday" in text:
-            date = datetime.now().date() - pd.Timedelta(days=1)
-        elif "Tomorrow" in text:
-            date = datetime.now().date() + pd.Timedelta(days=1)
-        day = date.day
-        month = date.month
-        year = date.year
-    else:
-        d = re.search(r"\d{2}\s(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s\d{4}", text)
-        if d:
-            date_str = d.group()
-            day = int(date_str[:2])
-            month = datetime.strptime(date_str[3:6], '%b').month
-            year = int(date_str[-4:])
-        else:
-            return last_date
-    return f"{day}.{month}.{year}"
-
-def extract_teams_and_goals(text, season):
-    infos = text.split("\n")
-    if season != "Upcoming Matches":
-        if not "pen." in text:
-            return [infos[i] for i in [-9, -5, -8, -6]]
-        else:
-            return [infos[i-1] for i in [-9, -5, -8, -6]]
-    else:
-        return [infos[-7], infos[-5], None, None]
-
-
-def scrape_match_odds(driver, match_link):
-    original_window = driver.current_window_handle
-    ActionChains(driver)\
-        .key_down(Keys.CONTROL)\
-        .click(match_link)\
-        .key_up(Keys.CONTROL)\
-        .perform()
-
-    
-    # Wait for new window and switch to it
-    WebDriverWait(driver, 10).until(lambda d: len(d.window_handles) > 1)
-    new_window = [window for window in driver.window_handles if window != original_window][0]
-    driver.switch_to.window(new_window)
-    bookies = ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"]
-    odds_dict = {key: None for key in [event+bookie for bookie in bookies for event in ["Home_", "Draw_", "Away_"]]}
-    try:
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, ".flex.text-xs.h-9.border-black-borders")))
-        bookie_infos = driver.find_elements(By.CSS_SELECTOR, ".flex.text-xs.h-9.border-black-borders")
-        for info in [b.text for b in bookie_infos]:
-            for bookie in bookies:
-                if bookie in info:
-                    odds_dict["Home_"+bookie] = info.split("\n")[-4]
-                    odds_dict["Draw_"+bookie] = info.split("\n")[-3]
-                    odds_dict["Away_"+bookie] = info.split("\n")[-2]
-
-    finally:
-        # Close new tab and switch back
-        driver.close()
-        driver.switch_to.window(original_window)
-        return odds_dict
-
-def let_odds_page_load(driver):
-    # function to check whether last element has changed
-    def _check(driver, prior_last):
-        new_last = driver.find_elements(By.CLASS_NAME, "eventRow")[-1]
-        return new_last.text != prior_last.text
-
-    driver.refresh()
-    while True:
+# scrapes the odds of the match page that the driver is on, which is saved into the archive as match idx. Raises a
+# TimeoutException if the page shows no odds.
+def scrape_match_odds(driver, archive=None, idx=None):
+    with scrape_timing.span("odds_wait", idx=idx):
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "."+page_parsing.ODDS_ROW_CLASSES)))
+    page_source = snapshot(driver, archive, "match_odds", idx)
+    with scrape_timing.span("parse_match_odds"):
+        return page_parsing.parse_match_odds(page_source)
+
+# loads all event rows of an oddsportal page. A subpage that is navigated to by only changing the #/page/ part of
+# the URL is rendered by the page itself, it is only refreshed if its rows do not replace the previous page's rows.
+# Returns the loading statistics and the first row, to compare the next subpage with.
+def let_odds_page_load(driver, previous_first_row=None):
+    with scrape_timing.span("odds_rows_wait"):
+        refreshed = previous_first_row is not None and not wait_for_new_rows(driver, "eventRow", previous_first_row)
+        if refreshed:
+            driver.refresh()
         WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "eventRow")))
-        last_row = driver.find_elements(By.CLASS_NAME, "eventRow")[-1]
-        actions = ActionChains(driver)
-        actions.move_to_element(last_row).perform()
-        try:
-            WebDriverWait(driver, 10).until(lambda d: _check(driver, last_row))
-        except TimeoutException:
-            break
-
-
-def scrape_all_odds(driver, odds_url, odds_df, season):
+    loading = load_all_rows(driver, "eventRow", timeout=10)
+    first_row = driver.execute_script(WATCH_ROWS_SCRIPT, "eventRow", True, False)[1]
+    return {**loading, "refreshed": refreshed, "first_row": first_row}
+
+# the number of result pages of the oddsportal page the driver is on
+def count_odds_pages(driver):
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "pagination-link")))
+    return len(driver.find_elements(By.CLASS_NAME, "pagination-link"))
+
+def find_all_odds_events(run, odds_url, season, archive=None):
+    """The matches on all oddsportal result pages of the season as {idx: event}, with the URL of their match page.
+    The pages are loaded with run(url, action, description), e.g. the run of a DriverSession."""
     if season != "Upcoming Matches":
-        upcoming = False
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "pagination-link")))
-        number_pages = len(driver.find_elements(By.CLASS_NAME, "pagination-link"))
+        number_pages = run(odds_url, count_odds_pages, "the first results page")
         subpages = [odds_url+"/#/page/"+str(i)+"/" for i in range(1,number_pages)]
     else:
-        upcoming = True
         subpages = [odds_url]
 
-    for page in subpages:
-        driver.get(page)
-        let_odds_page_load(driver)
-
-        date = extract_oddsportal_date(driver.find_element(By.CLASS_NAME, "eventRow").text, None)
-        all_events = driver.find_elements(By.CLASS_NAME, "eventRow")
-        progress_counter = 0
-        for event_row in all_events:
-            progress_counter += 1
-            event_text = event_row.text
-            date = extract_oddsportal_date(event_text, date)
-            team_home, team_away, goals_home, goals_away = extract_teams_and_goals(event_text, season)
-            idx = "_".join([date, team_home, team_away, str(goals_home), str(goals_away)])
-            print(f"Attempting to scrape odds for match {progress_counter} of {len(all_events)} on {page[-7:-1].replace("/", " ")} of {len(subpages)}: {team_home} vs. {team_away} on {date}")
-            if idx not in odds_df.index:
-                match_link = event_row.find_element(By.CLASS_NAME, "group")
-                odds_dict = scrape_match_odds(driver, match_link)
-                odds_df.loc[idx] = ([date, team_home, team_away, goals_home, goals_away] + [odds_dict[event+bookie]
-                                for bookie in ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"] for event in ["Home_", "Draw_", "Away_"]]
-                                + [upcoming])
-                print("Scraping was successful!")
-            else:
-                print("Match odds are already in the Dataframe.")
-
-def main():
+    events, previous_first_row = {}, None
+    for page_number, page in enumerate(subpages, 1):
+        loading, page_source = run(page, lambda driver: (let_odds_page_load(driver, previous_first_row),
+                                                         snapshot(driver, archive, "odds_events", url=page)), page)
+        previous_first_row = loading["first_row"]
+
+        # parse all event rows from one snapshot of the page
+        with scrape_timing.span("parse_odds_events"):
+            page_events = page_parsing.parse_odds_events(page_source, season)
+        for event in page_events:
+            idx = "_".join([event["date"], event["team_home"], event["team_away"], str(event["goals_home"]), str(event["goals_away"])])
+            events[idx] = {**event, "url": urljoin(page, event["link"]) if event["link"] else None}
+        print(f"Found {len(page_events)} matches on page {page_number} of {len(subpages)}.")
+    return events
+
+def scrape_all_odds(driver, odds_url, odds_df, season, journal, archive=None, session=None, skip_list=None,
+                    n_workers=1, min_interval=2.0, jitter=1.0, policy=None):
+    """Scrape the odds of all matches on the oddsportal pages of the season that are neither in odds_df nor in the
+    journal into the journal. The URLs of the matches are collected from all result pages first, then their pages
+    are loaded directly: one after another in the driver, or with a pool of n_workers headless drivers (see
+    scrape_pages_parallel) if n_workers > 1 or in the unattended mode. The unattended mode loads the result pages
+    with the retries of the DriverSession (and no driver) and puts the matches that still fail on the skip list
+    instead of journaling them without odds. Returns the results of the run with the timings of every match."""
+    if session is not None:
+        run = session.run
+    else:
+        def run(url, action, description):
+            load_or_let_user_fix(driver, url)
+            return action(driver)
+    events = find_all_odds_events(run, odds_url, season, archive)
+    if session is not None:
+        # the pool starts its own drivers
+        session.quit()
+    pending = {idx: event for idx, event in events.items() if not (idx in odds_df.index or idx in journal)}
+    print(f"Found {len(events)} matches, {len(pending)} of them have no odds yet.")
+
+    upcoming = season == "Upcoming Matches"
+    to_row = lambda idx, odds_dict: ([pending[idx][key] for key in ["date", "team_home", "team_away", "goals_home", "goals_away"]]
+                                     + [odds_dict[event+bookie] for bookie in ["Average", "Bet365", "bet-at-home", "Betano", "Bwin"]
+                                        for event in ["Home_", "Draw_", "Away_"]]
+                                     + [upcoming])
+    jobs = [(idx, event["url"]) for idx, event in pending.items() if event["url"] is not None]
+    if session is not None or n_workers > 1:
+        run = scrape_pages_parallel(jobs, lambda driver, idx: scrape_match_odds(driver, archive, idx), journal, to_row,
+                                    n_workers, min_interval, jitter, setup=lambda driver: accept_oddsportal_cookies(driver, odds_url),
+                                    policy=policy, skip_list=skip_list)
+        run["failed"] += [idx for idx, event in pending.items() if event["url"] is None]
+        return run
+
+    # one match page after another in the same tab, a match without odds is journaled without them and a match whose
+    # page does not load is skipped
+    timings, skipped, start = [], [], time.perf_counter()
+    for i, (idx, url) in enumerate(jobs, 1):
+        print(f"Attempting to scrape odds for match {i} of {len(jobs)}: {idx.replace('_', ' ')}")
+        match_start = time.perf_counter()
+        with scrape_timing.span("match", idx=idx):
+            if not load_or_let_user_fix(driver, url):
+                print("The match could not be loaded and was thus skipped.")
+                skipped.append(idx)
+                timings.append({"idx": idx, "worker": 0, "seconds": time.perf_counter() - match_start, "scraped": False})
+                continue
+            try:
+                odds_dict = scrape_match_odds(driver, archive, idx)
+            except TimeoutException:
+                print("The match has no odds.")
+                odds_dict = {event+bookie: None for bookie in dataset_store.BOOKIES for event in ["Home_", "Draw_", "Away_"]}
+        journal.add(idx, to_row(idx, odds_dict))
+        timings.append({"idx": idx, "worker": 0, "seconds": time.perf_counter() - match_start, "scraped": True})
+    seconds = time.perf_counter() - start
+    scraped = len(jobs) - len(skipped)
+    matches_per_minute = scraped / seconds * 60 if seconds else 0.0
+    print(f"Scraped {scraped} matches in {seconds:.1f}s: {matches_per_minute:.1f} matches/min.")
+    return {"workers": 1, "matches": scraped,
+            "failed": [idx for idx, event in pending.items() if event["url"] is None] + skipped,
+            "seconds": seconds, "matches_per_minute": matches_per_minute,
+            "timings": pd.DataFrame(timings, columns=["idx", "worker", "seconds", "scraped"])}
+
+def main(n_workers=1, min_interval=2.0, archive_pages=True):
     
     # get user input
     league, season, google_url, odds_url, google_file_path, matches_file_path, odds_file_path = get_inputs_from_user()
+    # every fetched page is archived, so that it can be parsed again without scraping it (see page_archive.py)
+    archive = page_archive.PageArchive(league, season) if archive_pages else None
 
+    # the driver of the google statistics scraping is reused for the odds
+    driver = None
     if season != "Upcoming Matches":
         #  initialize the driver and dataframes for the google match statistics
         try:
-            driver, google_stats_df, matches_df = init_google_stats_scraping(google_url, google_file_path, matches_file_path, league)
+            driver, google_stats_df, matches_df = init_google_stats_scraping(google_url, google_file_path, matches_file_path, league, archive)
             wait_for_permission_and_export(matches_df, matches_file_path)
         except KeyboardInterrupt:
             print("Ending the Google statistics scraping...")
         else:
-            # scrape all google match statistics           
+            # scrape all google match statistics into the journal, which is merged into the csv file afterwards
+            google_journal = scrape_journal.ScrapeJournal(google_file_path, google_stats_df.columns)
+            skip_list = scrape_journal.SkipList(google_file_path)
             try:
-                scrape_all_google_stats(driver, matches_df, google_stats_df)
-                driver.quit()
+                if n_workers > 1:
+                    # the matches are found, the statistics are scraped by the headless workers
+                    scrape_all_google_stats_parallel(matches_df, google_stats_df, google_journal, n_workers, min_interval,
+                                                     google_url=google_url, archive=archive, skip_list=skip_list)
+                else:
+                    scrape_all_google_stats(driver, matches_df, google_stats_df, google_journal, archive, skip_list)
             except KeyboardInterrupt:
                 driver.quit()
-            wait_for_permission_and_export(google_stats_df, google_file_path)
+                driver = None
+            finally:
+                google_journal.close()
+            scrape_journal.compact(google_file_path, wait_for_permission_and_export)
     
     #  initialize the driver and dataframes for the oddsportal historical odds and scrape all odds that weren't previously scraped.
     try:
-        driver, odds_df = init_oddsportal_scraping(odds_url, odds_file_path, season)
+        driver, odds_df = init_oddsportal_scraping(odds_url, odds_file_path, season, driver)
     except KeyboardInterrupt:
         print("Ending the Webscraping...")
     else:
-        # scrape all oddsportal betting odds      
+        # scrape all oddsportal betting odds into the journal, which is merged into the csv file afterwards
+        odds_journal = scrape_journal.ScrapeJournal(odds_file_path, odds_df.columns)
         try:
-            scrape_all_odds(driver, odds_url, odds_df, season)
-            driver.quit()
+            scrape_all_odds(driver, odds_url, odds_df, season, odds_journal, archive, n_workers=n_workers,
+                            min_interval=min_interval)
         except KeyboardInterrupt:
+            pass
+        finally:
+            odds_journal.close()
+        scrape_journal.compact(odds_file_path, wait_for_permission_and_export)
+    finally:
+        if driver is not None:
             driver.quit()
-        wait_for_permission_and_export(odds_df, odds_file_path)
+
+def scrape_unattended(league_input, season, n_workers=1, min_interval=2.0, archive_pages=True, policy=None):
+    """Scrape a league (by its number in catalog.LEAGUES) and season like main, but headless and without asking
+    anything: pages that fail are retried as the policy says instead of asking the user to fix them, and matches
+    that still fail are put on the skip lists in ../data/journal and tried again last by the next run.
+    Returns the results of the statistics and odds scraping."""
+    policy = RetryPolicy() if policy is None else policy
+    league, season, google_url, odds_url, google_file_path, matches_file_path, odds_file_path = partition_inputs(league_input, season)
+    archive = page_archive.PageArchive(league, season) if archive_pages else None
+    summary = {"league": league, "season": season}
+
+    if season != "Upcoming Matches":
+        google_stats_df, matches_df = load_google_dataframes(google_file_path, matches_file_path)
+        session = DriverSession(policy, lambda driver: accept_google_cookies(driver, google_url))
+        try:
+            _, matches_df = session.run(google_url, lambda driver: (expand_all_matchdays(driver),
+                                                                    find_all_scrapable_matches(driver, matches_df, league, archive)),
+                                        "the matches page")
+            dataset_store.write_source(matches_df, matches_file_path)
+        except WebDriverException as e:
+            print(f"The matches could not be found ({type(e).__name__}), only the statistics of the known matches are scraped.")
+        finally:
+            session.quit()
+        with scrape_journal.ScrapeJournal(google_file_path, google_stats_df.columns) as google_journal:
+            summary["statistics"] = scrape_all_google_stats_parallel(
+                matches_df, google_stats_df, google_journal, n_workers, min_interval, google_url=google_url,
+                archive=archive, policy=policy, skip_list=scrape_journal.SkipList(google_file_path))
+        scrape_journal.compact(google_file_path)
+
+    odds_df = load_odds_dataframe(odds_file_path, season)
+    session = DriverSession(policy, lambda driver: accept_oddsportal_cookies(driver, odds_url))
+    try:
+        with scrape_journal.ScrapeJournal(odds_file_path, odds_df.columns) as odds_journal:
+            summary["odds"] = scrape_all_odds(None, odds_url, odds_df, season, odds_journal, archive, session,
+                                              scrape_journal.SkipList(odds_file_path), n_workers, min_interval, policy)
+    except WebDriverException as e:
+        print(f"The odds pages could not be loaded ({type(e).__name__}), the odds scraping was aborted.")
+    finally:
+        session.quit()
+    scrape_journal.compact(odds_file_path)
+    return summary
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape the google statistics and oddsportal odds of a league and season.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of headless browsers that scrape the google statistics and the odds of the "
+                             "matches in parallel (default: 1, which scrapes them in a visible browser that lets you "
+                             "fix the page state manually)")
+    parser.add_argument("--min-interval", type=float, default=2.0,
+                        help="minimum number of seconds between two requests of a worker (default: 2.0)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="do not save the fetched pages into the page archive")
+    parser.add_argument("--unattended", action="store_true",
+                        help="scrape headless without asking anything, retrying the pages that fail (needs --league "
+                             "and --season)")
+    parser.add_argument("--league", type=int, choices=catalog.LEAGUES,
+                        help="number of the league to scrape unattended: " + ", ".join(f"{key}: {value}" for key, value in catalog.LEAGUES.items()))
+    parser.add_argument("--season", choices=catalog.SEASONS.values(),
+                        help="season to scrape unattended")
+    parser.add_argument("--max-attempts", type=int, default=4,
+                        help="number of times a page is tried in the unattended mode (default: 4)")
+    parser.add_argument("--fresh-driver-after", type=int, default=3,
+                        help="number of failures in a row after which a fresh driver is started (default: 3)")
+    args = parser.parse_args()
+    if args.unattended and (args.league is None or args.season is None):
+        parser.error("--unattended needs --league and --season")
+    # the timing spans of the scraper phases are logged, and summarized at the end
+    log_path = scrape_timing.start_log()
+    try:
+        if args.unattended:
+            scrape_unattended(args.league, args.season, args.workers, args.min_interval, not args.no_archive,
+                              RetryPolicy(args.max_attempts, fresh_driver_after=args.fresh_driver_after))
+        else:
+            main(args.workers, args.min_interval, not args.no_archive)
+    finally:
+        scrape_timing.stop_log()
+    print(scrape_timing.summary().to_string(index=False))
+    print(f"The timing spans were logged to {log_path}.")
 
-import os
-for odds_file in [f for f in os.listdir("../data/") if "odds" in f]:
-    df = pd.read_csv("../data/"+odds_file, index_col = 0)
-    if "Upcoming" in odds_file:
-        df["Upcoming"] = True
-    else:
-        df["Upcoming"] = False
-    df.to_csv(odds_file)
\ No newline at end of file